@@ -2,22 +2,43 @@
 AI 服務層 - Oreoooooo 終極穩定整合版
 處理所有與 Gemini API 相關的業務邏輯，包含重試機制、高品質 Prompt 與階梯式辨識
 """
+import asyncio
+import hashlib
 import json
 import time
 import re
 import google.generativeai as genai
-from typing import List, Dict, Optional, Tuple, Tuple
+from typing import List, Dict, Optional, Tuple
 from database.models import ClothingItem, WeatherData
 
 from google.api_core.exceptions import ResourceExhausted, InternalServerError
 from api.model_a_adapter import ModelAAdapter
 from api.recommendation_engine import RecommendationEngine
+from api.keyword_matcher import split_keywords
+from api.async_utils import run_ai, run_blocking
+from api.rate_scheduler import RateScheduler, TierConfig, backoff_delay
+from api.tag_cache import TagCache
+
+# 標籤辨識使用的模型
+TAG_MODEL_T1 = 'gemini-2.5-flash'
+TAG_MODEL_T2 = 'gemini-3-flash-preview'
+# 修改 _build_tagging_content 的 prompt 時需遞增，讓舊的快取結果失效
+TAGGING_PROMPT_VERSION = 1
+# 標籤快取版本 (prompt 或模型變更時自動更換)
+TAG_CACHE_VERSION = f"p{TAGGING_PROMPT_VERSION}/{TAG_MODEL_T1}/{TAG_MODEL_T2}"
+# 單一層級遇到速率限制 (429) 時最多呼叫幾次，用完即改走下一層或 Model A
+GEMINI_MAX_ATTEMPTS = 3
 
 class AIService:
-    def __init__(self, api_key: str, rate_limit_seconds: int = 15):
+    def __init__(self, api_key: str, rate_limit_seconds: int = 15, scheduler: Optional[RateScheduler] = None,
+                 tag_cache: Optional[TagCache] = None):
         self.api_key = api_key
-        self.rate_limit_seconds = rate_limit_seconds
-        self.last_request_time = 0
+        self.tag_cache = tag_cache
+        # 未指定排程器時沿用舊設定: 每個層級每 rate_limit_seconds 秒一次
+        if scheduler is None:
+            per_minute = 60.0 / rate_limit_seconds
+            scheduler = RateScheduler({"t1": TierConfig(per_minute), "t2": TierConfig(per_minute)})
+        self.scheduler = scheduler
         genai.configure(api_key=api_key)
         
         # 設定安全過濾 (關閉以避免誤判衣物圖片)
@@ -30,44 +51,104 @@ class AIService:
         
         # 依照 Oreoooooo 要求，定義階梯模型 (Tier 1 & Tier 2)
         # 注意: 確保系統環境支援此模型名稱
-        self.model_t1 = genai.GenerativeModel('gemini-2.5-flash', safety_settings=self.safety_settings)
-        self.model_t2 = genai.GenerativeModel('gemini-3-flash-preview', safety_settings=self.safety_settings)
+        self.model_t1 = genai.GenerativeModel(TAG_MODEL_T1, safety_settings=self.safety_settings)
+        self.model_t2 = genai.GenerativeModel(TAG_MODEL_T2, safety_settings=self.safety_settings)
     
-    def _rate_limit_wait(self):
-        """API 速率限制保護 - 嚴格版"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        if time_since_last < self.rate_limit_seconds:
-            wait_time = self.rate_limit_seconds - time_since_last
-            print(f"[AI] ⏳ 速率限制保護中，等待 {wait_time:.1f} 秒...")
-            time.sleep(wait_time)
+    def _rate_limit_wait(self, tier: str = "t1", user_id: str = "") -> bool:
+        """
+        API 速率限制保護 - 向排程器取得該層級模型的呼叫額度
         
-        self.last_request_time = time.time()
+        Returns:
+            是否取得額度 (佇列已滿或等待逾時回傳 False)
+        """
+        if self.scheduler.acquire(tier, user_id):
+            return True
+        print(f"[AI] ⏳ {tier} 排隊逾時或佇列已滿，略過此層級")
+        return False
 
-    def batch_auto_tag(self, img_bytes_list: List[bytes]) -> Optional[List[Dict]]:
+    async def _arate_limit_wait(self, tier: str = "t1", user_id: str = "") -> bool:
+        """_rate_limit_wait 的非同步版 (等待期間不佔用 event loop)"""
+        if await self.scheduler.aacquire(tier, user_id):
+            return True
+        print(f"[AI] ⏳ {tier} 排隊逾時或佇列已滿，略過此層級")
+        return False
+
+    def batch_auto_tag(self, img_bytes_list: List[bytes], user_id: str = "") -> Optional[List[Dict]]:
         """
         Oreoooooo 階梯式自動標籤辨識:
+        0. 先查標籤快取，只有未命中的圖片才送 Gemini
         1. 先嘗試 Gemini 2.5-flash (具備重試)
         2. 若爆流量則試 Gemini 3-flash-preview (具備重試)
         3. 均失敗則 Fallback 到本地 Model A
         """
-        print(f"[AI] 開始對 {len(img_bytes_list)} 件衣物進行階梯式辨識分析...")
+        hashes = [hashlib.sha256(img).hexdigest() for img in img_bytes_list]
+        cached = self.tag_cache.get_many(hashes) if self.tag_cache else {}
+        miss_hashes, miss_bytes = self._collect_tag_misses(img_bytes_list, hashes, cached)
+        if not miss_bytes:
+            print(f"[AI] ✅ {len(img_bytes_list)} 件衣物全部命中標籤快取")
+            return [cached[h] for h in hashes]
+        print(f"[AI] 開始對 {len(miss_bytes)} 件衣物進行階梯式辨識分析 (快取命中 {len(img_bytes_list) - len(miss_bytes)} 件)...")
         
         # A. 嘗試模型 1 (2.5-flash)
-        results = self._call_gemini_with_robust_logic(self.model_t1, img_bytes_list, "Tier 1 (2.5-flash)")
-        if results: return results
+        results = self._call_gemini_with_robust_logic(self.model_t1, miss_bytes, "Tier 1 (2.5-flash)", "t1", user_id)
         
         # B. 嘗試模型 2 (3-preview)
-        results = self._call_gemini_with_robust_logic(self.model_t2, img_bytes_list, "Tier 2 (3-preview)")
-        if results: return results
+        if not results:
+            results = self._call_gemini_with_robust_logic(self.model_t2, miss_bytes, "Tier 2 (3-preview)", "t2", user_id)
+
+        if results:
+            if self.tag_cache:
+                self.tag_cache.put_many(dict(zip(miss_hashes, results)))
+        else:
+            # C. 最終 Fallback - 本地 Model A (當 API 均不可用時，結果不寫入快取)
+            results = self._model_a_fallback(miss_bytes)
+        return self._merge_tags(hashes, cached, miss_hashes, results)
 
-        # C. 最終 Fallback - 本地 Model A (當 API 均不可用時)
+    async def abatch_auto_tag(self, img_bytes_list: List[bytes], user_id: str = "") -> Optional[List[Dict]]:
+        """batch_auto_tag 的非同步版 (Gemini 使用 async API，Model A 在 AI 執行緒池執行)"""
+        hashes = [hashlib.sha256(img).hexdigest() for img in img_bytes_list]
+        cached = await run_blocking(self.tag_cache.get_many, hashes) if self.tag_cache else {}
+        miss_hashes, miss_bytes = self._collect_tag_misses(img_bytes_list, hashes, cached)
+        if not miss_bytes:
+            print(f"[AI] ✅ {len(img_bytes_list)} 件衣物全部命中標籤快取")
+            return [cached[h] for h in hashes]
+        print(f"[AI] 開始對 {len(miss_bytes)} 件衣物進行階梯式辨識分析 (快取命中 {len(img_bytes_list) - len(miss_bytes)} 件)...")
+        
+        results = await self._acall_gemini_with_robust_logic(self.model_t1, miss_bytes, "Tier 1 (2.5-flash)", "t1", user_id)
+        if not results:
+            results = await self._acall_gemini_with_robust_logic(self.model_t2, miss_bytes, "Tier 2 (3-preview)", "t2", user_id)
+
+        if results:
+            if self.tag_cache:
+                await run_blocking(self.tag_cache.put_many, dict(zip(miss_hashes, results)))
+        else:
+            results = await run_ai(self._model_a_fallback, miss_bytes)
+        return self._merge_tags(hashes, cached, miss_hashes, results)
+
+    @staticmethod
+    def _collect_tag_misses(img_bytes_list: List[bytes], hashes: List[str],
+                            cached: Dict[str, Dict]) -> Tuple[List[str], List[bytes]]:
+        """找出未命中快取的圖片 (同批內相同的圖片只送一次)"""
+        miss_hashes, miss_bytes = [], []
+        for img, h in zip(img_bytes_list, hashes):
+            if h not in cached and h not in miss_hashes:
+                miss_hashes.append(h)
+                miss_bytes.append(img)
+        return miss_hashes, miss_bytes
+
+    @staticmethod
+    def _merge_tags(hashes: List[str], cached: Dict[str, Dict],
+                    miss_hashes: List[str], results: List[Dict]) -> List[Dict]:
+        """依原始順序合併快取結果與本次辨識結果"""
+        fresh = dict(zip(miss_hashes, results))
+        return [cached[h] if h in cached else fresh[h] for h in hashes]
+
+    def _model_a_fallback(self, img_bytes_list: List[bytes]) -> List[Dict]:
+        """本地 Model A 辨識 (當 Gemini 均不可用時)"""
         print("[AI] ⚠️ 所有 Gemini 模型均已達流量上限或失敗，啟動本地 Model A 辨識...")
         adapter = ModelAAdapter()
         final_results = []
-        for idx, img_bytes in enumerate(img_bytes_list):
-            local_result = adapter.analyze_image(img_bytes)
+        for idx, local_result in enumerate(adapter.analyze_images(img_bytes_list)):
             if local_result:
                 final_results.append({
                     "name": f"{local_result['colors'][0]} {local_result['category_zh']}" if local_result['colors'] else local_result['category_zh'],
@@ -81,13 +162,9 @@ class AIService:
         print(f"[AI] ✅ 回歸本地 Model A辨識完成 ({len(final_results)} 件)")
         return final_results
 
-    def _call_gemini_with_robust_logic(self, model, img_bytes_list, label) -> Optional[List[Dict]]:
-        """原本最穩健的呼叫邏輯 (包含 Retry, JSON 清洗, Candidates 檢查)"""
-        try:
-            self._rate_limit_wait()
-            print(f"[AI] 🚀 正在嘗試 {label}...")
-
-            style_guide = """
+    def _build_tagging_content(self, img_bytes_list: List[bytes]) -> List:
+        """組合標籤辨識的 Prompt 與圖片內容"""
+        style_guide = """
             請從以下 15 種核心風格中，選擇最符合的一種(必選其一):
             1. 極簡(Minimalist): 黑白灰素色、剪裁俐落、冷淡風
             2. 日系(Japanese Cityboy): 寬鬆Oversized、多層次、大地色、自然舒適
@@ -107,8 +184,8 @@ class AIService:
             (若皆不符則填"其他混搭")
             """
 
-            # 補回最高品質的 Prompt
-            prompt = f"""請仔細分析這 {len(img_bytes_list)} 件衣服,為每件衣服分別回傳 JSON 格式的標籤。
+        # 補回最高品質的 Prompt
+        prompt = f"""請仔細分析這 {len(img_bytes_list)} 件衣服,為每件衣服分別回傳 JSON 格式的標籤。
  
 回傳格式必須是一個 JSON 陣列,包含 {len(img_bytes_list)} 個物件:
 [
@@ -131,20 +208,73 @@ class AIService:
 4. 每個物件都必須包含這 4 個欄位
 5. 風格欄位必須嚴格遵守上述 15 種分類名稱
 """
-            content_parts = [{"mime_type": "image/jpeg", "data": img} for img in img_bytes_list]
-            content_parts.insert(0, prompt)
+        content_parts = [{"mime_type": "image/jpeg", "data": img} for img in img_bytes_list]
+        content_parts.insert(0, prompt)
+        return content_parts
+
+    @staticmethod
+    def _rate_limited_retry_delay(label: str, attempt: int) -> Optional[float]:
+        """
+        第 attempt 次呼叫遇到速率限制後的重試策略 (同步與非同步版共用)
+
+        Returns:
+            重試前的等待秒數；已達 GEMINI_MAX_ATTEMPTS 時回傳 None (不再等待與取額度，直接改走下一層)
+        """
+        if attempt >= GEMINI_MAX_ATTEMPTS:
+            print(f"[AI] ⚠️ {label} 速率限制，已嘗試 {attempt} 次，改用下一層")
+            return None
+        wait_time = backoff_delay(attempt, base=5.0)
+        print(f"[AI] ⚠️ {label} 速率限制，等待 {wait_time:.1f} 秒後重試 ({attempt}/{GEMINI_MAX_ATTEMPTS - 1})...")
+        return wait_time
+
+    def _call_gemini_with_robust_logic(self, model, img_bytes_list, label, tier, user_id="") -> Optional[List[Dict]]:
+        """原本最穩健的呼叫邏輯 (包含 Retry, JSON 清洗, Candidates 檢查)"""
+        try:
+            if not self._rate_limit_wait(tier, user_id):
+                return None
+            print(f"[AI] 🚀 正在嘗試 {label}...")
+
+            content_parts = self._build_tagging_content(img_bytes_list)
 
-            max_retries = 3
-            retry_count = 0
-            while retry_count < max_retries:
+            for attempt in range(1, GEMINI_MAX_ATTEMPTS + 1):
                 try:
                     response = model.generate_content(content_parts)
                     return self._parse_and_validate_response(response, len(img_bytes_list))
                 except ResourceExhausted:
-                    retry_count += 1
-                    wait_time = 30 * retry_count
-                    print(f"[AI] ⚠️ {label} 速率限制，等待 {wait_time} 秒後重試 ({retry_count}/{max_retries})...")
+                    wait_time = self._rate_limited_retry_delay(label, attempt)
+                    if wait_time is None:
+                        break
                     time.sleep(wait_time)
+                    if not self._rate_limit_wait(tier, user_id):
+                        break
+                except Exception as e:
+                    print(f"[AI] {label} 呼叫異常: {e}")
+                    break
+            return None
+        except Exception as e:
+            print(f"[AI] {label} 區塊執行失敗: {e}")
+            return None
+
+    async def _acall_gemini_with_robust_logic(self, model, img_bytes_list, label, tier, user_id="") -> Optional[List[Dict]]:
+        """_call_gemini_with_robust_logic 的非同步版 (重試等待使用 asyncio.sleep)"""
+        try:
+            if not await self._arate_limit_wait(tier, user_id):
+                return None
+            print(f"[AI] 🚀 正在嘗試 {label}...")
+
+            content_parts = self._build_tagging_content(img_bytes_list)
+
+            for attempt in range(1, GEMINI_MAX_ATTEMPTS + 1):
+                try:
+                    response = await model.generate_content_async(content_parts)
+                    return self._parse_and_validate_response(response, len(img_bytes_list))
+                except ResourceExhausted:
+                    wait_time = self._rate_limited_retry_delay(label, attempt)
+                    if wait_time is None:
+                        break
+                    await asyncio.sleep(wait_time)
+                    if not await self._arate_limit_wait(tier, user_id):
+                        break
                 except Exception as e:
                     print(f"[AI] {label} 呼叫異常: {e}")
                     break
@@ -223,11 +353,12 @@ class AIService:
     def generate_outfit_recommendation(
         self, wardrobe: List[ClothingItem], weather: WeatherData, style: str, occasion: str,
         user_profile: Optional[Dict] = None,
-        locked_items: Optional[List[str]] = None  # ✅ 優先級 3：指定單品鎖定
+        locked_items: Optional[List[str]] = None,  # ✅ 優先級 3：指定單品鎖定
+        user_id: str = ""
     ) -> Optional[Dict]:
         """產出智能穿搭組合 - 含完整解析與 Gemini 結語、支援個人偏好 & 指定單品"""
         try:
-            self._rate_limit_wait()
+            analysis_slot = self._rate_limit_wait("t1", user_id)
 
             locked_item_ids = list(locked_items) if locked_items else []
             locked_item_ids_set = set(locked_item_ids)
@@ -286,7 +417,8 @@ class AIService:
                 "parsed_style": "核心風格標籤"
             }}
             """
-            res = self.model_t1.generate_content(analysis_prompt)
+            # 未取得呼叫額度時直接使用下方的預設解析值
+            res = self.model_t1.generate_content(analysis_prompt) if analysis_slot else None
             analysis_text = self._extract_response_text(res)
             analysis = self._safe_json_loads(analysis_text)
 
@@ -309,54 +441,23 @@ class AIService:
             normalized_occasion = analysis.get("normalized_occasion") or "日常"
             parsed_style = analysis.get("parsed_style") or style or "日常"
             
-            # 2. 引擎從真實衣櫥挑選 - 實現軟扣分機制（推薦 3 套時追蹤已使用單品）
+            # 2. 引擎從真實衣櫥挑選 3 套 - 一次評分，已選出的單品在後續套裝中軟扣分
+            #    指定單品每套必定包含、含避雷關鍵字的單品在評分前就排除
             engine = RecommendationEngine()
-            outfits = []
-            # ✅ 優先級 3 修復：初始化 used_items 為空，但稍後會加入 locked_items
-            used_items = list(locked_item_ids)  # 初始化為指定單品（必須包含）
-            
-            for set_idx in range(3):
-                try:
-                    # 在每一套時傳入已使用單品，實現軟扣分
-                    single_outfit = engine.recommend(
-                        wardrobe, weather, normalized_occasion, "中性", 
-                        parsed_style, needs_outer, used_items=used_items
-                    )
-                    
-                    if single_outfit:
-                        outfits.append(single_outfit[0])  # 取第 1 套即可
-                        
-                        # ✅ 提取該套中的單品 ID 加入 used_items（不包括指定單品，防止後續套裝排除它們）
-                        if single_outfit[0].get('items'):
-                            for item in single_outfit[0]['items']:
-                                if item.get('id') and not is_locked(item['id']):
-                                    # 只追蹤非指定的單品，指定單品應在每套中重複出現
-                                    used_items.append(item['id'])
-                except Exception as e:
-                    print(f"[AI] 第 {set_idx+1} 套推薦出錯: {e}")
-                    continue
+            try:
+                outfits = engine.recommend_k(
+                    wardrobe, weather, normalized_occasion, "中性",
+                    parsed_style, needs_outer, k=3,
+                    locked_items=locked_item_ids,
+                    dislikes=split_keywords(dislikes)
+                )
+            except Exception as e:
+                print(f"[AI] 穿搭推薦出錯: {e}")
+                outfits = []
             
             if not outfits:
                 return None
             
-            # ✅ 過濾避雷清單
-            if dislikes:
-                dislike_keywords = [kw.strip().lower() for kw in dislikes.split(',')]
-                filtered_outfits = []
-                
-                for outfit in outfits:
-                    should_include = True
-                    for item in outfit['items']:
-                        item_name = (item.get('name', '') + item.get('color', '')).lower()
-                        if any(kw in item_name for kw in dislike_keywords):
-                            should_include = False
-                            break
-                    
-                    if should_include:
-                        filtered_outfits.append(outfit)
-                
-                outfits = filtered_outfits[:3] if filtered_outfits else outfits[:3]
-
             # 3. 針對具體衣服產出 100 字溫馨總結 (Gemini 結語) - 融入身形修飾建議
             body_shape_tip = ""
             if user_height and user_weight:
@@ -390,18 +491,32 @@ class AIService:
                 names = [f"{it['color']}{it['name']}" for it in o['items']]
                 detail_prompt += f"方案{i+1}: {', '.join(names)}\n"
             
-            self._rate_limit_wait()
-            reason_res = self.model_t1.generate_content(detail_prompt)
+            if self._rate_limit_wait("t1", user_id):
+                detailed_reasons = self.model_t1.generate_content(detail_prompt).text
+            else:
+                detailed_reasons = f"目前 AI 顧問忙碌中，以上 {len(outfits)} 套是依今天 {weather.temp} 度的天氣與「{occasion}」場合為你挑選的搭配。"
             
             return {
                 "vibe": analysis.get("vibe_description") or "今天就走舒適俐落的日常穿搭風格。",
-                "detailed_reasons": reason_res.text,
+                "detailed_reasons": detailed_reasons,
                 "recommendations": outfits
             }
         except Exception as e:
             print(f"[AI Recommendation Error] {e}")
             return None
 
+    async def agenerate_outfit_recommendation(
+        self, wardrobe: List[ClothingItem], weather: WeatherData, style: str, occasion: str,
+        user_profile: Optional[Dict] = None,
+        locked_items: Optional[List[str]] = None,
+        user_id: str = ""
+    ) -> Optional[Dict]:
+        """generate_outfit_recommendation 的非同步版 (在 AI 執行緒池執行，不阻塞 event loop)"""
+        return await run_ai(
+            self.generate_outfit_recommendation, wardrobe, weather, style, occasion,
+            user_profile=user_profile, locked_items=locked_items, user_id=user_id
+        )
+
     def _map_category_to_frontend(self, model_cat: str) -> str:
         """將 Model A 的類別對應到前端 (Oreoooooo 指定完整版)"""
         UPPER = ['Tee', 'Blouse', 'Top', 'Tank', 'Jersey', 'Hoodie', 'Sweater']
@@ -0,0 +1,40 @@
+"""
+非同步工具
+將阻塞式呼叫 (supabase-py、requests、PIL 等) 移到有上限的執行緒池，避免卡住 event loop
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 一般 I/O (資料庫、天氣 API、檔案)
+_io_executor: Optional[ThreadPoolExecutor] = None
+# 耗時的 AI 呼叫 (Gemini 推薦、本地模型)，與 I/O 分開避免佔滿 I/O 執行緒
+_ai_executor: Optional[ThreadPoolExecutor] = None
+
+
+def configure_executors(io_workers: int = 32, ai_workers: int = 4):
+    """設定執行緒池大小 (需在處理請求前呼叫)"""
+    global _io_executor, _ai_executor
+    _io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="io")
+    _ai_executor = ThreadPoolExecutor(max_workers=ai_workers, thread_name_prefix="ai")
+
+
+def _get_executor(kind: str) -> ThreadPoolExecutor:
+    if _io_executor is None or _ai_executor is None:
+        configure_executors()
+    return _ai_executor if kind == "ai" else _io_executor
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """在 I/O 執行緒池執行阻塞函式"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor("io"), functools.partial(func, *args, **kwargs))
+
+
+async def run_ai(func: Callable[..., T], *args, **kwargs) -> T:
+    """在 AI 執行緒池執行耗時的模型呼叫"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor("ai"), functools.partial(func, *args, **kwargs))
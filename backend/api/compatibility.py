@@ -0,0 +1,42 @@
+"""
+衣物兩兩之間的相容旗標
+以一個 uint8 記錄兩件衣物是否同色、厚度是否衝突，推薦引擎對整個 類別 x 類別 區塊一次向量化計算
+"""
+from typing import Dict, Sequence
+
+import numpy as np
+from database.models import ClothingItem
+
+# 相容旗標 (同一個 uint8 的各個 bit)
+SAME_COLOR = 1         # 兩件同色
+WARMTH_CONFLICT = 2    # 列 (上衣) 與欄 (下身) 厚度衝突，例如長袖配短褲
+
+
+def pair_flags(row_color: np.ndarray, row_warmth: np.ndarray,
+               col_color: np.ndarray, col_warmth: np.ndarray) -> np.ndarray:
+    """
+    計算兩組衣物之間的相容旗標
+
+    Args:
+        row_color / col_color: 顏色編號 (同一份編號表)
+        row_warmth / col_warmth: 厚度
+
+    Returns:
+        旗標 [len(row), len(col)] uint8
+    """
+    same = row_color[:, None] == col_color[None, :]
+    # ✅ 關鍵平衡規則：防止長袖配短褲 (長袖/厚重 warmth > 6 配 短褲/輕薄 warmth < 4)，反之亦然
+    wr, wc = row_warmth[:, None], col_warmth[None, :]
+    conflict = ((wr > 6) & (wc < 4)) | ((wc > 7) & (wr < 3))
+    return (same * np.uint8(SAME_COLOR)) | (conflict * np.uint8(WARMTH_CONFLICT))
+
+
+def item_flags(rows: Sequence[ClothingItem], cols: Sequence[ClothingItem]) -> np.ndarray:
+    """直接由衣物計算相容旗標 (列與欄的顏色使用同一份編號表)"""
+    codes: Dict[str, int] = {}
+
+    def encode(items: Sequence[ClothingItem]):
+        color = np.array([codes.setdefault(i.color, len(codes)) for i in items], dtype=np.int32)
+        return color, np.array([i.warmth for i in items], dtype=np.int16)
+
+    return pair_flags(*encode(rows), *encode(cols))
@@ -0,0 +1,256 @@
+"""
+近似重複圖片索引
+以 dHash (64 bit 感知雜湊) 表示圖片，每位使用者一份 multi-index Hamming 索引，
+查詢 Hamming 距離門檻內的圖片時只需比對少數候選
+"""
+import io
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from PIL import Image, ImageOps
+
+# dHash 取樣大小: 9x8 灰階，比較左右相鄰像素得到 64 bit
+DHASH_SIZE = 8
+
+# Hamming 距離小於等於此值視為可能重複 (64 bit 中約 10%)
+NEAR_DUPLICATE_DISTANCE = 6
+
+
+def dhash(image: Image.Image) -> int:
+    """計算圖片的 dHash"""
+    small = image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def dhash_bytes(img_bytes: bytes) -> str:
+    """由圖片 bytes 計算 dHash，回傳 16 字元十六進位字串 (存入資料庫用)"""
+    with Image.open(io.BytesIO(img_bytes)) as image:
+        # JPEG 可直接以縮小尺寸解碼，省下完整解碼的成本
+        image.draft("L", (64, 64))
+        image = ImageOps.exif_transpose(image)
+        return format(dhash(image), "016x")
+
+
+def parse_phash(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value, 16)
+    except ValueError:
+        return None
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class HammingIndex:
+    """
+    multi-index hashing: 將 64 bit 切成 (門檻 + 1) 段，
+    距離不超過門檻的兩個 hash 至少有一段完全相同 (鴿籠原理)，
+    因此只需比對任一段相同的候選
+    """
+
+    def __init__(self, max_distance: int = NEAR_DUPLICATE_DISTANCE, bits: int = DHASH_SIZE * DHASH_SIZE):
+        self.max_distance = max_distance
+        segments = max_distance + 1
+        self._segments: List[Tuple[int, int]] = []  # [(shift, mask), ...]
+        shift = 0
+        for i in range(segments):
+            width = bits // segments + (1 if i < bits % segments else 0)
+            self._segments.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._segments]
+        self._items: Dict[int, List[object]] = {}  # {hash: [item_id, ...]}
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._items.values())
+
+    def add(self, value: int, item_id) -> None:
+        ids = self._items.get(value)
+        if ids is not None:
+            ids.append(item_id)
+            return
+        self._items[value] = [item_id]
+        for table, (shift, mask) in zip(self._tables, self._segments):
+            table.setdefault((value >> shift) & mask, []).append(value)
+
+    def search(self, value: int, max_distance: Optional[int] = None) -> List[Tuple[int, object]]:
+        """
+        查詢距離門檻內的項目 (門檻不可超過建立索引時的 max_distance)
+
+        Returns:
+            [(距離, item_id), ...] 依距離排序
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        candidates = set()
+        for table, (shift, mask) in zip(self._tables, self._segments):
+            candidates.update(table.get((value >> shift) & mask, ()))
+
+        results = []
+        for candidate in candidates:
+            distance = hamming(value, candidate)
+            if distance <= max_distance:
+                results.extend((distance, item_id) for item_id in self._items[candidate])
+        results.sort(key=lambda r: r[0])
+        return results
+
+
+class NearDuplicateIndex:
+    """
+    每位使用者的近似重複索引
+    索引在第一次查詢時由衣櫥資料列建立；新增衣物時直接加入，修改或刪除時整份捨棄重建
+    """
+
+    def __init__(self):
+        self._indexes: Dict[str, HammingIndex] = {}
+        self._names: Dict[str, Dict[object, str]] = {}
+        self._lock = threading.Lock()
+
+    def is_built(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._indexes
+
+    def build(self, user_id: str, rows: Iterable[Dict]) -> None:
+        """由衣櫥資料列 (需含 id, name, image_phash) 建立索引"""
+        index = HammingIndex()
+        names = {}
+        for row in rows:
+            value = parse_phash(row.get("image_phash"))
+            if value is None:
+                continue
+            index.add(value, row.get("id"))
+            names[row.get("id")] = row.get("name") or ""
+        with self._lock:
+            self._indexes[user_id] = index
+            self._names[user_id] = names
+
+    def add(self, user_id: str, phash: Optional[str], item_id, name: str = "") -> None:
+        """加入一筆衣物 (索引尚未建立時忽略，之後建立時會由資料庫讀入)"""
+        value = parse_phash(phash)
+        if value is None:
+            return
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                return
+            index.add(value, item_id)
+            self._names[user_id][item_id] = name
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(user_id, None)
+            self._names.pop(user_id, None)
+
+    def find(self, user_id: str, phash: Optional[str],
+             max_distance: int = NEAR_DUPLICATE_DISTANCE) -> List[Dict]:
+        """
+        查詢可能重複的衣物
+
+        Returns:
+            [{"id", "name", "distance"}, ...] 依距離排序
+        """
+        value = parse_phash(phash)
+        if value is None:
+            return []
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                return []
+            names = self._names[user_id]
+            return [
+                {"id": item_id, "name": names.get(item_id, ""), "distance": distance}
+                for distance, item_id in index.search(value, max_distance)
+            ]
+
+
+def group_near_duplicates(rows: List[Dict], max_distance: int = NEAR_DUPLICATE_DISTANCE) -> List[List[Dict]]:
+    """
+    將衣物依近似重複分群 (需含 id 與 image_phash)
+
+    Returns:
+        兩件以上的群組列表，群組內依 id 排序
+    """
+    index = HammingIndex(max_distance)
+    by_id = {}
+    for row in rows:
+        value = parse_phash(row.get("image_phash"))
+        if value is None:
+            continue
+        index.add(value, row["id"])
+        by_id[row["id"]] = (value, row)
+
+    # union-find 合併距離門檻內的配對
+    parent = {item_id: item_id for item_id in by_id}
+
+    def find_root(item_id):
+        while parent[item_id] != item_id:
+            parent[item_id] = parent[parent[item_id]]
+            item_id = parent[item_id]
+        return item_id
+
+    for item_id, (value, _) in by_id.items():
+        for _, other_id in index.search(value, max_distance):
+            root_a, root_b = find_root(item_id), find_root(other_id)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    groups: Dict[object, List[Dict]] = {}
+    for item_id, (_, row) in by_id.items():
+        groups.setdefault(find_root(item_id), []).append(row)
+    return [
+        sorted(group, key=lambda r: r["id"])
+        for group in groups.values() if len(group) > 1
+    ]
+
+
+if __name__ == "__main__":
+    # 效能測試: 單一使用者 10k 件衣物，比較索引與線性掃描的查詢時間
+    import random
+    import time
+
+    random.seed(0)
+    n_items, n_queries = 10_000, 500
+    hashes = [random.getrandbits(64) for _ in range(n_items)]
+
+    def mutate(value: int, bits: int) -> int:
+        for bit in random.sample(range(64), bits):
+            value ^= 1 << bit
+        return value
+
+    # 一半查詢為已存在圖片的輕微變形，一半為全新圖片
+    queries = [
+        mutate(random.choice(hashes), random.randint(0, NEAR_DUPLICATE_DISTANCE)) if i % 2 == 0
+        else random.getrandbits(64)
+        for i in range(n_queries)
+    ]
+
+    start = time.perf_counter()
+    index = HammingIndex()
+    for idx, value in enumerate(hashes):
+        index.add(value, idx)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    index_results = [index.search(q) for q in queries]
+    index_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    start = time.perf_counter()
+    linear_results = []
+    for q in queries:
+        distances = ((hamming(q, h), idx) for idx, h in enumerate(hashes))
+        linear_results.append(sorted(r for r in distances if r[0] <= NEAR_DUPLICATE_DISTANCE))
+    linear_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    assert [sorted(r) for r in index_results] == linear_results
+    hits = sum(1 for r in index_results if r)
+    print(f"items={n_items} queries={n_queries} hits={hits}")
+    print(f"索引建立: {build_ms:.1f} ms")
+    print(f"索引查詢: {index_ms:.3f} ms/次")
+    print(f"線性掃描: {linear_ms:.3f} ms/次 ({linear_ms / index_ms:.1f}x)")
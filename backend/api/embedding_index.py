@@ -0,0 +1,250 @@
+"""
+衣物外觀向量 (Model A embedding) 的儲存與相似搜尋
+向量正規化後以 float16 存於本地 SQLite；查詢時載入該使用者的向量矩陣，
+衣物不多時直接以矩陣乘法算出全部 cosine 相似度，超過 IVF_THRESHOLD 件時改用 IVF 只比對部分分群
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 儲存格式
+EMBEDDING_DTYPE = np.float16
+
+# 超過此件數改用 IVF 索引
+IVF_THRESHOLD = 4096
+# IVF 查詢時比對的分群數
+IVF_NPROBE = 8
+# 記憶體中最多保留幾位使用者的索引
+MAX_CACHED_USERS = 256
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2 正規化 (內積即為 cosine 相似度)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingStore:
+    """衣物向量 (SQLite，每筆為 float16 bytes)"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS item_embeddings ("
+                "user_id TEXT NOT NULL, item_id INTEGER NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (user_id, item_id))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """開啟連線 (區塊結束時 commit 並關閉)"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def put_many(self, user_id: str, vectors: Dict[int, Sequence[float]]) -> None:
+        if not vectors:
+            return
+        ids = list(vectors)
+        matrix = normalize(np.array([vectors[i] for i in ids])).astype(EMBEDDING_DTYPE)
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO item_embeddings (user_id, item_id, vector) VALUES (?, ?, ?)",
+                [(user_id, int(item_id), row.tobytes()) for item_id, row in zip(ids, matrix)]
+            )
+
+    def delete_many(self, user_id: str, item_ids: Iterable[int]) -> None:
+        ids = [int(i) for i in item_ids]
+        if not ids:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                f"DELETE FROM item_embeddings WHERE user_id = ? AND item_id IN ({', '.join('?' * len(ids))})",
+                [user_id] + ids
+            )
+
+    def load_user(self, user_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            (衣物 id [N], 向量 [N, D] float16)
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT item_id, vector FROM item_embeddings WHERE user_id = ? ORDER BY item_id", (user_id,)
+            ).fetchall()
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=EMBEDDING_DTYPE)
+        ids = np.array([item_id for item_id, _ in rows], dtype=np.int64)
+        matrix = np.frombuffer(b"".join(vector for _, vector in rows), dtype=EMBEDDING_DTYPE)
+        return ids, matrix.reshape(len(rows), -1)
+
+    def stats(self) -> Dict:
+        with self._connect() as conn:
+            (entries,) = conn.execute("SELECT COUNT(*) FROM item_embeddings").fetchone()
+        return {"entries": entries}
+
+
+class VectorIndex:
+    """
+    單一使用者的向量索引
+    件數少於 IVF_THRESHOLD 時為暴力搜尋 (一次矩陣乘法)；
+    否則以球面 K-Means 分成約 sqrt(N) 群，查詢時只比對最接近的 IVF_NPROBE 群
+    """
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray, ivf_threshold: int = IVF_THRESHOLD,
+                 nprobe: int = IVF_NPROBE, seed: int = 0):
+        self.ids = ids
+        self.vectors = normalize(vectors) if len(ids) else np.empty((0, 0), dtype=np.float32)
+        self._positions = {int(item_id): pos for pos, item_id in enumerate(ids)}
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        if len(ids) >= ivf_threshold:
+            self._train_ivf(seed)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _train_ivf(self, seed: int, iterations: int = 10):
+        n_lists = min(len(self.ids), max(16, int(np.sqrt(len(self.ids)))))
+        rng = np.random.default_rng(seed)
+        centroids = self.vectors[rng.choice(len(self.ids), n_lists, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(self.vectors @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = self.vectors[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize(centroids)
+        assign = np.argmax(self.vectors @ centroids.T, axis=1)
+        self.centroids = centroids
+        self._lists = [np.flatnonzero(assign == c) for c in range(n_lists)]
+
+    def vector_of(self, item_id: int) -> Optional[np.ndarray]:
+        pos = self._positions.get(int(item_id))
+        return None if pos is None else self.vectors[pos]
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: Sequence[int] = ()) -> List[Tuple[int, float]]:
+        """
+        Returns:
+            [(衣物 id, cosine 相似度), ...] 由高到低
+        """
+        if not len(self.ids):
+            return []
+        query = normalize(query)
+        if self.centroids is None:
+            candidates = None
+            scores = self.vectors @ query
+        else:
+            probe = np.argsort(self.centroids @ query)[::-1][:self.nprobe]
+            candidates = np.concatenate([self._lists[c] for c in probe])
+            scores = self.vectors[candidates] @ query
+
+        excluded = {int(i) for i in exclude}
+        want = min(len(scores), k + len(excluded))
+        top = np.argpartition(-scores, want - 1)[:want] if want < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        results = []
+        for pos in top:
+            item_id = int(self.ids[pos if candidates is None else candidates[pos]])
+            if item_id in excluded:
+                continue
+            results.append((item_id, float(scores[pos])))
+            if len(results) >= k:
+                break
+        return results
+
+
+class EmbeddingIndex:
+    """
+    每位使用者的向量索引
+    第一次查詢時由 EmbeddingStore 載入；新增或刪除向量時捨棄該使用者的索引，下次查詢重建。
+    每位使用者另有版本號，捨棄時遞增；載入期間版本有變 (同時有新增/刪除) 時不快取載入結果，
+    避免把舊資料建成的索引留在快取中
+    """
+
+    def __init__(self, store: EmbeddingStore, max_users: int = MAX_CACHED_USERS):
+        self.store = store
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, VectorIndex]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, user_id: str) -> VectorIndex:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+                return index
+            version = self._versions.get(user_id, 0)
+        index = VectorIndex(*self.store.load_user(user_id))
+        with self._lock:
+            if self._versions.get(user_id, 0) == version:
+                self._indexes[user_id] = index
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+        return index
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(user_id, None)
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def add(self, user_id: str, vectors: Dict[int, Sequence[float]]) -> None:
+        self.store.put_many(user_id, vectors)
+        self.invalidate(user_id)
+
+    def remove(self, user_id: str, item_ids: Iterable[int]) -> None:
+        self.store.delete_many(user_id, item_ids)
+        self.invalidate(user_id)
+
+    def item_ids(self, user_id: str) -> set:
+        return {int(i) for i in self._get(user_id).ids}
+
+    def similar_to_item(self, user_id: str, item_id: int, k: int = 10) -> Optional[List[Tuple[int, float]]]:
+        """與指定衣物最相似的衣物 (該衣物尚無向量時回傳 None)"""
+        index = self._get(user_id)
+        vector = index.vector_of(item_id)
+        if vector is None:
+            return None
+        return index.search(vector, k, exclude=(item_id,))
+
+    def search(self, user_id: str, vector: Sequence[float], k: int = 10) -> List[Tuple[int, float]]:
+        return self._get(user_id).search(np.asarray(vector), k)
+
+
+if __name__ == "__main__":
+    # 效能測試: 暴力搜尋 vs IVF (512 維)
+    import time
+
+    # 模擬衣物向量: 以少數款式為中心的群聚資料
+    rng = np.random.default_rng(0)
+    for n in (1_000, 10_000, 50_000):
+        styles = rng.standard_normal((max(8, n // 50), 512)).astype(np.float32)
+        vectors = styles[rng.integers(0, len(styles), n)] + 0.5 * rng.standard_normal((n, 512)).astype(np.float32)
+        ids = np.arange(n)
+        queries = vectors[rng.choice(n, 100)] + 0.1 * rng.standard_normal((100, 512)).astype(np.float32)
+        brute = VectorIndex(ids, vectors, ivf_threshold=n + 1)
+        ivf = VectorIndex(ids, vectors, ivf_threshold=0)
+        for name, index in (("brute", brute), ("ivf", ivf)):
+            start = time.perf_counter()
+            found = [index.search(q, 10) for q in queries]
+            elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+            exact = [brute.search(q, 10) for q in queries]
+            recall = np.mean([
+                len({i for i, _ in f} & {i for i, _ in e}) / 10 for f, e in zip(found, exact)
+            ])
+            print(f"n={n:6d} {name:5s} {elapsed:7.3f} ms/query  recall@10={recall:.3f}")
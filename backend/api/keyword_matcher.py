@@ -0,0 +1,83 @@
+"""
+多關鍵字比對 (Aho-Corasick)
+所有關鍵字先編譯成一個自動機，比對一段文字只需掃過一次，不論關鍵字有幾個。
+用於推薦前排除含有避雷關鍵字的衣物
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 避雷清單的分隔符號 (半形/全形逗號、頓號、分號、換行)
+_SEPARATORS = re.compile(r"[,，、;；\n]")
+
+
+def split_keywords(text: Optional[str]) -> List[str]:
+    """將使用者輸入的關鍵字清單切開 (去除空白與空字串)"""
+    if not text:
+        return []
+    return [kw.strip() for kw in _SEPARATORS.split(text) if kw.strip()]
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick 自動機 (不分大小寫)
+    goto 為每個狀態的轉移表；fail 為比對失敗時退回的狀態；
+    output 為到達該狀態時已完整比對到的關鍵字 (含經由 fail 鏈繼承的)
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: Tuple[str, ...] = tuple(sorted({kw.strip().lower() for kw in keywords if kw and kw.strip()}))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[str]] = [None]
+
+        for keyword in self.keywords:
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(None)
+                state = nxt
+            self._output[state] = keyword
+
+        # 以 BFS 建立 fail 連結 (深度 1 的狀態退回根節點)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._output[nxt] is None:
+                    self._output[nxt] = self._output[self._fail[nxt]]
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+    def search(self, text: str) -> Optional[str]:
+        """回傳文字中第一個比對到的關鍵字，沒有時回傳 None"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for ch in text.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+
+@lru_cache(maxsize=256)
+def _compiled(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
+
+
+def compile_keywords(keywords: Sequence[str]) -> KeywordMatcher:
+    """編譯關鍵字 (相同的關鍵字組合共用同一個自動機)"""
+    return _compiled(tuple(sorted({kw.strip().lower() for kw in keywords if kw and kw.strip()})))
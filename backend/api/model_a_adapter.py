@@ -1,16 +1,18 @@
 import sys
 from pathlib import Path
-from PIL import Image
-import io
-import torch
+from typing import Dict, List, Optional
 import logging
+import threading
+import time
 
 # 加入專案根目錄到 sys.path，確保能 import model_a
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(BASE_DIR))
 
+# 只載入純 Python 的模組；torch / torchvision / cv2 等延遲到第一次使用 (或背景暖機) 時才載入
 try:
-    from model_a.inference import FashionPredictor
+    from model_a import config as model_a_config
+    from model_a.batcher import MicroBatcher, BatcherFullError
     MODEL_A_AVAILABLE = True
 except ImportError as e:
     print(f"⚠️ Model A import failed: {e}")
@@ -18,33 +20,96 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# Model A 載入狀態 (供 /health 顯示)
+STATE_NOT_LOADED = "not_loaded"
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_UNAVAILABLE = "unavailable"
+
+# 微批次設定: 併發的推論請求最多等待 10ms 合併為一批
+BATCH_MAX_SIZE = 16
+BATCH_MAX_WAIT_MS = 10
+BATCH_MAX_QUEUE = 64
+# 單次推論等待結果的上限 (秒)
+PREDICT_TIMEOUT = 60
+
 class ModelAAdapter:
     _instance = None
+    _lock = threading.Lock()
+    _state = STATE_NOT_LOADED
     
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(ModelAAdapter, cls).__new__(cls)
-            cls._instance._initialize()
+        with cls._lock:
+            if cls._instance is None:
+                cls._state = STATE_LOADING
+                instance = super(ModelAAdapter, cls).__new__(cls)
+                instance._initialize()
+                cls._instance = instance
+                cls._state = STATE_READY if instance.predictor else STATE_UNAVAILABLE
         return cls._instance
     
+    @classmethod
+    def state(cls) -> str:
+        return cls._state
+    
+    @classmethod
+    def warm_up_in_background(cls) -> Optional[threading.Thread]:
+        """在背景執行緒載入模型並跑一次推論 (已載入時不做事)"""
+        if cls._instance is not None:
+            return None
+        thread = threading.Thread(target=cls._warm_up, name="model-a-warmup", daemon=True)
+        thread.start()
+        return thread
+    
+    @classmethod
+    def _warm_up(cls):
+        start = time.perf_counter()
+        adapter = cls()
+        if adapter.predictor is None:
+            return
+        try:
+            # 跑一次推論，讓 kernel 初始化等一次性成本不落在第一個使用者身上
+            from PIL import Image
+            blank = Image.new("RGB", (model_a_config.IMG_SIZE, model_a_config.IMG_SIZE), "white")
+            adapter.predictor.predict_batch([blank])
+        except Exception as e:
+            logger.warning(f"⚠️ Model A warm-up inference failed: {e}")
+        logger.info(f"✅ Model A warm-up finished in {time.perf_counter() - start:.1f}s")
+    
+    @classmethod
+    def stats(cls) -> Optional[Dict]:
+        """微批次統計 (模型尚未載入時回傳 None，不會觸發載入)"""
+        instance = cls._instance
+        if instance is None or instance.batcher is None:
+            return None
+        return instance.batcher.stats()
+    
     def _initialize(self):
         self.predictor = None
+        self.batcher = None
         if not MODEL_A_AVAILABLE:
-            logger.warning("Model A module not found.")
+            # model_a 套件本身無法載入 (state 會是 STATE_UNAVAILABLE)
+            return
+        try:
+            from model_a.inference import FashionPredictor
+        except ImportError as e:
+            logger.warning(f"⚠️ Model A import failed: {e}")
             return
 
-        # 模型權重路徑
-        # 優先尋找最佳模型
-        checkpoint_path = BASE_DIR / "model_a" / "output" / "checkpoints" / "best.pth"
+        # 模型檔路徑 (依 MODEL_A_BACKEND 選擇 best.pth / TorchScript / ONNX)
+        backend = model_a_config.INFERENCE_BACKEND
+        checkpoint_path = model_a_config.MODEL_PATHS.get(backend, model_a_config.MODEL_PATHS['torch'])
         
         if checkpoint_path.exists():
             try:
                 # 載入模型 (這裡會自動使用 GPU 或 CPU)
-                self.predictor = FashionPredictor(str(checkpoint_path))
+                self.predictor = FashionPredictor(str(checkpoint_path), backend=backend)
+                self.batcher = MicroBatcher(self.predictor, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_MAX_QUEUE)
                 logger.info(f"✅ Model A loaded from {checkpoint_path}")
             except Exception as e:
                 logger.error(f"❌ Failed to load Model A: {e}")
                 self.predictor = None
+                self.batcher = None
         else:
             logger.warning(f"⚠️ Model A checkpoint not found at {checkpoint_path}")
             self.predictor = None
@@ -66,29 +131,8 @@ class ModelAAdapter:
             return None
             
         try:
-            # 將 bytes 轉換為 PIL Image
-            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-            # 儲存為暫存檔供推論使用 (inference.py 設計是用路徑讀取)
-            # 為了效能，我們稍後應該修改 inference.py 支援直接傳入 PIL Image
-            # 但現在先用最簡單的方法: 改寫 inference.py 的介面
-            
-            # 使用我們修改過後的 predictor.predict_from_image (稍後需要在 inference.py 中增加此方法)
-            # 或者直接修改 inference.py 讓 predict 接受 PIL Image
-            
-            # 這裡我們需要對 inference.py 做一點小修改來支援 memory image
-            # 暫時先把 PIL image 傳過去，假設我們會修改 inference.py
-            
-            # 呼叫預測 (注意：這裡假設 predict 已經被修改為支援 PIL Image 或我們需要修改它)
-            # 為了不改動太多 model_a 的代碼，我們先用臨時文件的方法 (雖然慢一點但最穩)
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-                image.save(tmp.name)
-                tmp_path = tmp.name
-            
-            result = self.predictor.predict(tmp_path, top_k=3)
-            
-            # 清理暫存檔
-            Path(tmp_path).unlink()
+            # 經由微批次佇列推論，與其他同時進行的請求合併為一批
+            result = self.batcher.submit(image_bytes, top_k=3).result(PREDICT_TIMEOUT)
             
             # 格式化輸出
             return self._format_result(result)
@@ -97,6 +141,43 @@ class ModelAAdapter:
             logger.error(f"❌ Model A inference error: {e}")
             return None
 
+    def analyze_images(self, images_bytes: List[bytes]) -> List[Optional[dict]]:
+        """
+        批次分析多張圖片
+        全部排入微批次佇列，與其他使用者同時送出的圖片一起推論
+        
+        Returns:
+            與輸入順序相同的結果列表，無法辨識的圖片為 None
+        """
+        if not self.predictor:
+            return [None] * len(images_bytes)
+        
+        futures = []
+        for image_bytes in images_bytes:
+            try:
+                futures.append(self.batcher.submit(image_bytes, top_k=3))
+            except BatcherFullError as e:
+                logger.warning(f"⚠️ {e}")
+                futures.append(None)
+        
+        results = []
+        for future in futures:
+            try:
+                results.append(self._format_result(future.result(PREDICT_TIMEOUT)) if future else None)
+            except Exception as e:
+                logger.error(f"❌ Model A inference error: {e}")
+                results.append(None)
+        return results
+
+    def embed_images(self, images_bytes: List[bytes]) -> List[Optional[List[float]]]:
+        """
+        批次計算外觀向量 (Model A 的 embedding)
+        
+        Returns:
+            與輸入順序相同的向量列表，無法辨識的圖片為 None
+        """
+        return [result["embedding"] if result else None for result in self.analyze_images(images_bytes)]
+
     def _format_result(self, raw_result):
         """將 Model A 的原始輸出轉換為前端需要的格式"""
         
@@ -126,43 +207,14 @@ class ModelAAdapter:
             "colors": [color_name], # 前端顯示中文與 Hex
             "style": [style],
             "confidence": confidence,
+            "embedding": raw_result.get('embedding'),  # 外觀向量，供相似衣物搜尋
             "source": "model_a" # 標記來源
         }
 
     def _get_color_name(self, hex_code):
-        """將 Hex 色碼轉換為中文顏色名稱 (簡單版)"""
-        # 將 hex 轉為 rgb
-        h = hex_code.lstrip('#')
-        r, g, b = tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
-        
-        # 定義基本顏色中心點
-        colors = {
-            "黑色": (0, 0, 0),
-            "白色": (255, 255, 255),
-            "灰色": (128, 128, 128),
-            "紅色": (255, 0, 0),
-            "橘色": (255, 165, 0),
-            "黃色": (255, 255, 0),
-            "綠色": (0, 128, 0),
-            "藍色": (0, 0, 255),
-            "紫色": (128, 0, 128),
-            "粉紅": (255, 192, 203),
-            "棕色": (165, 42, 42),
-            "米色": (245, 245, 220),
-            "卡其": (240, 230, 140),
-            "深藍": (0, 0, 139),
-        }
-        
-        min_dist = float('inf')
-        closest_name = "其他"
-        
-        for name, (cr, cg, cb) in colors.items():
-            dist = ((r - cr)**2 + (g - cg)**2 + (b - cb)**2) ** 0.5
-            if dist < min_dist:
-                min_dist = dist
-                closest_name = name
-                
-        return closest_name
+        """將 Hex 色碼轉換為中文顏色名稱 (CIELAB 空間中最近的調色盤顏色)"""
+        from model_a.colors import color_name
+        return color_name(hex_code)
 
     def _translate_style(self, style):
         MAPPING = {
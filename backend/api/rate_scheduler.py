@@ -0,0 +1,285 @@
+"""
+Gemini 呼叫排程器
+每個模型層級 (tier) 各自一個 token bucket，等待佇列依使用者輪流分配，
+bucket 狀態可存放於 SQLite 讓多個 worker 行程共用
+"""
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, Optional, Tuple
+
+from api.async_utils import run_blocking
+
+# 非輪到自己時的輪詢間隔 (秒)
+POLL_INTERVAL = 0.05
+
+
+def backoff_delay(attempt: int, base: float = 2.0, cap: float = 60.0) -> float:
+    """指數退避加隨機抖動 (full jitter)，避免多個請求同時重試"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+@dataclass
+class TierConfig:
+    """單一模型層級的速率設定"""
+    rate_per_minute: float
+    burst: int = 1
+
+    @property
+    def rate_per_second(self) -> float:
+        return self.rate_per_minute / 60.0
+
+
+class BucketStore:
+    """token bucket 狀態儲存介面 (take 必須是原子操作)"""
+
+    def take(self, bucket: str, rate: float, capacity: int) -> float:
+        """
+        嘗試取出一個 token
+
+        Returns:
+            0 表示成功；否則為預計還需等待的秒數
+        """
+        raise NotImplementedError
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, capacity: int) -> float:
+    return min(float(capacity), tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryBucketStore(BucketStore):
+    """行程內 bucket 狀態 (單一 worker 使用)"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # {bucket: (tokens, updated)}
+        self._lock = threading.Lock()
+
+    def take(self, bucket: str, rate: float, capacity: int) -> float:
+        with self._lock:
+            now = time.time()
+            tokens, updated = self._buckets.get(bucket, (float(capacity), now))
+            tokens = _refill(tokens, updated, now, rate, capacity)
+            if tokens >= 1:
+                self._buckets[bucket] = (tokens - 1, now)
+                return 0.0
+            self._buckets[bucket] = (tokens, now)
+            return (1 - tokens) / rate
+
+
+class SQLiteBucketStore(BucketStore):
+    """以本地 SQLite 檔案共用 bucket 狀態 (同一台主機的多個 uvicorn worker)"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+
+    def take(self, bucket: str, rate: float, capacity: int) -> float:
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE 取得寫入鎖，確保跨行程的讀取-更新是原子的
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (bucket,)).fetchone()
+            tokens, updated = row if row else (float(capacity), now)
+            tokens = _refill(tokens, updated, now, rate, capacity)
+
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (bucket, tokens, now)
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+
+@dataclass(eq=False)
+class _Ticket:
+    user_id: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class _TierState:
+    """單一層級的等待佇列與統計"""
+
+    def __init__(self):
+        # 依使用者分組的等待佇列，OrderedDict 的順序即輪替順序
+        self.queues: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self.depth = 0
+        self.granted = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.wait_ms: Deque[float] = deque(maxlen=500)
+
+
+class RateScheduler:
+    """
+    多層級 token bucket 排程器
+
+    - 每個 tier 一個 bucket (如 t1 = gemini-2.5-flash, t2 = gemini-3-flash-preview)
+    - 同一 tier 的等待者依使用者輪流取得 token，單一使用者的大量請求不會餓死其他人
+    - 佇列有長度上限，每個請求有等待期限，逾時回傳 False 由呼叫端改走下一層
+    """
+
+    def __init__(self, tiers: Dict[str, TierConfig], store: Optional[BucketStore] = None,
+                 max_queue: int = 50, default_timeout: float = 60.0):
+        self.tiers = tiers
+        self.store = store or MemoryBucketStore()
+        self.max_queue = max_queue
+        self.default_timeout = default_timeout
+        self._states = {name: _TierState() for name in tiers}
+        self._cond = threading.Condition()
+
+    # ---------- 佇列操作 (需持有 self._cond) ----------
+
+    def _enqueue(self, tier: str, user_id: str) -> Optional[_Ticket]:
+        state = self._states[tier]
+        if state.depth >= self.max_queue:
+            state.rejected += 1
+            return None
+        ticket = _Ticket(user_id)
+        state.queues.setdefault(user_id, deque()).append(ticket)
+        state.depth += 1
+        return ticket
+
+    def _remove(self, tier: str, ticket: _Ticket, rotate: bool):
+        state = self._states[tier]
+        queue = state.queues.get(ticket.user_id)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        state.depth -= 1
+        if not queue:
+            del state.queues[ticket.user_id]
+        elif rotate:
+            # 取得 token 後換下一位使用者
+            state.queues.move_to_end(ticket.user_id)
+
+    def _is_turn(self, tier: str, ticket: _Ticket) -> bool:
+        queues = self._states[tier].queues
+        if not queues:
+            return False
+        first_user = next(iter(queues))
+        return first_user == ticket.user_id and queues[first_user][0] is ticket
+
+    def _my_turn(self, tier: str, ticket: _Ticket) -> bool:
+        with self._cond:
+            return self._is_turn(tier, ticket)
+
+    def _take_token(self, tier: str) -> float:
+        """向 bucket 取 token (SQLite 可能等待寫入鎖，不可持有 self._cond 呼叫)"""
+        config = self.tiers[tier]
+        return self.store.take(tier, config.rate_per_second, config.burst)
+
+    def _grant(self, tier: str, ticket: _Ticket):
+        with self._cond:
+            state = self._states[tier]
+            self._remove(tier, ticket, rotate=True)
+            state.granted += 1
+            state.wait_ms.append((time.monotonic() - ticket.enqueued_at) * 1000)
+            self._cond.notify_all()
+
+    def _give_up(self, tier: str, ticket: _Ticket):
+        with self._cond:
+            queue = self._states[tier].queues.get(ticket.user_id)
+            if queue is None or ticket not in queue:
+                return
+            self._remove(tier, ticket, rotate=False)
+            self._states[tier].timeouts += 1
+            self._cond.notify_all()
+
+    # ---------- 對外介面 ----------
+
+    def acquire(self, tier: str, user_id: str = "", timeout: Optional[float] = None) -> bool:
+        """
+        等待並取得一次呼叫額度 (阻塞版，供執行緒池中的同步程式使用)
+
+        Returns:
+            是否在期限內取得額度 (佇列已滿或逾時回傳 False)
+        """
+        with self._cond:
+            ticket = self._enqueue(tier, user_id)
+        if ticket is None:
+            return False
+
+        deadline = ticket.enqueued_at + (self.default_timeout if timeout is None else timeout)
+        try:
+            while True:
+                # 只有佇列最前面的請求會取 token，因此取 token 時不需持有 self._cond
+                wait = self._take_token(tier) if self._my_turn(tier, ticket) else POLL_INTERVAL
+                if wait <= 0:
+                    self._grant(tier, ticket)
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._give_up(tier, ticket)
+                    return False
+                with self._cond:
+                    self._cond.wait(min(wait, remaining))
+        except BaseException:
+            self._give_up(tier, ticket)
+            raise
+
+    async def aacquire(self, tier: str, user_id: str = "", timeout: Optional[float] = None) -> bool:
+        """acquire 的非同步版 (以 asyncio.sleep 等待，取 token 在 I/O 執行緒池執行，不阻塞 event loop)"""
+        with self._cond:
+            ticket = self._enqueue(tier, user_id)
+        if ticket is None:
+            return False
+
+        deadline = ticket.enqueued_at + (self.default_timeout if timeout is None else timeout)
+        try:
+            while True:
+                wait = await run_blocking(self._take_token, tier) if self._my_turn(tier, ticket) else POLL_INTERVAL
+                if wait <= 0:
+                    self._grant(tier, ticket)
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._give_up(tier, ticket)
+                    return False
+                await asyncio.sleep(min(wait, remaining))
+        except BaseException:
+            self._give_up(tier, ticket)
+            raise
+
+    def stats(self) -> Dict:
+        """各層級佇列深度與等待時間統計"""
+        result = {}
+        with self._cond:
+            for name, state in self._states.items():
+                waits = sorted(state.wait_ms)
+                result[name] = {
+                    "queue_depth": state.depth,
+                    "waiting_users": len(state.queues),
+                    "granted": state.granted,
+                    "timeouts": state.timeouts,
+                    "rejected": state.rejected,
+                    "wait_ms_avg": round(sum(waits) / len(waits), 1) if waits else 0.0,
+                    "wait_ms_p95": round(waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+                    "wait_ms_max": round(waits[-1], 1) if waits else 0.0,
+                }
+        return result
@@ -1,100 +1,439 @@
-from typing import List, Dict, Optional
-import random
+from typing import List, Dict, Optional, Sequence
 import logging
+import numpy as np
 from database.models import ClothingItem, WeatherData
+from api.compatibility import SAME_COLOR, WARMTH_CONFLICT, item_flags
+from api.keyword_matcher import KeywordMatcher, compile_keywords
 
 logger = logging.getLogger(__name__)
 
+# 評分規則
+BASE_SCORE = 70
+COLOR_BONUS = 10    # 整套顏色不超過 2 種
+STYLE_BONUS = 15    # 任一單品名稱符合指定風格
+USED_PENALTY = 20   # 單品已在前面的推薦中出現 (軟扣分)
+
+# 不合法組合的分數
+INVALID_SCORE = -(10 ** 6)
+
+# recommend_k 每輪只重新計算第一輪分數最高的這些組合 (扣分只會讓分數下降)
+CANDIDATE_POOL = 512
+
+
 class RecommendationEngine:
-    def __init__(self):
+    def __init__(self, seed: Optional[int] = None):
+        """
+        Args:
+            seed: 同分組合的排序亂數種子 (指定時結果可重現，None 則每次推薦略有變化)
+        """
         self.NEUTRAL_COLORS = ["黑色", "白色", "灰色", "深藍", "卡其", "米色", "咖啡"]
-        
+        self.rng = np.random.default_rng(seed)
+
     def recommend(
-        self, wardrobe: List[ClothingItem], weather: WeatherData, occasion: str, 
+        self, wardrobe: List[ClothingItem], weather: WeatherData, occasion: str,
         user_gender: str = "中性", target_style: Optional[str] = None, force_outer: bool = False,
-        used_items: Optional[List[int]] = None
+        used_items: Optional[List[int]] = None, top_k: int = 3,
+        locked_items: Optional[Sequence] = None, dislikes: Optional[Sequence[str]] = None
     ) -> List[Dict]:
-        """核心推薦 - 防止長袖配短褲版 + 軟扣分機制避免重複推薦"""
-        if used_items is None:
-            used_items = []
-        valid_items = self._pre_filter(wardrobe, weather, occasion, user_gender)
-        
-        tops = [i for i in valid_items if i.category == "上衣"]
-        bottoms = [i for i in valid_items if i.category == "下身"]
-        outers = [i for i in valid_items if i.category == "外套"]
-        shoes = [i for i in valid_items if i.category == "鞋子"]
-            
-        need_outer = (weather.temp < 22) or force_outer
-        candidates = []
-        
-        # 配對邏輯
-        if tops and bottoms:
-            for _ in range(50): # 增加嘗試次數
-                t = random.choice(tops)
-                b = random.choice(bottoms)
-                s = random.choice(shoes) if shoes else None
-                
-                # ✅ 關鍵平衡規則：防止長袖配短褲
-                # 長袖/厚重 (warmth > 6), 短褲/輕薄 (warmth < 4)
-                if t.warmth > 6 and b.warmth < 4: continue 
-                # 反之亦然
-                if b.warmth > 7 and t.warmth < 3: continue 
-                
-                outfit_items = [t, b]
-                if s: outfit_items.append(s)
-                if need_outer and outers:
-                    o = self._find_best_match(t, outers)
-                    if o: outfit_items.append(o)
-                
-                outfit = {"items": outfit_items, "score": 0, "reasons": [], "type": "2-piece"}
-                self._score_outfit(outfit, weather, target_style, used_items)
-                candidates.append(outfit)
-
-        if not candidates: return []
-        candidates.sort(key=lambda x: x["score"], reverse=True)
-        
-        final_list = []
-        for c in candidates[:3]:
-            final_list.append({
-                "items": [item.to_dict() for item in c["items"]],
-                "score": c["score"],
-                "reasons": c["reasons"],
-                "type": c["type"]
-            })
-        return final_list
-
-    def _pre_filter(self, items: List[ClothingItem], weather: WeatherData, occasion: str, user_gender: str) -> List[ClothingItem]:
+        """
+        核心推薦 - 防止長袖配短褲版 + 軟扣分機制避免重複推薦
+        對所有 上衣 x 下身 組合一次向量化評分 (每組搭配分數最高的鞋子與外套)，取分數最高的 top_k 套
+
+        Args:
+            locked_items: 指定單品 id，每套都必須包含 (該類別只從指定單品中挑選，同類別有多件時每套取其中一件)
+            dislikes: 避雷關鍵字，名稱或顏色含有任一關鍵字的衣物不列入候選
+        """
+        slots = self._slots(wardrobe, weather, occasion, user_gender, force_outer, locked_items, dislikes)
+        if slots is None:
+            return []
+        pairs = self._score_pairs(*slots, target_style, set(used_items or []))
+        scores = self._with_shoes(pairs)
+        return [
+            self._outfit(slots, pairs, t, b, self._shoe_for(pairs, t * scores.shape[1] + b), scores[t, b])
+            for t, b in self._top_pairs(scores, top_k)
+        ]
+
+    def recommend_k(
+        self, wardrobe: List[ClothingItem], weather: WeatherData, occasion: str,
+        user_gender: str = "中性", target_style: Optional[str] = None, force_outer: bool = False,
+        k: int = 3, used_items: Optional[List[int]] = None,
+        locked_items: Optional[Sequence] = None, dislikes: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        """
+        一次推薦 k 套彼此差異大的穿搭
+        組合分數只計算一次；每選出一套，該套的單品在之後的組合中扣 USED_PENALTY 分
+        (與逐套呼叫 recommend 並累積 used_items 的軟扣分規則相同)，鞋子依扣分後的分數重新挑選
+
+        指定單品每套都會出現，不扣分；locked_items / dislikes 同 recommend
+
+        扣分只會讓分數下降，因此之後每輪只需重算第一輪前 CANDIDATE_POOL 名的組合：
+        候選中的最高分不低於候選外的最高分時即為全體最佳，否則才整批重算
+        """
+        slots = self._slots(wardrobe, weather, occasion, user_gender, force_outer, locked_items, dislikes)
+        if slots is None:
+            return []
+        tops, bottoms, shoes, outers = slots
+        pairs = self._score_pairs(*slots, target_style, set(used_items or []))
+        outer_idx = pairs["outer_idx"]
+        n_bottoms = len(bottoms)
+
+        flat = self._with_shoes(pairs).ravel()
+        n_valid = int(np.count_nonzero(flat > INVALID_SCORE))
+        if n_valid == 0:
+            return []
+        pool_size = min(n_valid, max(CANDIDATE_POOL, k))
+        if pool_size < flat.size:
+            order = np.argpartition(flat, flat.size - pool_size - 1)
+            pool = order[flat.size - pool_size:]
+            # 候選以外組合的最高分 (之後各輪的上限)
+            outside_best = flat[order[flat.size - pool_size - 1]]
+        else:
+            pool, outside_best = np.arange(flat.size), INVALID_SCORE
+
+        # 本次選出的單品 (原本就在 used_items 中的單品已扣過分、指定單品每套都會出現，皆不扣分)
+        locked = self._locked_ids(locked_items)
+        base_used = {slot: used.astype(bool) for slot, used in pairs["used"].items() if used is not None}
+        for slot, items in (("top", tops), ("bottom", bottoms), ("outer", outers)):
+            if slot in base_used:
+                base_used[slot] |= np.array([str(i.id) in locked for i in items], dtype=bool)
+        new_top = np.zeros(len(tops), dtype=bool)
+        new_bottom = np.zeros(n_bottoms, dtype=bool)
+        new_outer = np.zeros(len(outers), dtype=bool)
+        shoe_used = pairs["shoes"]["used"].copy() if shoes else None
+        picked = np.zeros(flat.size, dtype=bool)
+
+        def penalized(index: Optional[np.ndarray]) -> np.ndarray:
+            """扣分後的分數 (index 為 None 時計算全部組合，攤平為一維)"""
+            scores = self._with_shoes(pairs, shoe_used, index)
+            top_penalty = (new_top & ~base_used["top"]).astype(np.int32)
+            if outer_idx is not None:
+                top_penalty += (new_outer & ~base_used["outer"])[outer_idx]
+            bottom_penalty = (new_bottom & ~base_used["bottom"]).astype(np.int32)
+            if index is None:
+                scores -= USED_PENALTY * (top_penalty[:, None] + bottom_penalty[None, :])
+                scores = scores.ravel()
+                scores[picked] = INVALID_SCORE
+            else:
+                t_idx, b_idx = np.divmod(index, n_bottoms)
+                scores -= USED_PENALTY * (top_penalty[t_idx] + bottom_penalty[b_idx])
+                scores[picked[index]] = INVALID_SCORE
+            return scores
+
+        outfits = []
+        for _ in range(k):
+            scores = penalized(pool)
+            best = self._top_indices(scores, 1)
+            if best.size and scores[best[0]] >= outside_best:
+                flat_index = int(pool[best[0]])
+            else:
+                scores = penalized(None)
+                best = self._top_indices(scores, 1)
+                if not best.size:
+                    break
+                flat_index = int(best[0])
+            t, b = divmod(flat_index, n_bottoms)
+            shoe = self._shoe_for(pairs, flat_index, shoe_used)
+            outfits.append(self._outfit(slots, pairs, t, b, shoe, scores[best[0]]))
+
+            # 已選出的單品在之後的組合中扣分
+            picked[flat_index] = True
+            new_top[t] = True
+            new_bottom[b] = True
+            if outer_idx is not None:
+                new_outer[outer_idx[t]] = True
+            if shoe is not None and str(shoes[shoe].id) not in locked:
+                shoe_used[shoe] = 1
+        return outfits
+
+    def _slots(self, wardrobe: List[ClothingItem], weather: WeatherData, occasion: str,
+               user_gender: str, force_outer: bool, locked_items: Optional[Sequence] = None,
+               dislikes: Optional[Sequence[str]] = None):
+        """
+        依類別分出候選單品
+        有指定單品的類別只保留指定單品 (不受天氣與避雷清單限制)，其他類別為篩選後的單品
+
+        Returns:
+            (上衣, 下身, 鞋子, 外套)；不需外套時外套為空，沒有上衣或下身時回傳 None
+        """
+        locked = self._locked_ids(locked_items)
+        pinned = [i for i in wardrobe if str(i.id) in locked]
+        matcher = compile_keywords(dislikes) if dislikes else None
+        valid_items = self._pre_filter(
+            [i for i in wardrobe if str(i.id) not in locked], weather, occasion, user_gender, matcher
+        )
+
+        def slot(category: str) -> List[ClothingItem]:
+            return [i for i in pinned if i.category == category] or \
+                [i for i in valid_items if i.category == category]
+
+        tops, bottoms, outers, shoes = slot("上衣"), slot("下身"), slot("外套"), slot("鞋子")
+
+        need_outer = (weather.temp < 22) or force_outer or any(i.category == "外套" for i in pinned)
+        if not tops or not bottoms:
+            return None
+        return tops, bottoms, shoes, outers if need_outer else []
+
+    @staticmethod
+    def _locked_ids(locked_items: Optional[Sequence]) -> set:
+        """指定單品 id (前端傳入的可能是字串，一律以字串比對)"""
+        return {str(i) for i in locked_items} if locked_items else set()
+
+    @staticmethod
+    def _outfit(slots, pairs: Dict, t: int, b: int, shoe: Optional[int], score: int) -> Dict:
+        tops, bottoms, shoes, outers = slots
+        outfit_items = [tops[t], bottoms[b]]
+        if shoe is not None:
+            outfit_items.append(shoes[shoe])
+        if pairs["outer_idx"] is not None:
+            outfit_items.append(outers[pairs["outer_idx"][t]])
+        return {
+            "items": [item.to_dict() for item in outfit_items],
+            "score": int(score),
+            "reasons": [],
+            "type": "2-piece"
+        }
+
+    def _pre_filter(self, items: List[ClothingItem], weather: WeatherData, occasion: str, user_gender: str,
+                    dislikes: Optional[KeywordMatcher] = None) -> List[ClothingItem]:
+        """排除不適合天氣的單品，以及名稱或顏色含有避雷關鍵字的單品"""
         filtered = []
         for item in items:
             if weather.temp > 28 and item.warmth > 6: continue
             if weather.temp < 15 and item.warmth < 3: continue
+            if dislikes and dislikes.search(f"{item.name}{item.color}") is not None: continue
             filtered.append(item)
         return filtered
 
-    def _score_outfit(self, outfit: Dict, weather: WeatherData, target_style: str, used_items: Optional[List[int]] = None, penalty_amount: int = 20):
-        """計算服裝配對分數，支援軟扣分機制"""
-        score = 70
-        items = outfit["items"]
-        
-        # 簡單評分 logic
-        colors = [i.color for i in items]
-        if len(set(colors)) <= 2: score += 10
-        
-        if target_style:
-            for item in items:
-                if target_style.lower() in str(item.name).lower():
-                    score += 15; break
-        
-        # ✅ 軟扣分機制：若該單品已在前面被使用，扣分
-        if used_items:
-            for item in items:
-                if hasattr(item, 'id') and item.id in used_items:
-                    score -= penalty_amount  # 扣分，但若分數高仍會被選中
-            
-        outfit["score"] = score
-
-    def _find_best_match(self, base_item: ClothingItem, candidates: List[ClothingItem]) -> Optional[ClothingItem]:
-        for c in candidates:
-            if c.color == base_item.color or c.color in self.NEUTRAL_COLORS:
-                return c
-        return candidates[0] if candidates else None
+    @staticmethod
+    def _encode(items: Sequence[ClothingItem], color_ids: Dict[str, int],
+                target_style: Optional[str], used: set) -> Dict[str, np.ndarray]:
+        """將單品轉為陣列: 顏色編號、名稱是否符合風格、是否已使用"""
+        style = target_style.lower() if target_style else None
+        return {
+            "color": np.array([color_ids[i.color] for i in items], dtype=np.int32),
+            "hit": np.array([bool(style) and style in str(i.name).lower() for i in items], dtype=bool),
+            "used": np.array([i.id in used for i in items], dtype=np.int32),
+        }
+
+    def _score_pairs(self, tops, bottoms, shoes, outers, target_style, used) -> Dict:
+        """
+        計算所有 上衣 x 下身 組合的分數 (不含鞋子)
+        兩件衣物是否同色、厚度是否衝突由 compatibility.item_flags 一次算出整個區塊
+        鞋子維度不展開: 依組合的顏色數與是否已符合風格編號，之後由 _with_shoes 查表加上最佳鞋子，
+        結果等同窮舉 上衣 x 下身 x 鞋子 後對鞋子取最大值
+
+        Returns:
+            dict: scores [T, B] / invalid [T, B] (違反厚度規則) / code [T, B] 或 None /
+                  shoes (鞋子編碼) 或 None / n_color_ids / outer_idx (每件上衣搭配的外套索引) 或 None /
+                  used (上衣、下身、外套原本是否已使用)
+        """
+        color_ids = {c: n for n, c in enumerate(sorted({i.color for i in [*tops, *bottoms, *shoes, *outers]}))}
+        T = self._encode(tops, color_ids, target_style, used)
+        B = self._encode(bottoms, color_ids, target_style, used)
+        top_bottom = item_flags(tops, bottoms)
+        diff_tb = (top_bottom & SAME_COLOR) == 0
+
+        # 外套只取決於上衣: 同色或中性色優先，都沒有則取第一件
+        O = None
+        if outers:
+            O = self._encode(outers, color_ids, target_style, used)
+            neutral = np.array([o.color in self.NEUTRAL_COLORS for o in outers])
+            same_to = (item_flags(tops, outers) & SAME_COLOR) != 0
+            outer_idx = (same_to | neutral[None, :]).argmax(axis=1)
+            o_color, o_hit, o_used = O["color"][outer_idx], O["hit"][outer_idx], O["used"][outer_idx]
+            # 外套與上衣、下身都不同色時多一種顏色
+            o_new = ~same_to[np.arange(len(tops)), outer_idx][:, None] & \
+                ((item_flags(outers, bottoms) & SAME_COLOR) == 0)[outer_idx]
+        else:
+            outer_idx = None
+            o_color = np.full(len(tops), -1, dtype=np.int32)
+            o_hit = np.zeros(len(tops), dtype=bool)
+            o_used = np.zeros(len(tops), dtype=np.int32)
+            o_new = False
+
+        ct, cb, co = T["color"][:, None], B["color"][None, :], o_color[:, None]
+        n_colors = diff_tb.astype(np.int32) + o_new + 1
+        hit = (T["hit"] | o_hit)[:, None] | B["hit"][None, :]
+        # 上衣 (含外套) 與下身各自的分數先算好，組合分數只需一次相加
+        top_part = BASE_SCORE - USED_PENALTY * (T["used"] + o_used)
+        scores = top_part[:, None] - USED_PENALTY * B["used"][None, :] + STYLE_BONUS * hit
+
+        code = None
+        if shoes:
+            k = len(color_ids)
+            c2 = np.where(diff_tb, cb, co).clip(min=0)
+            code = ((hit * np.int32(3) + n_colors - 1) * k + ct) * k + c2
+        else:
+            scores += COLOR_BONUS * (n_colors <= 2)
+
+        # ✅ 關鍵平衡規則：防止長袖配短褲 (厚度衝突旗標見 compatibility.pair_flags)
+        invalid = (top_bottom & WARMTH_CONFLICT) != 0
+        return {
+            "scores": scores,
+            "invalid": invalid,
+            "code": code,
+            "shoes": self._encode(shoes, color_ids, target_style, used) if shoes else None,
+            "n_color_ids": len(color_ids),
+            "outer_idx": outer_idx,
+            "used": {"top": T["used"], "bottom": B["used"], "outer": O["used"] if O is not None else None},
+        }
+
+    def _with_shoes(self, pairs: Dict, shoe_used: Optional[np.ndarray] = None,
+                    index: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        加上每組分數最高的鞋子帶來的加分
+
+        Args:
+            shoe_used: 覆寫鞋子的已使用次數 (recommend_k 逐套扣分時使用)
+            index: 只計算這些組合 (攤平後的索引)
+
+        Returns:
+            分數 [T, B] 或 [len(index)]，不合法組合為 INVALID_SCORE
+        """
+        def pick(values: np.ndarray) -> np.ndarray:
+            return values if index is None else values.ravel()[index]
+
+        scores = pick(pairs["scores"]).copy()
+        if pairs["code"] is not None:
+            table_score, _ = self._shoe_table(self._shoes(pairs, shoe_used), pairs["n_color_ids"])
+            scores += table_score.ravel().take(pick(pairs["code"]))
+        scores[pick(pairs["invalid"])] = INVALID_SCORE
+        return scores
+
+    def _shoe_for(self, pairs: Dict, flat_index: int, shoe_used: Optional[np.ndarray] = None) -> Optional[int]:
+        """組合 (攤平後的索引) 搭配的鞋子索引，沒有鞋子時回傳 None"""
+        if pairs["code"] is None:
+            return None
+        _, table_idx = self._shoe_table(self._shoes(pairs, shoe_used), pairs["n_color_ids"])
+        return int(table_idx.ravel()[pairs["code"].ravel()[flat_index]])
+
+    @staticmethod
+    def _shoes(pairs: Dict, shoe_used: Optional[np.ndarray]) -> Dict[str, np.ndarray]:
+        return pairs["shoes"] if shoe_used is None else {**pairs["shoes"], "used": shoe_used}
+
+    @staticmethod
+    def _shoe_table(S: Dict[str, np.ndarray], n_color_ids: int):
+        """
+        最佳鞋子查表
+        鞋子的選擇只取決於組合是否已符合風格 (f)、組合的顏色數 (1/2/3) 與組合的兩種顏色 (c1, c2)，
+        先對這 2 x 3 x K x K 種情況算出最佳鞋子，組合再以編號查表
+
+        Returns:
+            (鞋子帶來的加分 [2, 3, K, K], 鞋子索引 [2, 3, K, K])
+        """
+        n, k = len(S["color"]), n_color_ids
+        # 第 0 列: 組合尚未符合風格 (鞋子可加風格分)；第 1 列: 已符合
+        value = np.stack([STYLE_BONUS * S["hit"] - USED_PENALTY * S["used"], -USED_PENALTY * S["used"]])
+        best_any = value.max(axis=1)[:, None, None]
+        arg_any = value.argmax(axis=1)[:, None, None]
+
+        # 每種顏色中分數最高 (同分取索引最小) 的鞋子
+        best_by_color = np.full((2, k), INVALID_SCORE, dtype=np.int64)
+        arg_by_color = np.zeros((2, k), dtype=np.int64)
+        for f in range(2):
+            order = np.lexsort((np.arange(n), -value[f], S["color"]))
+            first = order[np.r_[True, S["color"][order][1:] != S["color"][order][:-1]]]
+            best_by_color[f, S["color"][first]] = value[f, first]
+            arg_by_color[f, S["color"][first]] = first
+
+        # 兩種顏色: 鞋子為其中一色時可加顏色分
+        m1, m2 = best_by_color[:, :, None], best_by_color[:, None, :]
+        match_score = np.maximum(m1, m2) + COLOR_BONUS
+        match_idx = np.where(m1 >= m2, arg_by_color[:, :, None], arg_by_color[:, None, :])
+        use_match = match_score >= best_any
+
+        score = np.empty((2, 3, k, k), dtype=np.int32)
+        index = np.empty((2, 3, k, k), dtype=np.int64)
+        score[:, 0], index[:, 0] = best_any + COLOR_BONUS, arg_any           # 1 種顏色: 任何鞋子都不超過 2 色
+        score[:, 1] = np.where(use_match, match_score, best_any)
+        index[:, 1] = np.where(use_match, match_idx, arg_any)
+        score[:, 2], index[:, 2] = best_any, arg_any                         # 已有 3 種顏色
+        return score, index
+
+    def _top_pairs(self, scores: np.ndarray, k: int) -> List[tuple]:
+        """分數最高的 k 組 (上衣索引, 下身索引)"""
+        return [tuple(int(x) for x in np.unravel_index(i, scores.shape)) for i in self._top_indices(scores.ravel(), k)]
+
+    def _top_indices(self, flat: np.ndarray, k: int) -> np.ndarray:
+        """分數最高的 k 個索引 (由高到低)，同分時以亂數決定順序"""
+        if k == 1:
+            # 只取第一名時不需排序: 最高分中隨機取一個
+            best = flat.max() if flat.size else INVALID_SCORE
+            if best <= INVALID_SCORE:
+                return np.empty(0, dtype=np.int64)
+            ties = np.flatnonzero(flat == best)
+            return ties[self.rng.integers(len(ties)):][:1]
+        k = min(k, int(np.count_nonzero(flat > INVALID_SCORE)))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        # 第 k 高的分數：高於它的全部入選，等於它的 (通常很多) 中隨機抽出補足 k 個
+        kth = flat[np.argpartition(flat, flat.size - k)[flat.size - k]]
+        above = np.flatnonzero(flat > kth)
+        ties = np.flatnonzero(flat == kth)
+        picked = ties[self.rng.choice(len(ties), k - len(above), replace=False)]
+        above = above[np.lexsort((self.rng.random(len(above)), -flat[above]))]
+        return np.concatenate([above, picked])
+
+if __name__ == "__main__":
+    # 效能測試: 與舊版 (隨機抽 50 組) 比較耗時與找到的最佳分數
+    import random
+    import time
+    from datetime import datetime
+
+    CATEGORIES = ["上衣", "下身", "外套", "鞋子"]
+    COLORS = ["黑色", "白色", "灰色", "紅色", "藍色", "綠色", "深藍", "卡其", "米色", "粉紅"]
+
+    def make_wardrobe(n: int, seed: int = 0) -> List[ClothingItem]:
+        rng = random.Random(seed)
+        return [
+            ClothingItem(id=i, name=f"{rng.choice(['休閒', '正式', '運動'])}單品{i}",
+                         category=rng.choice(CATEGORIES), color=rng.choice(COLORS), warmth=rng.randint(1, 9))
+            for i in range(n)
+        ]
+
+    def sampled_best_score(engine: RecommendationEngine, wardrobe, weather, style, used) -> int:
+        """舊版做法: 隨機抽 50 組 上衣/下身/鞋子，回傳其中的最高分"""
+        items = engine._pre_filter(wardrobe, weather, "日常", "中性")
+        by_cat = {c: [i for i in items if i.category == c] for c in CATEGORIES}
+        best = None
+        for _ in range(50):
+            t, b = random.choice(by_cat["上衣"]), random.choice(by_cat["下身"])
+            if (t.warmth > 6 and b.warmth < 4) or (b.warmth > 7 and t.warmth < 3):
+                continue
+            pairs = engine._score_pairs([t], [b], [random.choice(by_cat["鞋子"])], by_cat["外套"], style, used)
+            single = engine._with_shoes(pairs)
+            best = int(single[0, 0]) if best is None else max(best, int(single[0, 0]))
+        return best
+
+    weather = WeatherData(temp=18, feels_like=17, desc="多雲", city="臺北市", update_time=datetime.now())
+    for n in (100, 1_000, 5_000):
+        wardrobe = make_wardrobe(n)
+        used = list(range(0, n, 7))
+        engine = RecommendationEngine(seed=0)
+        start = time.perf_counter()
+        runs = 10
+        for _ in range(runs):
+            result = engine.recommend(wardrobe, weather, "日常", target_style="休閒", used_items=used)
+        elapsed = (time.perf_counter() - start) * 1000 / runs
+        # 同一個 seed 必須得到相同結果
+        again = RecommendationEngine(seed=0).recommend(wardrobe, weather, "日常", target_style="休閒", used_items=used)
+        assert again == RecommendationEngine(seed=0).recommend(wardrobe, weather, "日常", target_style="休閒", used_items=used)
+        sampled = np.mean([sampled_best_score(engine, wardrobe, weather, "休閒", set(used)) for _ in range(20)])
+        print(f"n={n:5d}  recommend    {elapsed:8.2f} ms/次  最佳分數 {result[0]['score']}  "
+              f"(隨機抽 50 組平均最佳 {sampled:.1f})")
+
+        # 3 套: 逐套呼叫 recommend 並累積 used_items vs recommend_k
+        start = time.perf_counter()
+        for _ in range(runs):
+            seq_used = list(used)
+            for _ in range(3):
+                best = engine.recommend(wardrobe, weather, "日常", target_style="休閒", used_items=seq_used)[0]
+                seq_used += [item["id"] for item in best["items"]]
+        sequential = (time.perf_counter() - start) * 1000 / runs
+        start = time.perf_counter()
+        for _ in range(runs):
+            outfits = engine.recommend_k(wardrobe, weather, "日常", target_style="休閒", k=3, used_items=used)
+        elapsed = (time.perf_counter() - start) * 1000 / runs
+        print(f"{'':7s}  3 x recommend {sequential:7.2f} ms/次  recommend_k {elapsed:7.2f} ms/次  "
+              f"分數 {[o['score'] for o in outfits]}")
+
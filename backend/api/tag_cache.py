@@ -0,0 +1,119 @@
+"""
+標籤辨識結果快取
+以圖片 SHA256 加上 prompt / 模型版本為鍵，存放於本地 SQLite，
+跨使用者共用 (相同的商品圖只需辨識一次)，服務重啟後仍有效
+"""
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Sequence
+
+
+class TagCache:
+    """
+    SQLite 標籤快取
+    超過 max_entries 時依最後使用時間淘汰最舊的項目
+    """
+
+    def __init__(self, db_path: str, version: str, max_entries: int = 50_000):
+        self.db_path = db_path
+        self.version = version
+        self.max_entries = max_entries
+        self._hits = 0
+        self._misses = 0
+        self._stats_lock = threading.Lock()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tag_cache ("
+                "key TEXT PRIMARY KEY, tags TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tag_cache_last_used ON tag_cache (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        """開啟連線 (區塊結束時 commit 並關閉)"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _key(self, image_hash: str) -> str:
+        return f"{self.version}:{image_hash}"
+
+    def get_many(self, image_hashes: Sequence[str]) -> Dict[str, Dict]:
+        """
+        批次查詢快取
+
+        Returns:
+            {命中的 hash: 標籤}
+        """
+        wanted = {self._key(h): h for h in set(image_hashes)}
+        found: Dict[str, Dict] = {}
+        if wanted:
+            try:
+                with self._connect() as conn:
+                    placeholders = ", ".join("?" * len(wanted))
+                    rows = conn.execute(
+                        f"SELECT key, tags FROM tag_cache WHERE key IN ({placeholders})", list(wanted)
+                    ).fetchall()
+                    for key, tags in rows:
+                        found[wanted[key]] = json.loads(tags)
+                    if rows:
+                        conn.execute(
+                            f"UPDATE tag_cache SET last_used = ? WHERE key IN ({', '.join('?' * len(rows))})",
+                            [time.time()] + [key for key, _ in rows]
+                        )
+            except Exception as e:
+                print(f"[AI] 標籤快取讀取失敗: {e}")
+
+        hits = sum(1 for h in image_hashes if h in found)
+        with self._stats_lock:
+            self._hits += hits
+            self._misses += len(image_hashes) - hits
+        return found
+
+    def put_many(self, tags_by_hash: Dict[str, Dict]) -> None:
+        """寫入辨識結果並淘汰超出上限的舊項目"""
+        if not tags_by_hash:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO tag_cache (key, tags, last_used) VALUES (?, ?, ?)",
+                    [(self._key(h), json.dumps(tags, ensure_ascii=False), now) for h, tags in tags_by_hash.items()]
+                )
+                (count,) = conn.execute("SELECT COUNT(*) FROM tag_cache").fetchone()
+                if count > self.max_entries:
+                    conn.execute(
+                        "DELETE FROM tag_cache WHERE key IN ("
+                        "SELECT key FROM tag_cache ORDER BY last_used LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+        except Exception as e:
+            print(f"[AI] 標籤快取寫入失敗: {e}")
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            hits, misses = self._hits, self._misses
+        try:
+            with self._connect() as conn:
+                (entries,) = conn.execute("SELECT COUNT(*) FROM tag_cache").fetchone()
+        except Exception:
+            entries = None
+        total = hits + misses
+        return {
+            "version": self.version,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,110 @@
+"""
+縮圖服務層
+上傳後於背景執行緒池產生多種尺寸的 WebP / JPEG 縮圖，供前端 srcset 使用
+"""
+import io
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+from PIL import Image, ImageOps
+from database.image_store import ImageStore
+
+# 固定輸出寬度 (grid: 衣櫥格狀縮圖, card: 推薦卡片, full: 大圖檢視)
+THUMBNAIL_WIDTHS = {"grid": 240, "card": 480, "full": 1080}
+
+# 輸出格式: 副檔名 -> (PIL 格式, MIME type)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+THUMBNAIL_QUALITY = 80
+
+
+def variant_name(width: int, fmt: str) -> str:
+    """縮圖在圖片儲存中的版本名稱 (如 "480.webp")"""
+    return f"{width}.{fmt}"
+
+
+def parse_variant(variant: str) -> Optional[tuple]:
+    """
+    解析縮圖版本名稱
+
+    Returns:
+        (寬度, 格式)，不是支援的尺寸或格式時回傳 None
+    """
+    width_str, _, fmt = variant.partition(".")
+    if not width_str.isdigit() or fmt not in THUMBNAIL_FORMATS:
+        return None
+    width = int(width_str)
+    if width not in THUMBNAIL_WIDTHS.values():
+        return None
+    return width, fmt
+
+
+class ThumbnailService:
+    def __init__(self, image_store: ImageStore, max_workers: int = 2):
+        self.image_store = image_store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, image_hash: str, img_bytes: Optional[bytes] = None) -> Future:
+        """
+        排入背景產生縮圖 (同一張圖片同時只會排入一次)
+
+        Args:
+            image_hash: 原圖 hash
+            img_bytes: 原圖 bytes (None 則由圖片儲存讀取)
+        """
+        with self._lock:
+            future = self._pending.get(image_hash)
+            if future is not None:
+                return future
+            future = self._executor.submit(self.generate, image_hash, img_bytes)
+            self._pending[image_hash] = future
+
+        def _done(_):
+            with self._lock:
+                self._pending.pop(image_hash, None)
+
+        future.add_done_callback(_done)
+        return future
+
+    def generate(self, image_hash: str, img_bytes: Optional[bytes] = None) -> bool:
+        """產生所有尺寸與格式的縮圖 (原圖只解碼一次)"""
+        try:
+            if img_bytes is None:
+                img_bytes = self.image_store.get(image_hash)
+                if img_bytes is None:
+                    return False
+
+            image = Image.open(io.BytesIO(img_bytes))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+
+            # 由大到小縮放，每次從上一個尺寸縮小以減少運算量
+            source = image
+            for width in sorted(THUMBNAIL_WIDTHS.values(), reverse=True):
+                if all(self.image_store.exists(image_hash, variant_name(width, fmt)) for fmt in THUMBNAIL_FORMATS):
+                    continue
+
+                if source.width > width:
+                    height = max(1, round(source.height * width / source.width))
+                    source = source.resize((width, height), Image.LANCZOS)
+
+                for fmt, (pil_format, _) in THUMBNAIL_FORMATS.items():
+                    buffer = io.BytesIO()
+                    source.save(buffer, format=pil_format, quality=THUMBNAIL_QUALITY)
+                    self.image_store.put(image_hash, buffer.getvalue(), variant_name(width, fmt))
+
+            return True
+        except Exception as e:
+            print(f"[ERROR] 產生縮圖失敗 ({image_hash}): {str(e)}")
+            return False
+
+    def ensure(self, image_hash: str, variant: str) -> bool:
+        """確保指定縮圖存在 (尚未產生時等待背景工作或立即產生)"""
+        if self.image_store.exists(image_hash, variant):
+            return True
+        self.submit(image_hash).result()
+        return self.image_store.exists(image_hash, variant)
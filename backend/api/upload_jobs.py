@@ -0,0 +1,474 @@
+"""
+上傳工作佇列
+/api/upload 只負責收檔並建立工作，AI 辨識與儲存由背景 worker 執行；
+工作狀態存放於本地 SQLite，圖片存於圖片儲存，服務重啟後可繼續未完成的工作
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from database.models import ClothingItem
+from database.image_store import ImageStore
+from api.duplicate_index import NEAR_DUPLICATE_DISTANCE, hamming
+
+# 工作狀態
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_TERMINAL = (JOB_DONE, JOB_FAILED)
+
+# 單張圖片狀態
+IMAGE_PENDING = "pending"   # 等待 AI 辨識
+IMAGE_TAGGED = "tagged"     # 已辨識，等待儲存
+IMAGE_SAVED = "saved"
+IMAGE_FAILED = "failed"
+IMAGE_DUPLICATE = "duplicate"  # 與衣櫥或同批圖片重複，不辨識也不儲存
+
+# 重啟後自動續跑的最大次數
+MAX_ATTEMPTS = 3
+
+# 執行中工作的租約秒數: 取得工作的行程每個步驟會續約，租約過期 (行程當掉) 後其他行程才可接手
+JOB_LEASE_SECONDS = 600
+# 檢查可接手工作 (租約過期、或排入後遲遲沒有行程處理) 的間隔秒數
+RECOVERY_INTERVAL = 60
+
+# 厚度字串對應數值
+WARMTH_MAP = {"薄": 2, "適中": 5, "厚": 8}
+
+
+class UploadJobStore:
+    """上傳工作狀態 (SQLite)"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS upload_jobs ("
+                "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, warmth INTEGER NOT NULL, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS upload_job_images ("
+                "job_id TEXT NOT NULL, idx INTEGER NOT NULL, filename TEXT, image_hash TEXT NOT NULL, "
+                "status TEXT NOT NULL, tags TEXT, error TEXT, image_phash TEXT, similar TEXT, "
+                "PRIMARY KEY (job_id, idx))"
+            )
+            # 舊版資料表補上新增的欄位
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(upload_job_images)")}
+            for column in ("image_phash", "similar"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE upload_job_images ADD COLUMN {column} TEXT")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(upload_jobs)")}
+            for column, column_type in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE upload_jobs ADD COLUMN {column} {column_type}")
+
+    @contextmanager
+    def _connect(self):
+        """開啟連線 (區塊結束時 commit 並關閉)"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create_job(self, user_id: str, warmth: int, images: List[Dict]) -> str:
+        """
+        建立工作 (全部圖片皆重複時直接標記為完成)
+
+        Args:
+            images: [{"filename", "image_hash", "image_phash", "duplicate": 重複說明或 None,
+                      "similar": 可能重複的衣物列表}, ...]
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        status = JOB_DONE if all(img.get("duplicate") for img in images) else JOB_QUEUED
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO upload_jobs (id, user_id, warmth, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, user_id, warmth, status, now, now)
+            )
+            conn.executemany(
+                "INSERT INTO upload_job_images "
+                "(job_id, idx, filename, image_hash, image_phash, status, error, similar) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, idx, img["filename"], img["image_hash"], img.get("image_phash"),
+                     IMAGE_DUPLICATE if img.get("duplicate") else IMAGE_PENDING, img.get("duplicate"),
+                     json.dumps(img["similar"], ensure_ascii=False) if img.get("similar") else None)
+                    for idx, img in enumerate(images)
+                ]
+            )
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            job = conn.execute("SELECT * FROM upload_jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            images = conn.execute(
+                "SELECT * FROM upload_job_images WHERE job_id = ? ORDER BY idx", (job_id,)
+            ).fetchall()
+
+        result = dict(job)
+        result["images"] = [
+            {
+                "index": row["idx"],
+                "filename": row["filename"],
+                "image_hash": row["image_hash"],
+                "image_phash": row["image_phash"],
+                "status": row["status"],
+                "tags": json.loads(row["tags"]) if row["tags"] else None,
+                "error": row["error"],
+                "similar": json.loads(row["similar"]) if row["similar"] else [],
+            }
+            for row in images
+        ]
+        return result
+
+    def set_job_status(self, job_id: str, status: str, error: Optional[str] = None,
+                       owner: Optional[str] = None) -> bool:
+        """
+        更新工作狀態並釋放租約
+
+        Args:
+            owner: 指定時只有仍持有該工作的行程可以更新 (租約過期被接手後不會覆寫對方的結果)
+
+        Returns:
+            是否有更新
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE upload_jobs SET status = ?, error = ?, updated_at = ?, owner = NULL, lease_until = NULL "
+                "WHERE id = ? AND (? IS NULL OR owner = ?)",
+                (status, error, time.time(), job_id, owner, owner)
+            )
+            return cur.rowcount == 1
+
+    def claim_job(self, job_id: str, owner: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        """
+        原子地取得工作 (排隊中、或執行中但租約已過期)，取得時計入一次嘗試
+
+        Returns:
+            是否由 owner 取得；同一工作同時只會有一個行程取得
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE upload_jobs SET status = ?, owner = ?, lease_until = ?, updated_at = ?, "
+                "attempts = attempts + 1 "
+                "WHERE id = ? AND attempts < ? AND (status = ? OR "
+                "(status = ? AND (lease_until IS NULL OR lease_until < ?)))",
+                (JOB_RUNNING, owner, now + lease_seconds, now, job_id, MAX_ATTEMPTS, JOB_QUEUED, JOB_RUNNING, now)
+            )
+            return cur.rowcount == 1
+
+    def renew_lease(self, job_id: str, owner: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        """延長租約 (回傳 False 表示工作已被其他行程接手)"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE upload_jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time() + lease_seconds, job_id, owner, JOB_RUNNING)
+            )
+            return cur.rowcount == 1
+
+    def fail_exhausted_jobs(self) -> int:
+        """將嘗試次數已用完且沒有行程在執行的工作標記為失敗，回傳數量"""
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE upload_jobs SET status = ?, error = ?, updated_at = ?, owner = NULL, lease_until = NULL "
+                "WHERE attempts >= ? AND (status = ? OR "
+                "(status = ? AND (lease_until IS NULL OR lease_until < ?)))",
+                (JOB_FAILED, "重試次數過多", now, MAX_ATTEMPTS, JOB_QUEUED, JOB_RUNNING, now)
+            )
+            return cur.rowcount
+
+    def update_image(self, job_id: str, idx: int, status: str,
+                     tags: Optional[Dict] = None, error: Optional[str] = None):
+        with self._connect() as conn:
+            if tags is not None:
+                conn.execute(
+                    "UPDATE upload_job_images SET status = ?, tags = ?, error = ? WHERE job_id = ? AND idx = ?",
+                    (status, json.dumps(tags, ensure_ascii=False), error, job_id, idx)
+                )
+            else:
+                conn.execute(
+                    "UPDATE upload_job_images SET status = ?, error = ? WHERE job_id = ? AND idx = ?",
+                    (status, error, job_id, idx)
+                )
+            conn.execute("UPDATE upload_jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def reset_failed_images(self, job_id: str) -> int:
+        """將失敗的圖片重設為待處理 (已有標籤者只需重新儲存)，回傳重設數量"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE upload_job_images SET status = CASE WHEN tags IS NULL THEN ? ELSE ? END, error = NULL "
+                "WHERE job_id = ? AND status = ?",
+                (IMAGE_PENDING, IMAGE_TAGGED, job_id, IMAGE_FAILED)
+            )
+            if cur.rowcount:
+                conn.execute(
+                    "UPDATE upload_jobs SET status = ?, error = NULL, attempts = 0, updated_at = ? WHERE id = ?",
+                    (JOB_QUEUED, time.time(), job_id)
+                )
+            return cur.rowcount
+
+    def recoverable_jobs(self, queued_before: float) -> List[str]:
+        """
+        可接手的工作 id (依建立時間排序): 租約已過期的執行中工作，
+        以及 queued_before 之前就排入但仍未被任何行程取得的工作
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM upload_jobs WHERE (status = ? AND updated_at <= ?) OR "
+                "(status = ? AND (lease_until IS NULL OR lease_until < ?)) ORDER BY created_at",
+                (JOB_QUEUED, queued_before, JOB_RUNNING, time.time())
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+
+def job_summary(job: Dict) -> Dict:
+    """組合前端使用的工作進度 (相容舊版 /api/upload 回應欄位)"""
+    images = job["images"]
+    saved = [img for img in images if img["status"] == IMAGE_SAVED]
+    failed = [img for img in images if img["status"] == IMAGE_FAILED]
+    duplicates = [img for img in images if img["status"] == IMAGE_DUPLICATE]
+    possible = [img for img in images if img["similar"] and img["status"] != IMAGE_DUPLICATE]
+    return {
+        "success": True,
+        "job_id": job["id"],
+        "status": job["status"],
+        "error": job["error"],
+        "total": len(images),
+        "completed": len(saved) + len(failed) + len(duplicates),
+        "success_count": len(saved),
+        "fail_count": len(failed),
+        "duplicate_count": len(duplicates),
+        "possible_duplicate_count": len(possible),
+        "items": [img["tags"] for img in saved],
+        "fail_details": [f"{img['filename']}: {img['error']}" for img in failed] or None,
+        "duplicates": [f"{img['filename']}: {img['error']}" for img in duplicates] or None,
+        "images": [
+            dict(
+                {k: img[k] for k in ("index", "filename", "status", "tags", "error", "similar")},
+                possible_duplicate=bool(img["similar"]) and img["status"] != IMAGE_DUPLICATE
+            )
+            for img in images
+        ],
+    }
+
+
+class UploadJobQueue:
+    """上傳工作佇列與背景 worker"""
+
+    def __init__(self, store: UploadJobStore, image_store: ImageStore, ai_service,
+                 wardrobe_service, thumbnail_service, workers: int = 2, visual_search=None):
+        self.store = store
+        self.image_store = image_store
+        self.ai_service = ai_service
+        self.wardrobe_service = wardrobe_service
+        self.thumbnail_service = thumbnail_service
+        self.visual_search = visual_search
+        self.workers = workers
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        # 此行程的身分 (多個 worker 行程共用同一個 SQLite 時以租約區分誰在執行)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def start(self):
+        """啟動 worker，並定期接手上次未完成或其他行程遺留的工作"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"upload-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+        self._recover(queued_before=time.time())
+        t = threading.Thread(target=self._recovery_loop, name="upload-recovery", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def _recover(self, queued_before: float):
+        """排入可接手的工作 (實際執行前仍需 claim_job，多個行程同時排入也只會執行一次)"""
+        failed = self.store.fail_exhausted_jobs()
+        if failed:
+            print(f"[WARN] {failed} 個上傳工作重試次數過多，標記為失敗")
+        for job_id in self.store.recoverable_jobs(queued_before):
+            print(f"[INFO] 續跑未完成的上傳工作: {job_id}")
+            self._queue.put(job_id)
+
+    def _recovery_loop(self):
+        while True:
+            time.sleep(RECOVERY_INTERVAL)
+            try:
+                # 排入後超過一個檢查週期仍未被取得，代表排入的行程已不在
+                self._recover(queued_before=time.time() - RECOVERY_INTERVAL)
+            except Exception as e:
+                print(f"[ERROR] 檢查未完成的上傳工作失敗: {str(e)}")
+
+    def submit(self, user_id: str, warmth_str: str, files: List[Tuple[str, bytes]]) -> str:
+        """
+        建立上傳工作 (圖片先寫入圖片儲存，再排入佇列)
+        辨識前先以 hash 去除重複：衣櫥中已有的圖片與同批重複的圖片不送 AI 也不儲存
+
+        Args:
+            files: [(檔名, 圖片 bytes), ...]
+
+        Returns:
+            job_id
+        """
+        hashes = [self.wardrobe_service.get_image_hash(img_bytes) for _, img_bytes in files]
+        existing = self.wardrobe_service.find_existing_hashes(user_id, hashes)
+
+        images: List[Dict] = []
+        first_seen: Dict[str, str] = {}
+        for (filename, img_bytes), img_hash in zip(files, hashes):
+            image = {"filename": filename, "image_hash": img_hash, "image_phash": None,
+                     "duplicate": None, "similar": []}
+            if img_hash in existing:
+                image["duplicate"] = f"衣櫥中已有相同圖片「{existing[img_hash]}」"
+            elif img_hash in first_seen:
+                image["duplicate"] = f"與同批上傳的「{first_seen[img_hash]}」相同"
+            else:
+                first_seen[img_hash] = filename
+                self.image_store.put(img_hash, img_bytes)
+                image["image_phash"] = self.wardrobe_service.get_image_phash(img_bytes)
+            images.append(image)
+
+        # 近似重複 (重新存檔、裁切過的同一張照片) 只標記提醒，仍照常辨識與儲存
+        fresh = [img for img in images if img["image_phash"]]
+        similar_lists = self.wardrobe_service.find_similar_items(user_id, [img["image_phash"] for img in fresh])
+        for pos, (img, similar) in enumerate(zip(fresh, similar_lists)):
+            img["similar"] = similar
+            for earlier in fresh[:pos]:
+                distance = hamming(int(img["image_phash"], 16), int(earlier["image_phash"], 16))
+                if distance <= NEAR_DUPLICATE_DISTANCE:
+                    img["similar"].append({"id": None, "name": earlier["filename"], "distance": distance})
+
+        duplicate_count = sum(1 for img in images if img["duplicate"])
+        if duplicate_count:
+            print(f"[INFO] 略過 {duplicate_count} 張重複圖片")
+
+        job_id = self.store.create_job(user_id, WARMTH_MAP.get(warmth_str, 5), images)
+        if duplicate_count < len(images):
+            self._queue.put(job_id)
+        return job_id
+
+    def retry(self, job_id: str) -> int:
+        """重試工作中失敗的圖片 (僅限已結束的工作)，回傳重試數量"""
+        job = self.store.get_job(job_id)
+        if job is None or job["status"] not in JOB_TERMINAL:
+            return 0
+        count = self.store.reset_failed_images(job_id)
+        if count:
+            self._queue.put(job_id)
+        return count
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _worker_loop(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._process(job_id)
+            except Exception as e:
+                print(f"[ERROR] 上傳工作 {job_id} 執行失敗: {str(e)}")
+                self.store.set_job_status(job_id, JOB_FAILED, str(e), owner=self.owner)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, job_id: str):
+        # 同一工作可能被多個行程排入 (重啟續跑、多個 worker 行程)，只有取得租約的行程執行
+        if not self.store.claim_job(job_id, self.owner):
+            return
+        job = self.store.get_job(job_id)
+        user_id = job["user_id"]
+        print(f"[INFO] ========== 開始上傳工作 {job_id} ({len(job['images'])} 張) ==========")
+
+        # 步驟 1: AI 辨識尚未辨識的圖片
+        pending = []
+        for img in job["images"]:
+            if img["status"] != IMAGE_PENDING:
+                continue
+            img_bytes = self.image_store.get(img["image_hash"])
+            if img_bytes is None:
+                self.store.update_image(job_id, img["index"], IMAGE_FAILED, error="圖片遺失")
+                continue
+            pending.append((img, img_bytes))
+
+        if pending:
+            print(f"[INFO] 步驟 1: 開始 AI 辨識 {len(pending)} 張圖片...")
+            tags_list = self.ai_service.batch_auto_tag([b for _, b in pending], user_id=user_id)
+            for idx, (img, _) in enumerate(pending):
+                if tags_list and idx < len(tags_list):
+                    self.store.update_image(job_id, img["index"], IMAGE_TAGGED, tags=tags_list[idx])
+                else:
+                    self.store.update_image(job_id, img["index"], IMAGE_FAILED, error="AI 辨識失敗,請稍後再試")
+
+        # 步驟 2: 批次儲存已辨識的圖片 (辨識期間租約被接手時不再儲存，避免重複寫入衣櫥)
+        if not self.store.renew_lease(job_id, self.owner):
+            print(f"[WARN] 上傳工作 {job_id} 已由其他行程接手")
+            return
+        job = self.store.get_job(job_id)
+        to_save = []
+        for img in job["images"]:
+            if img["status"] != IMAGE_TAGGED:
+                continue
+            img_bytes = self.image_store.get(img["image_hash"])
+            if img_bytes is None:
+                self.store.update_image(job_id, img["index"], IMAGE_FAILED, error="圖片遺失")
+                continue
+
+            tags = img["tags"]
+            item = ClothingItem(
+                user_id=user_id,
+                name=tags.get('name', img["filename"]),
+                category=tags.get('category', '其他'),
+                color=tags.get('color', '未知'),
+                style=tags.get('style', ''),
+                warmth=job["warmth"],  # 使用使用者指定的厚度
+                image_phash=img["image_phash"]
+            )
+            to_save.append((img, item, img_bytes))
+
+        if to_save:
+            print(f"[INFO] 步驟 2: 批次儲存 {len(to_save)} 件衣物...")
+            results = self.wardrobe_service.save_items([(item, b) for _, item, b in to_save])
+            # 結果與輸入一一對應，中間某筆失敗不會影響其他筆的歸屬
+            saved = []
+            for (img, item, img_bytes), (success, msg) in zip(to_save, results):
+                if success:
+                    self.store.update_image(job_id, img["index"], IMAGE_SAVED)
+                    # 縮圖於背景產生
+                    self.thumbnail_service.submit(item.image_hash, img_bytes)
+                    if item.id is not None:
+                        saved.append((item.id, img_bytes))
+                else:
+                    self.store.update_image(job_id, img["index"], IMAGE_FAILED, error=msg)
+                    print(f"[ERROR] '{img['filename']}' 儲存失敗 - {msg}")
+            # 外觀向量 (相似衣物搜尋用) 於背景計算
+            if saved and self.visual_search is not None:
+                self.visual_search.submit(user_id, saved)
+
+        job = self.store.get_job(job_id)
+        summary = job_summary(job)
+        status = JOB_FAILED if summary["success_count"] == 0 and summary["fail_count"] else JOB_DONE
+        self.store.set_job_status(job_id, status, "全部圖片處理失敗" if status == JOB_FAILED else None,
+                                  owner=self.owner)
+        print(f"[INFO] ========== 上傳工作完成: 成功 {summary['success_count']} 件, 失敗 {summary['fail_count']} 件 ==========")
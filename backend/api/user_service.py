@@ -6,8 +6,16 @@ from typing import List, Tuple, Optional, Dict
 from datetime import datetime
 from database.models import User
 from database.supabase_client import SupabaseClient
+from database.pagination import apply_cursor, next_cursor
+from api.async_utils import run_blocking
 import json
 
+# 歷史紀錄查詢視圖 (summary 不含完整的 recommendation_data)
+HISTORY_VIEWS = {
+    "full": "*",
+    "summary": "id, city, occasion, style, created_at",
+}
+
 
 class UserService:
     def __init__(self, supabase_client: SupabaseClient):
@@ -138,18 +146,48 @@ class UserService:
                 ...
             ]
         """
+        history, _ = self.get_history_page(user_id, limit)
+        return history
+    
+    def get_history_page(
+        self, user_id: str, limit: int = 20, cursor: Optional[str] = None, view: str = "full"
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        分頁獲取推薦歷史紀錄 (依 created_at, id 由新到舊)
+        
+        Args:
+            user_id: 使用者 ID
+            limit: 每頁筆數
+            cursor: 上一頁回傳的 next_cursor (None 為第一頁)
+            view: full (含 recommendation_data) 或 summary
+        
+        Returns:
+            (歷史紀錄列表, 下一頁游標；沒有下一頁時為 None)
+        
+        Raises:
+            ValueError: 視圖或游標無效
+        """
+        if view not in HISTORY_VIEWS:
+            raise ValueError(f"無效的視圖: {view}")
+        
+        query = self.db.client.table("recommendation_history")\
+            .select(HISTORY_VIEWS[view])\
+            .eq("user_id", user_id)
+        query = apply_cursor(query, cursor)
+        
         try:
-            result = self.db.client.table("recommendation_history")\
-                .select("*")\
-                .eq("user_id", user_id)\
+            result = query\
                 .order("created_at", desc=True)\
-                .limit(limit)\
+                .order("id", desc=True)\
+                .limit(limit + 1)\
                 .execute()
-            
-            return result.data if result.data else []
         except Exception as e:
             print(f"[ERROR] 獲取歷史紀錄失敗: {str(e)}")
-            return []
+            return [], None
+        
+        rows = result.data if result.data else []
+        page = rows[:limit]
+        return page, next_cursor(page, limit, len(rows) > limit)
     
     def save_history(
         self, 
@@ -215,3 +253,24 @@ class UserService:
         except Exception as e:
             print(f"[ERROR] 刪除歷史紀錄失敗: {str(e)}")
             return False, str(e)
+    
+    # ========== 非同步介面 (在 I/O 執行緒池執行) ==========
+    
+    async def aget_profile(self, user_id: str) -> Optional[Dict]:
+        return await run_blocking(self.get_profile, user_id)
+    
+    async def aupdate_profile(self, user_id: str, profile_data: Dict) -> Tuple[bool, str]:
+        return await run_blocking(self.update_profile, user_id, profile_data)
+    
+    async def aget_history_page(
+        self, user_id: str, limit: int = 20, cursor: Optional[str] = None, view: str = "full"
+    ) -> Tuple[List[Dict], Optional[str]]:
+        return await run_blocking(self.get_history_page, user_id, limit, cursor, view)
+    
+    async def asave_history(
+        self, user_id: str, city: str, occasion: str, style: str, recommendation_data: Dict
+    ) -> Tuple[bool, str]:
+        return await run_blocking(self.save_history, user_id, city, occasion, style, recommendation_data)
+    
+    async def adelete_history(self, user_id: str, history_id: int) -> Tuple[bool, str]:
+        return await run_blocking(self.delete_history, user_id, history_id)
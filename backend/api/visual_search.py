@@ -0,0 +1,190 @@
+"""
+以外觀相似度搜尋衣物
+新衣物儲存後於背景以 Model A 計算外觀向量；查詢時找出同一使用者衣櫥中最相似的衣物，
+不需呼叫 Gemini
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from database.models import ClothingItem
+from database.image_store import ImageStore
+from api.embedding_index import EmbeddingIndex
+from api.wardrobe_service import WARDROBE_VIEWS, project_item
+
+# 每次送進 Model A 的圖片數 (與微批次上限相同)
+EMBED_CHUNK_SIZE = 16
+
+
+class VisualSearchService:
+    def __init__(self, index: EmbeddingIndex, wardrobe_service, image_store: ImageStore,
+                 max_workers: int = 1):
+        self.index = index
+        self.wardrobe_service = wardrobe_service
+        self.image_store = image_store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embedding")
+        self._backfills: Dict[str, Future] = {}
+        # 圖片遺失或無法辨識的衣物 id (補算時略過，不會每次查詢都重算)
+        self._failed: Dict[str, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _adapter():
+        from api.model_a_adapter import ModelAAdapter
+        adapter = ModelAAdapter()
+        return adapter if adapter.predictor is not None else None
+
+    def available(self) -> bool:
+        """Model A 是否可用 (不可用時無法計算外觀向量)"""
+        return self._adapter() is not None
+
+    def _mark_failed(self, user_id: str, item_ids: Sequence[int]) -> None:
+        if item_ids:
+            with self._lock:
+                self._failed.setdefault(user_id, set()).update(item_ids)
+
+    def has_failed(self, user_id: str, item_id: int) -> bool:
+        with self._lock:
+            return item_id in self._failed.get(user_id, ())
+
+    def embed(self, images_bytes: Sequence[bytes]) -> List[Optional[List[float]]]:
+        """計算外觀向量 (Model A 無法使用或圖片無法辨識時為 None)"""
+        adapter = self._adapter()
+        if adapter is None:
+            return [None] * len(images_bytes)
+        vectors: List[Optional[List[float]]] = []
+        for start in range(0, len(images_bytes), EMBED_CHUNK_SIZE):
+            vectors.extend(adapter.embed_images(list(images_bytes[start:start + EMBED_CHUNK_SIZE])))
+        return vectors
+
+    def _index_items(self, user_id: str, items: Sequence[Tuple[int, bytes]]) -> int:
+        if self._adapter() is None:
+            return 0
+        vectors = {}
+        failed = []
+        for (item_id, _), vector in zip(items, self.embed([b for _, b in items])):
+            if vector is not None:
+                vectors[item_id] = vector
+            else:
+                failed.append(item_id)
+        self._mark_failed(user_id, failed)
+        if vectors:
+            self.index.add(user_id, vectors)
+        return len(vectors)
+
+    def submit(self, user_id: str, items: Sequence[Tuple[int, bytes]]) -> Future:
+        """
+        排入背景計算新衣物的外觀向量
+
+        Args:
+            items: [(衣物 id, 圖片 bytes), ...]
+        """
+        def run():
+            try:
+                return self._index_items(user_id, items)
+            except Exception as e:
+                print(f"[ERROR] 計算外觀向量失敗: {str(e)}")
+                return 0
+        return self._executor.submit(run)
+
+    def backfill(self, user_id: str) -> Future:
+        """為衣櫥中還沒有外觀向量的衣物補算 (同一位使用者同時只會排入一次；Model A 無法使用時不排入)"""
+        if self._adapter() is None:
+            future: Future = Future()
+            future.set_result(0)
+            return future
+        with self._lock:
+            future = self._backfills.get(user_id)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._backfill, user_id)
+            self._backfills[user_id] = future
+
+        def _done(_):
+            with self._lock:
+                self._backfills.pop(user_id, None)
+
+        future.add_done_callback(_done)
+        return future
+
+    def _backfill(self, user_id: str) -> int:
+        if self._adapter() is None:
+            return 0
+        try:
+            rows = self.wardrobe_service.get_wardrobe(user_id, fields=["image_hash"])
+            indexed = self.index.item_ids(user_id)
+            with self._lock:
+                failed = set(self._failed.get(user_id, ()))
+            missing = [item for item in rows
+                       if item.id is not None and item.id not in indexed and item.id not in failed]
+            added = 0
+            for start in range(0, len(missing), EMBED_CHUNK_SIZE):
+                chunk = []
+                lost = []
+                for item in missing[start:start + EMBED_CHUNK_SIZE]:
+                    img_bytes = None
+                    if item.image_hash and self.wardrobe_service.load_image(item.image_hash):
+                        img_bytes = self.image_store.get(item.image_hash)
+                    if img_bytes is not None:
+                        chunk.append((item.id, img_bytes))
+                    else:
+                        lost.append(item.id)
+                self._mark_failed(user_id, lost)
+                if chunk:
+                    added += self._index_items(user_id, chunk)
+            if added:
+                print(f"[INFO] 已補算 {added} 件衣物的外觀向量 (user={user_id})")
+            return added
+        except Exception as e:
+            print(f"[ERROR] 補算外觀向量失敗: {str(e)}")
+            return 0
+
+    def is_backfilling(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._backfills
+
+    def remove(self, user_id: str, item_ids: Sequence[int]) -> None:
+        self.index.remove(user_id, item_ids)
+        with self._lock:
+            self._failed.get(user_id, set()).difference_update(item_ids)
+
+    def _attach_items(self, user_id: str, matches: List[Tuple[int, float]]) -> List[Tuple[ClothingItem, float]]:
+        """將 (衣物 id, 相似度) 對應回衣物資料 (略過已不存在的衣物)"""
+        if not matches:
+            return []
+        items = {item.id: item for item in self.wardrobe_service.get_wardrobe(user_id, view="summary")}
+        return [(items[item_id], score) for item_id, score in matches if item_id in items]
+
+    def similar_to_item(self, user_id: str, item_id: int, k: int = 10) -> Optional[List[Tuple[ClothingItem, float]]]:
+        """
+        與指定衣物外觀最相似的衣物
+
+        Returns:
+            [(衣物, cosine 相似度), ...]；該衣物還沒有外觀向量時回傳 None
+            (尚未計算過時排入補算；圖片無法辨識的衣物不會重算)
+        """
+        matches = self.index.similar_to_item(user_id, item_id, k)
+        if matches is None:
+            if not self.has_failed(user_id, item_id):
+                self.backfill(user_id)
+            return None
+        return self._attach_items(user_id, matches)
+
+    def search_by_image(self, user_id: str, img_bytes: bytes, k: int = 10) -> Optional[List[Tuple[ClothingItem, float]]]:
+        """
+        以照片搜尋衣櫥中外觀相似的衣物
+
+        Returns:
+            [(衣物, cosine 相似度), ...]；圖片無法辨識時回傳 None
+        """
+        (vector,) = self.embed([img_bytes])
+        if vector is None:
+            return None
+        if not self.index.item_ids(user_id):
+            self.backfill(user_id)
+        return self._attach_items(user_id, self.index.search(user_id, vector, k))
+
+
+def similar_summary(matches: List[Tuple[ClothingItem, float]]) -> List[dict]:
+    """輸出給前端的相似衣物 (summary 欄位加上相似度)"""
+    columns = WARDROBE_VIEWS["summary"]
+    return [{**project_item(item, columns), "score": round(score, 4)} for item, score in matches]
@@ -0,0 +1,171 @@
+"""
+衣櫥快取層
+以 user_id 為鍵快取衣櫥資料列，衣櫥異動時由 WardrobeService 主動失效
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class WardrobeCache:
+    """
+    衣櫥快取介面
+
+    快取內容為 Supabase 回傳的原始資料列 (list[dict])，
+    多個 uvicorn worker 需共用快取時改用 RedisWardrobeCache 等共享後端。
+    """
+
+    def get(self, user_id: str) -> Optional[List[Dict]]:
+        raise NotImplementedError
+
+    def set(self, user_id: str, rows: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def invalidate(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        raise NotImplementedError
+
+
+class InMemoryWardrobeCache(WardrobeCache):
+    """行程內 LRU 快取 (以位元組預算與 TTL 限制)"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 300):
+        """
+        Args:
+            max_bytes: 快取總大小上限 (以 JSON 序列化大小估算)
+            ttl_seconds: 每筆快取存活秒數
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # {user_id: (rows, size, expires_at)}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            rows, size, expires_at = entry
+            if time.monotonic() >= expires_at:
+                self._remove(user_id)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return rows
+
+    def set(self, user_id: str, rows: List[Dict]) -> None:
+        size = len(json.dumps(rows, default=str))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove(user_id)
+            self._entries[user_id] = (rows, size, time.monotonic() + self.ttl_seconds)
+            self._total_bytes += size
+
+            # 超過預算時由最久未使用的開始淘汰
+            while self._total_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._remove(user_id)
+
+    def _remove(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class RedisWardrobeCache(WardrobeCache):
+    """Redis 共享快取 (多 worker 部署時使用，記憶體上限由 Redis maxmemory 控制)"""
+
+    KEY_PREFIX = "wardrobe:"
+
+    def __init__(self, redis_url: str, ttl_seconds: float = 300):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("未安裝 redis 套件，無法使用 Redis 快取")
+        self.client = redis.Redis.from_url(redis_url)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[List[Dict]]:
+        try:
+            raw = self.client.get(self.KEY_PREFIX + user_id)
+        except Exception as e:
+            print(f"[WARN] 讀取衣櫥快取失敗: {str(e)}")
+            raw = None
+
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, user_id: str, rows: List[Dict]) -> None:
+        try:
+            self.client.set(
+                self.KEY_PREFIX + user_id,
+                json.dumps(rows, default=str),
+                ex=max(1, int(self.ttl_seconds))
+            )
+        except Exception as e:
+            print(f"[WARN] 寫入衣櫥快取失敗: {str(e)}")
+
+    def invalidate(self, user_id: str) -> None:
+        try:
+            self.client.delete(self.KEY_PREFIX + user_id)
+        except Exception as e:
+            print(f"[WARN] 清除衣櫥快取失敗: {str(e)}")
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def create_wardrobe_cache(redis_url: str = "", max_bytes: int = 64 * 1024 * 1024,
+                          ttl_seconds: float = 300) -> WardrobeCache:
+    """依設定建立快取後端 (有 Redis URL 時使用共享快取)"""
+    if redis_url:
+        return RedisWardrobeCache(redis_url, ttl_seconds)
+    return InMemoryWardrobeCache(max_bytes, ttl_seconds)
@@ -4,14 +4,87 @@
 """
 import base64
 import hashlib
-from typing import List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional, Sequence
 from datetime import datetime
 from database.models import ClothingItem
 from database.supabase_client import SupabaseClient
+from database.image_store import ImageStore, image_url_for, is_valid_hash
+from database.pagination import apply_cursor, paginate_rows, next_cursor
+from api.wardrobe_cache import WardrobeCache
+from api.duplicate_index import NearDuplicateIndex, NEAR_DUPLICATE_DISTANCE, dhash_bytes, group_near_duplicates
+from api.async_utils import run_blocking
+
+# 衣櫥可查詢欄位 (不含 image_data，圖片改由 /api/images/{hash} 提供)
+WARDROBE_COLUMNS = (
+    "id", "user_id", "name", "category", "color", "style", "warmth",
+    "image_hash", "image_url", "image_phash", "created_at"
+)
+
+# 預設查詢視圖
+WARDROBE_VIEWS = {
+    "full": WARDROBE_COLUMNS,
+    # 推薦引擎與前端卡片顯示所需欄位
+    "summary": ("id", "name", "category", "color", "style", "warmth", "image_hash", "image_url"),
+    # 分類統計
+    "stats": ("id", "category"),
+}
+
+
+def resolve_columns(fields: Optional[Sequence[str]] = None, view: str = "full") -> Tuple[str, ...]:
+    """
+    解析欲查詢的欄位
+    
+    Args:
+        fields: 指定欄位 (優先於 view)
+        view: 預設視圖名稱 (full / summary / stats)
+    
+    Returns:
+        欄位名稱 tuple (一定包含 id)
+    
+    Raises:
+        ValueError: 欄位或視圖名稱無效
+    """
+    if fields:
+        invalid = [f for f in fields if f not in WARDROBE_COLUMNS]
+        if invalid:
+            raise ValueError(f"無效的欄位: {', '.join(invalid)}")
+        columns = tuple(dict.fromkeys(["id", *fields]))
+    elif view in WARDROBE_VIEWS:
+        columns = WARDROBE_VIEWS[view]
+    else:
+        raise ValueError(f"無效的視圖: {view}")
+    return columns
+
+
+def project_item(item: ClothingItem, columns: Sequence[str]) -> dict:
+    """只輸出指定欄位的衣物字典"""
+    data = item.to_dict()
+    return {col: data.get(col) for col in columns}
 
 class WardrobeService:
-    def __init__(self, supabase_client: SupabaseClient):
+    def __init__(self, supabase_client: SupabaseClient, image_store: ImageStore,
+                 cache: Optional[WardrobeCache] = None):
         self.db = supabase_client
+        self.image_store = image_store
+        self.cache = cache
+        self.duplicate_index = NearDuplicateIndex()
+    
+    def _invalidate(self, user_id: str, keep_index: bool = False):
+        """衣櫥異動後清除快取 (新增衣物時近似重複索引可直接加入，不需清除)"""
+        if self.cache is not None:
+            self.cache.invalidate(str(user_id))
+        if not keep_index:
+            self.duplicate_index.invalidate(str(user_id))
+    
+    @staticmethod
+    def get_image_phash(img_bytes: bytes) -> Optional[str]:
+        """計算圖片的感知雜湊 (dHash)，無法解碼時回傳 None"""
+        try:
+            return dhash_bytes(img_bytes)
+        except Exception as e:
+            print(f"計算感知雜湊失敗: {str(e)}")
+            return None
     
     @staticmethod
     def get_image_hash(img_bytes: bytes) -> str:
@@ -25,19 +98,41 @@ class WardrobeService:
         Returns:
             (是否重複, 已存在的衣物名稱)
         """
+        existing = self.find_existing_hashes(user_id, [img_hash])
+        if img_hash in existing:
+            return True, existing[img_hash]
+        return False, None
+    
+    def find_existing_hashes(self, user_id: str, img_hashes: Sequence[str]) -> Dict[str, str]:
+        """
+        批次查詢使用者衣櫥中已存在的圖片 hash
+        快取中有該使用者的衣櫥時直接比對，否則以一次 in_ 查詢取得
+        
+        Returns:
+            {已存在的 hash: 衣物名稱}
+        """
+        wanted = set(img_hashes)
+        if not wanted:
+            return {}
+        
+        rows = self.cache.get(user_id) if self.cache is not None else None
         try:
-            result = self.db.client.table("my_wardrobe")\
-                .select("id, name")\
-                .eq("user_id", user_id)\
-                .eq("image_hash", img_hash)\
-                .execute()
-            
-            if result.data:
-                return True, result.data[0]['name']
-            return False, None
+            if rows is None:
+                rows = self.db.client.table("my_wardrobe")\
+                    .select("name, image_hash")\
+                    .eq("user_id", user_id)\
+                    .in_("image_hash", sorted(wanted))\
+                    .execute().data or []
         except Exception as e:
             print(f"檢查重複失敗: {str(e)}")
-            return False, None
+            return {}
+        
+        existing = {}
+        for row in rows:
+            img_hash = row.get("image_hash")
+            if img_hash in wanted and img_hash not in existing:
+                existing[img_hash] = row.get("name") or ""
+        return existing
     
     def save_item(self, item: ClothingItem, img_bytes: bytes) -> Tuple[bool, str]:
         """
@@ -51,33 +146,299 @@ class WardrobeService:
             (是否成功, 結果訊息)
         """
         try:
-            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
             img_hash = self.get_image_hash(img_bytes)
+            self.image_store.put(img_hash, img_bytes)
             
-            item.image_data = img_base64
+            item.image_data = None
             item.image_hash = img_hash
+            item.image_url = image_url_for(img_hash)
+            if not item.image_phash:
+                item.image_phash = self.get_image_phash(img_bytes)
             item.created_at = datetime.now()
             
             data = item.to_dict()
             result = self.db.client.table("my_wardrobe").insert(data).execute()
+            if result.data and result.data[0].get("id") is not None:
+                item.id = result.data[0]["id"]
+            self._invalidate(item.user_id, keep_index=True)
+            self.duplicate_index.add(str(item.user_id), item.image_phash, item.id, item.name)
             
             return True, "儲存成功"
         except Exception as e:
             return False, str(e)
     
-    def get_wardrobe(self, user_id: str) -> List[ClothingItem]:
-        """獲取使用者的衣櫥"""
+    def save_items(self, entries: Sequence[Tuple[ClothingItem, bytes]]) -> List[Tuple[bool, str]]:
+        """
+        批次儲存衣物 (一次多列 insert)
+
+        圖片 hash 與寫入圖片儲存以執行緒並行處理；多列 insert 失敗時改為逐筆 insert，
+        以便回報每一筆的成功或失敗
+
+        Args:
+            entries: [(衣物資料模型, 圖片 bytes), ...]
+
+        Returns:
+            與 entries 順序相同的 [(是否成功, 結果訊息), ...]
+        """
+        if not entries:
+            return []
+
+        results: List[Tuple[bool, str]] = [(False, "")] * len(entries)
+
+        def prepare(entry: Tuple[ClothingItem, bytes]) -> ClothingItem:
+            item, img_bytes = entry
+            img_hash = self.get_image_hash(img_bytes)
+            self.image_store.put(img_hash, img_bytes)
+            item.image_data = None
+            item.image_hash = img_hash
+            item.image_url = image_url_for(img_hash)
+            if not item.image_phash:
+                item.image_phash = self.get_image_phash(img_bytes)
+            item.created_at = datetime.now()
+            return item
+
+        ready: List[int] = []
+        with ThreadPoolExecutor(max_workers=min(8, len(entries))) as pool:
+            futures = [pool.submit(prepare, entry) for entry in entries]
+            for idx, future in enumerate(futures):
+                try:
+                    future.result()
+                    ready.append(idx)
+                except Exception as e:
+                    results[idx] = (False, str(e))
+
+        if not ready:
+            return results
+
+        table = self.db.client.table("my_wardrobe")
         try:
-            response = self.db.client.table("my_wardrobe")\
-                .select("*")\
-                .eq("user_id", user_id)\
+            response = table.insert([entries[idx][0].to_dict() for idx in ready]).execute()
+            rows = response.data or []
+            for pos, idx in enumerate(ready):
+                if pos < len(rows) and rows[pos].get("id") is not None:
+                    entries[idx][0].id = rows[pos]["id"]
+                results[idx] = (True, "儲存成功")
+        except Exception as e:
+            # 整批失敗時逐筆重試，找出實際失敗的資料列
+            print(f"[WARN] 批次儲存失敗，改為逐筆儲存: {str(e)}")
+            for idx in ready:
+                item = entries[idx][0]
+                try:
+                    response = table.insert(item.to_dict()).execute()
+                    if response.data and response.data[0].get("id") is not None:
+                        item.id = response.data[0]["id"]
+                    results[idx] = (True, "儲存成功")
+                except Exception as row_error:
+                    results[idx] = (False, str(row_error))
+
+        for user_id in {entries[idx][0].user_id for idx in ready if results[idx][0]}:
+            self._invalidate(user_id, keep_index=True)
+        for idx in ready:
+            item = entries[idx][0]
+            if results[idx][0]:
+                self.duplicate_index.add(str(item.user_id), item.image_phash, item.id, item.name)
+        return results
+    
+    def find_similar_items(self, user_id: str, phashes: Sequence[Optional[str]],
+                           max_distance: int = NEAR_DUPLICATE_DISTANCE) -> List[List[dict]]:
+        """
+        批次查詢衣櫥中與各感知雜湊相近的衣物 (索引不存在時先由衣櫥資料建立)
+        
+        Returns:
+            與 phashes 順序相同的 [[{"id", "name", "distance"}, ...], ...]
+        """
+        if not self.duplicate_index.is_built(user_id):
+            try:
+                rows = self._load_rows(user_id, ("id", "name", "image_phash"))
+            except Exception as e:
+                print(f"建立近似重複索引失敗: {str(e)}")
+                return [[] for _ in phashes]
+            self.duplicate_index.build(user_id, rows)
+        return [self.duplicate_index.find(user_id, phash, max_distance) for phash in phashes]
+    
+    def find_duplicate_groups(self, user_id: str,
+                              max_distance: int = NEAR_DUPLICATE_DISTANCE) -> List[List[ClothingItem]]:
+        """
+        掃描衣櫥中的近似重複衣物 (尚未有感知雜湊的舊資料會先補算並寫回)
+        
+        Returns:
+            近似重複群組列表，每組兩件以上
+        """
+        columns = WARDROBE_VIEWS["summary"] + ("image_phash",)
+        rows = self._load_rows(user_id, columns)
+        if self._backfill_phashes(user_id, rows):
+            rows = self._load_rows(user_id, columns)
+        groups = group_near_duplicates(rows, max_distance)
+        return [self._rows_to_items(group, columns) for group in groups]
+    
+    def _backfill_phashes(self, user_id: str, rows: List[dict]) -> int:
+        """為缺少感知雜湊的衣物補算並寫回資料庫，回傳補算數量"""
+        updated = 0
+        for row in rows:
+            if row.get("image_phash") or not row.get("image_hash"):
+                continue
+            if not self.load_image(row["image_hash"]):
+                continue
+            phash = self.get_image_phash(self.image_store.get(row["image_hash"]))
+            if phash is None:
+                continue
+            try:
+                self.db.client.table("my_wardrobe")\
+                    .update({"image_phash": phash})\
+                    .eq("id", row["id"])\
+                    .eq("user_id", user_id)\
+                    .execute()
+                updated += 1
+            except Exception as e:
+                print(f"補算感知雜湊失敗: {str(e)}")
+        if updated:
+            self._invalidate(user_id)
+        return updated
+    
+    def get_wardrobe(
+        self, user_id: str, fields: Optional[Sequence[str]] = None, view: str = "full"
+    ) -> List[ClothingItem]:
+        """
+        獲取使用者的衣櫥
+        
+        Args:
+            user_id: 使用者 ID
+            fields: 只查詢指定欄位 (未查詢的欄位為預設值)
+            view: 預設視圖 (full / summary / stats)，見 WARDROBE_VIEWS
+        
+        Raises:
+            ValueError: 欄位或視圖名稱無效
+        """
+        columns = resolve_columns(fields, view)
+        
+        try:
+            rows = self._load_rows(user_id, columns)
+            return self._rows_to_items(rows, columns)
+        except Exception as e:
+            print(f"讀取衣櫥失敗: {str(e)}")
+            return []
+    
+    def get_wardrobe_page(
+        self, user_id: str, limit: int, cursor: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None, view: str = "full"
+    ) -> Tuple[List[ClothingItem], Optional[str]]:
+        """
+        分頁獲取使用者的衣櫥 (依 created_at, id 由新到舊)
+        
+        Args:
+            limit: 每頁筆數
+            cursor: 上一頁回傳的 next_cursor (None 為第一頁)
+        
+        Returns:
+            (衣物列表, 下一頁游標；沒有下一頁時為 None)
+        
+        Raises:
+            ValueError: 欄位、視圖或游標無效
+        """
+        columns = resolve_columns(fields, view)
+        
+        if self.cache is not None:
+            try:
+                rows = self._load_rows(user_id, columns)
+            except Exception as e:
+                print(f"讀取衣櫥失敗: {str(e)}")
+                return [], None
+            page, cursor_out = paginate_rows(rows, limit, cursor)
+            return self._rows_to_items(page, columns), cursor_out
+        
+        # 游標需要 created_at 與 id
+        query_columns = list(dict.fromkeys([*columns, "image_hash", "created_at"]))
+        query = self.db.client.table("my_wardrobe")\
+            .select(", ".join(query_columns))\
+            .eq("user_id", user_id)
+        query = apply_cursor(query, cursor)
+        
+        try:
+            response = query\
                 .order("created_at", desc=True)\
+                .order("id", desc=True)\
+                .limit(limit + 1)\
                 .execute()
-            
-            return [ClothingItem.from_dict(item) for item in response.data]
         except Exception as e:
             print(f"讀取衣櫥失敗: {str(e)}")
-            return []
+            return [], None
+        
+        rows = response.data or []
+        page = rows[:limit]
+        return self._rows_to_items(page, columns), next_cursor(page, limit, len(rows) > limit)
+    
+    @staticmethod
+    def _rows_to_items(rows: List[dict], columns: Sequence[str]) -> List[ClothingItem]:
+        items = []
+        for row in rows:
+            item = ClothingItem.from_dict({col: row[col] for col in columns if col in row})
+            # 舊資料只有 image_data，統一改用 hash URL (首次讀取時由 load_image 搬移)
+            if "image_url" in columns and not item.image_url and row.get("image_hash"):
+                item.image_url = image_url_for(row["image_hash"])
+            items.append(item)
+        return items
+    
+    def _load_rows(self, user_id: str, columns: Sequence[str]) -> List[dict]:
+        """
+        讀取衣櫥資料列
+        有快取時一律查詢完整欄位並寫入快取，之後的各種視圖都由快取投影
+        """
+        if self.cache is not None:
+            rows = self.cache.get(user_id)
+            if rows is None:
+                rows = self._query_rows(user_id, WARDROBE_COLUMNS)
+                self.cache.set(user_id, rows)
+            return rows
+        
+        # 舊資料的 image_url 需由 image_hash 推得
+        query_columns = list(columns)
+        if "image_url" in columns and "image_hash" not in columns:
+            query_columns.append("image_hash")
+        return self._query_rows(user_id, query_columns)
+    
+    def _query_rows(self, user_id: str, columns: Sequence[str]) -> List[dict]:
+        response = self.db.client.table("my_wardrobe")\
+            .select(", ".join(columns))\
+            .eq("user_id", user_id)\
+            .order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .execute()
+        return response.data or []
+    
+    def load_image(self, img_hash: str) -> bool:
+        """
+        確保圖片存在於圖片儲存中
+        舊資料的圖片仍以 base64 存在 image_data 欄位，首次讀取時搬移至圖片儲存
+        
+        Returns:
+            圖片是否可用
+        """
+        if not is_valid_hash(img_hash):
+            return False
+        if self.image_store.exists(img_hash):
+            return True
+        
+        try:
+            result = self.db.client.table("my_wardrobe")\
+                .select("image_data")\
+                .eq("image_hash", img_hash)\
+                .not_.is_("image_data", "null")\
+                .limit(1)\
+                .execute()
+            
+            if not result.data:
+                return False
+            
+            img_bytes = base64.b64decode(result.data[0]['image_data'])
+            if self.get_image_hash(img_bytes) != img_hash:
+                print(f"圖片 hash 不符，略過搬移: {img_hash}")
+                return False
+            
+            self.image_store.put(img_hash, img_bytes)
+            return True
+        except Exception as e:
+            print(f"讀取舊圖片失敗: {str(e)}")
+            return False
     
     def update_item(self, user_id: str, item_id: int, data: dict) -> bool:
         """更新衣物資訊"""
@@ -88,6 +449,7 @@ class WardrobeService:
                 .eq("id", item_id)\
                 .eq("user_id", user_id)\
                 .execute()
+            self._invalidate(user_id)
             return len(result.data) > 0
         except Exception as e:
             print(f"資料庫更新失敗: {str(e)}")
@@ -101,6 +463,7 @@ class WardrobeService:
                 .eq("id", item_id)\
                 .eq("user_id", user_id)\
                 .execute()
+            self._invalidate(user_id)
             return True
         except Exception as e:
             print(f"刪除失敗: {str(e)}")
@@ -126,6 +489,7 @@ class WardrobeService:
                 except:
                     fail_count += 1
             
+            self._invalidate(user_id)
             return True, success_count, fail_count
         except Exception as e:
             print(f"批次刪除失敗: {str(e)}")
@@ -133,7 +497,7 @@ class WardrobeService:
     
     def get_category_statistics(self, user_id: str) -> dict:
         """獲取衣櫥分類統計"""
-        items = self.get_wardrobe(user_id)
+        items = self.get_wardrobe(user_id, view="stats")
         
         categories = {}
         for item in items:
@@ -141,3 +505,42 @@ class WardrobeService:
             categories[cat] = categories.get(cat, 0) + 1
         
         return categories
+    
+    # ========== 非同步介面 (在 I/O 執行緒池執行) ==========
+    
+    async def asave_item(self, item: ClothingItem, img_bytes: bytes) -> Tuple[bool, str]:
+        return await run_blocking(self.save_item, item, img_bytes)
+    
+    async def asave_items(self, entries: Sequence[Tuple[ClothingItem, bytes]]) -> List[Tuple[bool, str]]:
+        return await run_blocking(self.save_items, entries)
+
+    async def afind_duplicate_groups(self, user_id: str) -> List[List[ClothingItem]]:
+        return await run_blocking(self.find_duplicate_groups, user_id)
+
+    async def aget_wardrobe(
+        self, user_id: str, fields: Optional[Sequence[str]] = None, view: str = "full"
+    ) -> List[ClothingItem]:
+        return await run_blocking(self.get_wardrobe, user_id, fields, view)
+    
+    async def aget_wardrobe_page(
+        self, user_id: str, limit: int, cursor: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None, view: str = "full"
+    ) -> Tuple[List[ClothingItem], Optional[str]]:
+        return await run_blocking(self.get_wardrobe_page, user_id, limit, cursor, fields, view)
+    
+    async def aload_image(self, img_hash: str) -> bool:
+        if self.image_store.exists(img_hash):
+            return True
+        return await run_blocking(self.load_image, img_hash)
+    
+    async def aupdate_item(self, user_id: str, item_id: int, data: dict) -> bool:
+        return await run_blocking(self.update_item, user_id, item_id, data)
+    
+    async def adelete_item(self, user_id: str, item_id: int) -> bool:
+        return await run_blocking(self.delete_item, user_id, item_id)
+    
+    async def abatch_delete_items(self, user_id: str, item_ids: List[int]) -> Tuple[bool, int, int]:
+        return await run_blocking(self.batch_delete_items, user_id, item_ids)
+    
+    async def aget_category_statistics(self, user_id: str) -> dict:
+        return await run_blocking(self.get_category_statistics, user_id)
@@ -6,6 +6,7 @@ import requests
 from datetime import datetime, timedelta
 from typing import Optional
 from database.models import WeatherData
+from api.async_utils import run_blocking
 import urllib3
 
 class WeatherService:
@@ -162,6 +163,14 @@ class WeatherService:
             print(f"天氣資料處理失敗: {str(e)}")
             return None
     
+    async def aget_weather(self, city: str) -> Optional[WeatherData]:
+        """get_weather 的非同步版 (快取命中時不切換執行緒)"""
+        if city in self._cache:
+            cached_data, cached_time = self._cache[city]
+            if datetime.now() - cached_time < timedelta(hours=self.cache_hours):
+                return cached_data
+        return await run_blocking(self.get_weather, city)
+    
     def clear_cache(self):
         """清除快取"""
         self._cache.clear()
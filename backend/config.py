@@ -17,16 +17,53 @@ class AppConfig:
     api_rate_limit_seconds: int = 15
     max_batch_upload: int = 10
     weather_cache_hours: int = 1
+    image_store_dir: str = "data/images"
+    thumbnail_workers: int = 2
+    wardrobe_cache_max_bytes: int = 64 * 1024 * 1024
+    wardrobe_cache_ttl_seconds: int = 300
+    wardrobe_cache_redis_url: str = ""
+    io_pool_workers: int = 32
+    ai_pool_workers: int = 4
+    gemini_t1_rpm: float = 10
+    gemini_t2_rpm: float = 10
+    gemini_burst: int = 2
+    gemini_queue_size: int = 50
+    gemini_queue_timeout_seconds: float = 60
+    rate_limit_db_path: str = "data/rate_limits.db"
+    upload_job_workers: int = 2
+    upload_job_db_path: str = "data/upload_jobs.db"
+    tag_cache_db_path: str = "data/tag_cache.db"
+    tag_cache_max_entries: int = 50_000
+    embedding_db_path: str = "data/embeddings.db"
+    model_a_warmup: bool = True
     
     @classmethod
     def from_env(cls) -> 'AppConfig':
-        """從環境變數載入配置"""
+        """
+        從環境變數載入配置
+        本地資料 (圖片、SQLite) 預設放在 DATA_DIR 底下，部署時將 DATA_DIR 指向持久化磁碟，
+        重新部署或重啟後上傳工作、標籤快取與外觀向量才不會遺失；個別路徑仍可用各自的環境變數覆寫
+        """
+        data_dir = os.getenv("DATA_DIR", "data")
+
+        def data_path(env_key: str, filename: str) -> str:
+            return os.getenv(env_key) or os.path.join(data_dir, filename)
+
         return cls(
             gemini_api_key=os.getenv("GEMINI_KEY", ""),
             weather_api_key=os.getenv("CWA_API_KEY", "") or os.getenv("WEATHER_KEY", ""),  # 優先使用 CWA Key，相容舊設定
             supabase_url=os.getenv("SUPABASE_URL", ""),
             supabase_key=os.getenv("SUPABASE_KEY", ""),
-            default_city=os.getenv("DEFAULT_CITY", "臺北市")  # 改用中文城市名稱
+            default_city=os.getenv("DEFAULT_CITY", "臺北市"),  # 改用中文城市名稱
+            image_store_dir=data_path("IMAGE_STORE_DIR", "images"),
+            rate_limit_db_path=data_path("RATE_LIMIT_DB_PATH", "rate_limits.db"),
+            upload_job_db_path=data_path("UPLOAD_JOB_DB_PATH", "upload_jobs.db"),
+            tag_cache_db_path=data_path("TAG_CACHE_DB_PATH", "tag_cache.db"),
+            embedding_db_path=data_path("EMBEDDING_DB_PATH", "embeddings.db"),
+            wardrobe_cache_redis_url=os.getenv("WARDROBE_CACHE_REDIS_URL", ""),
+            gemini_t1_rpm=float(os.getenv("GEMINI_T1_RPM", "10")),
+            gemini_t2_rpm=float(os.getenv("GEMINI_T2_RPM", "10")),
+            model_a_warmup=os.getenv("MODEL_A_WARMUP", "1") not in ("0", "false", "False")
         )
     
     def is_valid(self) -> bool:
@@ -0,0 +1,134 @@
+"""
+圖片儲存層 - Content-Addressed Image Store
+以圖片 SHA256 hash 作為鍵值儲存原始圖片，本地檔案系統實作可替換為物件儲存
+"""
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+# 圖片 hash 格式 (SHA256 十六進位字串)
+_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# 衍生檔名稱格式 (如 "original", "480.webp")
+_VARIANT_PATTERN = re.compile(r'^[0-9a-z]+(\.[a-z]+)?$')
+
+ORIGINAL = "original"
+
+
+def is_valid_hash(image_hash: str) -> bool:
+    """檢查是否為合法的 SHA256 hash 字串"""
+    return bool(image_hash) and bool(_HASH_PATTERN.match(image_hash))
+
+
+def image_url_for(image_hash: str) -> str:
+    """取得圖片的對外 URL"""
+    return f"/api/images/{image_hash}"
+
+
+def guess_mime_type(header: bytes) -> str:
+    """依照檔頭 magic bytes 判斷圖片格式"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return "image/jpeg"
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "image/png"
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return "image/webp"
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return "image/gif"
+    if header[4:12] in (b'ftypheic', b'ftypheix', b'ftypmif1', b'ftypmsf1'):
+        return "image/heic"
+    return "application/octet-stream"
+
+
+class ImageStore:
+    """
+    圖片儲存介面
+
+    以內容 hash 定址，相同圖片只會儲存一次；同一張圖片的縮圖等衍生檔
+    以 variant 名稱與原圖放在一起。
+    替換為物件儲存 (S3 / Supabase Storage) 時實作以下方法即可。
+    """
+
+    def exists(self, image_hash: str, variant: str = ORIGINAL) -> bool:
+        raise NotImplementedError
+
+    def put(self, image_hash: str, data: bytes, variant: str = ORIGINAL) -> None:
+        raise NotImplementedError
+
+    def get(self, image_hash: str, variant: str = ORIGINAL) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def size(self, image_hash: str, variant: str = ORIGINAL) -> Optional[int]:
+        raise NotImplementedError
+
+    def iter_chunks(
+        self, image_hash: str, variant: str = ORIGINAL, chunk_size: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        raise NotImplementedError
+
+
+class LocalImageStore(ImageStore):
+    """本地檔案系統圖片儲存"""
+
+    def __init__(self, root_dir: str):
+        """
+        Args:
+            root_dir: 儲存根目錄 (部署時應掛載於持久化磁碟)
+        """
+        self.root = Path(root_dir)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, image_hash: str, variant: str = ORIGINAL) -> Path:
+        if not is_valid_hash(image_hash):
+            raise ValueError(f"無效的圖片 hash: {image_hash}")
+        if not _VARIANT_PATTERN.match(variant):
+            raise ValueError(f"無效的圖片版本: {variant}")
+        # 以前兩碼分目錄，避免單一目錄檔案過多
+        return self.root / image_hash[:2] / image_hash / variant
+
+    def exists(self, image_hash: str, variant: str = ORIGINAL) -> bool:
+        try:
+            return self._path(image_hash, variant).is_file()
+        except ValueError:
+            return False
+
+    def put(self, image_hash: str, data: bytes, variant: str = ORIGINAL) -> None:
+        """寫入圖片 (已存在則略過，以暫存檔 + rename 確保寫入不會留下半成品)"""
+        path = self._path(image_hash, variant)
+        if path.is_file():
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def get(self, image_hash: str, variant: str = ORIGINAL) -> Optional[bytes]:
+        try:
+            return self._path(image_hash, variant).read_bytes()
+        except (OSError, ValueError):
+            return None
+
+    def size(self, image_hash: str, variant: str = ORIGINAL) -> Optional[int]:
+        try:
+            return self._path(image_hash, variant).stat().st_size
+        except (OSError, ValueError):
+            return None
+
+    def iter_chunks(
+        self, image_hash: str, variant: str = ORIGINAL, chunk_size: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        """以固定大小區塊串流讀取圖片"""
+        with open(self._path(image_hash, variant), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
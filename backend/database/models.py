@@ -30,6 +30,7 @@ class ClothingItem:
     image_data: Optional[str] = None
     image_hash: Optional[str] = None
     image_url: Optional[str] = None
+    image_phash: Optional[str] = None  # dHash 十六進位字串，用於近似重複偵測
     created_at: Optional[datetime] = None
     
     def to_dict(self) -> dict:
@@ -47,6 +48,7 @@ class ClothingItem:
             "image_data": self.image_data,
             "image_hash": self.image_hash,
             "image_url": self.image_url,
+            "image_phash": self.image_phash,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
         
@@ -69,6 +71,7 @@ class ClothingItem:
             image_data=data.get("image_data"),
             image_hash=data.get("image_hash"),
             image_url=data.get("image_url"),
+            image_phash=data.get("image_phash"),
             created_at=cls._parse_datetime(data.get("created_at"))
         )
 
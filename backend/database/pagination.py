@@ -0,0 +1,68 @@
+"""
+分頁工具
+以 (created_at, id) 作為 keyset 游標，游標對前端為不透明字串
+"""
+import base64
+import json
+from typing import Dict, List, Optional, Tuple
+
+
+def encode_cursor(created_at: str, row_id) -> str:
+    """將最後一筆資料的 (created_at, id) 編碼為游標字串"""
+    raw = json.dumps([created_at, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """
+    解碼游標字串
+
+    Raises:
+        ValueError: 游標格式錯誤
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(created_at, str):
+            raise TypeError
+        return created_at, int(row_id)
+    except Exception:
+        raise ValueError("無效的分頁游標")
+
+
+def apply_cursor(query, cursor: Optional[str]):
+    """
+    在 created_at DESC, id DESC 排序的查詢上套用游標條件
+    (created_at < c) OR (created_at = c AND id < i)
+    """
+    if not cursor:
+        return query
+    created_at, row_id = decode_cursor(cursor)
+    return query.or_(
+        f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})'
+    )
+
+
+def paginate_rows(rows: List[Dict], limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    在已依 created_at DESC, id DESC 排序的記憶體資料列上分頁 (供快取資料使用)
+
+    Returns:
+        (本頁資料列, 下一頁游標)
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        rows = [
+            r for r in rows
+            if (r.get("created_at") or "", r.get("id") or 0) < (created_at, row_id)
+        ]
+    page = rows[:limit]
+    return page, next_cursor(page, limit, has_more=len(rows) > limit)
+
+
+def next_cursor(page: List[Dict], limit: int, has_more: bool) -> Optional[str]:
+    """依本頁最後一筆資料產生下一頁游標"""
+    if not has_more or not page or len(page) < limit:
+        return None
+    last = page[-1]
+    return encode_cursor(last.get("created_at") or "", last.get("id"))
@@ -91,10 +91,11 @@ const AnchorItemUI = {
                 div.classList.add('selected');
             }
 
-            const imgSrc = item.image_data ? `data:image/jpeg;base64,${item.image_data}` : 'static/images/placeholder.jpg';
+            const imgSrc = ImageUtils.getItemImageSrc(item, undefined, 'grid');
+            const imgSrcset = ImageUtils.getItemImageSrcset(item);
 
             div.innerHTML = `
-                <img src="${imgSrc}" alt="${item.name}">
+                <img src="${imgSrc}" srcset="${imgSrcset}" sizes="160px" alt="${item.name}" loading="lazy">
                 <div class="anchor-item-info">
                     <strong>${item.name}</strong>
                     <div class="anchor-item-meta">
@@ -52,7 +52,8 @@ const API = {
     },
 
     // ========== 上傳 API ==========
-    async uploadImages(files, warmth = '薄') {
+    // 上傳後後端會建立背景工作，這裡輪詢到工作結束再回傳結果 (可傳入 onProgress 顯示進度)
+    async uploadImages(files, warmth = '薄', onProgress = null) {
         const formData = new FormData();
 
         files.forEach(file => {
@@ -75,9 +76,37 @@ const API = {
             throw new Error(`上傳失敗: ${response.statusText}`);
         }
 
+        const result = await response.json();
+        if (!result.success || !result.job_id) {
+            return result;
+        }
+
+        return this.waitForUploadJob(result.job_id, onProgress);
+    },
+
+    async getUploadJob(jobId) {
+        const user = AppState.getUser();
+        const response = await fetch(
+            `${API_BASE_URL}/api/upload/jobs/${encodeURIComponent(jobId)}?user_id=${encodeURIComponent(user.id)}`
+        );
+
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+
         return response.json();
     },
 
+    async waitForUploadJob(jobId, onProgress = null, intervalMs = 1500) {
+        while (true) {
+            const job = await this.getUploadJob(jobId);
+            if (!job.success) return job;
+            if (onProgress) onProgress(job);
+            if (job.status === 'done' || job.status === 'failed') return job;
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    },
+
     // ========== 衣櫥 API ==========
     async getWardrobe() {
         const user = AppState.getUser();
@@ -246,7 +275,26 @@ const API = {
 };
 
 // ========== 圖片處理工具 ==========
+// 後端產生的縮圖寬度 (對應 backend/api/thumbnail_service.py 的 THUMBNAIL_WIDTHS)
+const IMAGE_WIDTHS = { grid: 240, card: 480, full: 1080 };
+
 const ImageUtils = {
+    // 取得衣物圖片網址: 優先使用指定尺寸的 JPEG 縮圖，相容舊資料的 base64
+    getItemImageSrc(item, placeholder = 'static/images/placeholder.jpg', size = 'card') {
+        if (item.image_hash) return `/api/images/${item.image_hash}/${IMAGE_WIDTHS[size]}.jpeg`;
+        if (item.image_url) return item.image_url;
+        if (item.image_data) return `data:image/jpeg;base64,${item.image_data}`;
+        return placeholder;
+    },
+
+    // 取得 srcset (WebP 多尺寸)，讓瀏覽器依顯示大小挑選
+    getItemImageSrcset(item) {
+        if (!item.image_hash) return '';
+        return Object.values(IMAGE_WIDTHS)
+            .map(w => `/api/images/${item.image_hash}/${w}.webp ${w}w`)
+            .join(', ');
+    },
+
     // 壓縮圖片: 模擬「截圖邏輯」，先處理格式相容性，再強制縮小解析度
     async compressImage(file, maxWidth = 800, maxHeight = 800, quality = 0.6) {
         return new Promise(async (resolve, reject) => {
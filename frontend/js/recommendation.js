@@ -147,7 +147,7 @@ const RecommendationUI = {
 
         // ✅ 修復問題 8: 檢查是否需要購物連結容器
         let shoppingHtml = '';
-        if (!currentItem.id || currentItem.id === 'ai_suggested' || !currentItem.image_data) {
+        if (!currentItem.id || currentItem.id === 'ai_suggested' || !(currentItem.image_url || currentItem.image_data)) {
             shoppingHtml = `<div id="shopping-container-${this.currentSetIndex}-${this.currentItemIndex}"></div>`;
         }
 
@@ -197,12 +197,13 @@ const RecommendationUI = {
 
     renderClothingItem(item) {
         // 處理圖片
-        const imgSrc = item.image_data ? `data:image/jpeg;base64,${item.image_data}` : 'static/images/placeholder.jpg';
+        const imgSrc = ImageUtils.getItemImageSrc(item);
+        const imgSrcset = ImageUtils.getItemImageSrcset(item);
 
         return `
             <div class="recommended-item animate-fade-in">
                 <div class="recommended-item-image">
-                    <img src="${imgSrc}" alt="${item.name}">
+                    <img src="${imgSrc}" srcset="${imgSrcset}" sizes="(max-width: 768px) 90vw, 480px" alt="${item.name}">
                 </div>
                 <div class="recommended-item-info">
                     <h3>${item.name}</h3>
@@ -241,6 +241,8 @@ const UploadUI = {
 
             let totalSuccess = 0;
             let totalFail = 0;
+            let totalDuplicate = 0;
+            let totalPossibleDuplicate = 0;
             const allItems = [];
 
             for (const [warmthKey, items] of Object.entries(groups)) {
@@ -254,11 +256,15 @@ const UploadUI = {
                 );
 
                 // 2. 上傳到後端
-                const result = await API.uploadImages(compressedFiles, warmthKey);
+                const result = await API.uploadImages(compressedFiles, warmthKey, (job) => {
+                    console.log(`[INFO] 上傳工作 ${job.job_id}: ${job.completed}/${job.total} (${job.status})`);
+                });
 
                 if (result.success) {
                     totalSuccess += (result.success_count || 0);
                     totalFail += (result.fail_count || 0);
+                    totalDuplicate += (result.duplicate_count || 0);
+                    totalPossibleDuplicate += (result.possible_duplicate_count || 0);
                     if (result.items) allItems.push(...result.items);
                 } else {
                     totalFail += items.length;
@@ -273,7 +279,11 @@ const UploadUI = {
 
             // 顯示最終結果
             const duration = ((Date.now() - startTime) / 1000).toFixed(1);
-            Toast.success(`🎉 任務完成！成功: ${totalSuccess}, 失敗: ${totalFail} (耗時 ${duration}s)`);
+            const duplicateText = totalDuplicate > 0 ? `, 重複略過: ${totalDuplicate}` : '';
+            Toast.success(`🎉 任務完成！成功: ${totalSuccess}, 失敗: ${totalFail}${duplicateText} (耗時 ${duration}s)`);
+            if (totalPossibleDuplicate > 0) {
+                Toast.info(`有 ${totalPossibleDuplicate} 件衣物與衣櫥中的衣物相似，可能重複上傳`);
+            }
 
             if (allItems.length > 0) {
                 this.showUploadResults(allItems);
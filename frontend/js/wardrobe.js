@@ -272,9 +272,9 @@ const WardrobeUI = {
             `;
         }
 
-        const imageSrc = item.image_data ?
-            `data:image/jpeg;base64,${item.image_data}` :
-            'data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%22100%22 height=%22100%22%3E%3Crect fill=%22%23ddd%22 width=%22100%22 height=%22100%22/%3E%3Ctext x=%2250%25%22 y=%2250%25%22 text-anchor=%22middle%22 dy=%22.3em%22 fill=%22%23999%22%3E無圖片%3C/text%3E%3C/svg%3E';
+        const imageSrcset = ImageUtils.getItemImageSrcset(item);
+        const imageSrc = ImageUtils.getItemImageSrc(item,
+            'data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%22100%22 height=%22100%22%3E%3Crect fill=%22%23ddd%22 width=%22100%22 height=%22100%22/%3E%3Ctext x=%2250%25%22 y=%2250%25%22 text-anchor=%22middle%22 dy=%22.3em%22 fill=%22%23999%22%3E無圖片%3C/text%3E%3C/svg%3E', 'grid');
 
         const category = item.category || '其他';
         const color = item.color || '未知';
@@ -285,6 +285,8 @@ const WardrobeUI = {
             ${checkboxHTML}
             <div class="item-image">
                 <img src="${imageSrc}" 
+                     srcset="${imageSrcset}"
+                     sizes="(max-width: 768px) 50vw, 240px"
                      alt="${item.name}"
                      loading="lazy"
                      onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%22100%22 height=%22100%22%3E%3Crect fill=%22%23ddd%22 width=%22100%22 height=%22100%22/%3E%3C/svg%3E'">
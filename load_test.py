@@ -0,0 +1,118 @@
+"""
+負載測試腳本
+量測推薦請求進行中時，/health 與 /api/wardrobe 的延遲是否維持穩定
+
+用法:
+    python load_test.py --base-url http://localhost:8000 --user-id <UUID> --city 臺北市
+
+流程:
+    1. baseline: 只打 /health 與 /api/wardrobe
+    2. loaded:   同時持續送出 /api/recommendation
+    兩階段分別輸出 p50 / p95 / p99，若 event loop 沒被阻塞，兩階段的 p99 應相近
+"""
+import argparse
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Dict, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def timed_request(url: str, data: bytes = None, timeout: float = 300) -> float:
+    """送出請求並回傳耗時 (毫秒)"""
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, data=data, timeout=timeout) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def probe_worker(name: str, url: str, stop: threading.Event, results: Dict[str, List[float]], lock: threading.Lock):
+    """持續請求輕量端點並記錄延遲"""
+    while not stop.is_set():
+        try:
+            elapsed = timed_request(url, timeout=30)
+        except Exception as e:
+            print(f"[WARN] {name} 請求失敗: {e}")
+            continue
+        with lock:
+            results.setdefault(name, []).append(elapsed)
+
+
+def recommendation_worker(url: str, form: bytes, stop: threading.Event, latencies: List[float]):
+    """持續送出推薦請求 (模擬耗時的 Gemini 呼叫)"""
+    while not stop.is_set():
+        try:
+            latencies.append(timed_request(url, data=form))
+        except Exception as e:
+            print(f"[WARN] 推薦請求失敗: {e}")
+
+
+def run_phase(args, with_recommendations: bool) -> Dict[str, List[float]]:
+    stop = threading.Event()
+    lock = threading.Lock()
+    results: Dict[str, List[float]] = {}
+    threads = []
+
+    probes = {
+        "/health": f"{args.base_url}/health",
+        "/api/wardrobe": f"{args.base_url}/api/wardrobe?" + urllib.parse.urlencode(
+            {"user_id": args.user_id, "view": "summary"}
+        ),
+    }
+    for name, url in probes.items():
+        for _ in range(args.probe_concurrency):
+            threads.append(threading.Thread(target=probe_worker, args=(name, url, stop, results, lock), daemon=True))
+
+    rec_latencies: List[float] = []
+    if with_recommendations:
+        form = urllib.parse.urlencode({
+            "user_id": args.user_id, "city": args.city, "style": "", "occasion": "日常"
+        }).encode("utf-8")
+        for _ in range(args.recommendation_concurrency):
+            threads.append(threading.Thread(
+                target=recommendation_worker,
+                args=(f"{args.base_url}/api/recommendation", form, stop, rec_latencies),
+                daemon=True
+            ))
+
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+
+    if rec_latencies:
+        results["/api/recommendation"] = rec_latencies
+    return results
+
+
+def print_report(label: str, results: Dict[str, List[float]]):
+    print(f"\n===== {label} =====")
+    print(f"{'endpoint':24s} {'count':>6s} {'p50(ms)':>9s} {'p95(ms)':>9s} {'p99(ms)':>9s}")
+    for name, samples in results.items():
+        print(f"{name:24s} {len(samples):6d} {percentile(samples, 50):9.1f} "
+              f"{percentile(samples, 95):9.1f} {percentile(samples, 99):9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="event loop 阻塞負載測試")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument("--city", default="臺北市")
+    parser.add_argument("--duration", type=float, default=30, help="每階段秒數")
+    parser.add_argument("--probe-concurrency", type=int, default=4)
+    parser.add_argument("--recommendation-concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    baseline = run_phase(args, with_recommendations=False)
+    print_report("baseline", baseline)
+
+    loaded = run_phase(args, with_recommendations=True)
+    print_report("推薦請求進行中", loaded)
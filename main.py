@@ -1,9 +1,12 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from typing import List, Optional
 from pathlib import Path
+import asyncio
+import itertools
+import json
 import sys
 import os
 
@@ -11,11 +14,20 @@ sys.path.insert(0, str(Path(__file__).parent / 'backend'))
 
 from config import AppConfig
 from database.supabase_client import SupabaseClient
-from api.ai_service import AIService
+from database.image_store import LocalImageStore, guess_mime_type, is_valid_hash, image_url_for
+from api.ai_service import AIService, TAG_CACHE_VERSION
+from api.model_a_adapter import ModelAAdapter, STATE_READY
 from api.weather_service import WeatherService
-from api.wardrobe_service import WardrobeService
+from api.wardrobe_service import WardrobeService, WARDROBE_VIEWS, resolve_columns, project_item
 from api.user_service import UserService
-from database.models import ClothingItem
+from api.wardrobe_cache import create_wardrobe_cache
+from api.thumbnail_service import ThumbnailService, THUMBNAIL_FORMATS, parse_variant
+from api.async_utils import configure_executors, run_blocking
+from api.rate_scheduler import RateScheduler, SQLiteBucketStore, TierConfig
+from api.tag_cache import TagCache
+from api.upload_jobs import UploadJobStore, UploadJobQueue, job_summary, JOB_TERMINAL
+from api.embedding_index import EmbeddingStore, EmbeddingIndex
+from api.visual_search import VisualSearchService, similar_summary
 
 app = FastAPI()
 
@@ -28,21 +40,70 @@ app.add_middleware(
 )
 
 config = AppConfig.from_env()
+configure_executors(config.io_pool_workers, config.ai_pool_workers)
 supabase_client = SupabaseClient(config.supabase_url, config.supabase_key)
-ai_service = AIService(config.gemini_api_key)
+gemini_scheduler = RateScheduler(
+    {
+        "t1": TierConfig(config.gemini_t1_rpm, config.gemini_burst),
+        "t2": TierConfig(config.gemini_t2_rpm, config.gemini_burst),
+    },
+    store=SQLiteBucketStore(config.rate_limit_db_path),
+    max_queue=config.gemini_queue_size,
+    default_timeout=config.gemini_queue_timeout_seconds
+)
+tag_cache = TagCache(config.tag_cache_db_path, TAG_CACHE_VERSION, config.tag_cache_max_entries)
+ai_service = AIService(config.gemini_api_key, scheduler=gemini_scheduler, tag_cache=tag_cache)
 weather_service = WeatherService(config.weather_api_key)
-wardrobe_service = WardrobeService(supabase_client)
+image_store = LocalImageStore(config.image_store_dir)
+thumbnail_service = ThumbnailService(image_store, config.thumbnail_workers)
+wardrobe_cache = create_wardrobe_cache(
+    config.wardrobe_cache_redis_url,
+    config.wardrobe_cache_max_bytes,
+    config.wardrobe_cache_ttl_seconds
+)
+wardrobe_service = WardrobeService(supabase_client, image_store, wardrobe_cache)
 user_service = UserService(supabase_client)
+embedding_store = EmbeddingStore(config.embedding_db_path)
+visual_search = VisualSearchService(EmbeddingIndex(embedding_store), wardrobe_service, image_store)
+upload_job_store = UploadJobStore(config.upload_job_db_path)
+upload_queue = UploadJobQueue(
+    upload_job_store, image_store, ai_service, wardrobe_service, thumbnail_service,
+    workers=config.upload_job_workers, visual_search=visual_search
+)
 
 app.mount("/static", StaticFiles(directory="frontend"), name="static")
 
+@app.on_event("startup")
+async def start_background_workers():
+    """啟動上傳 worker (並續跑重啟前未完成的工作)，並於背景預先載入 Model A"""
+    upload_queue.start()
+    if config.model_a_warmup:
+        ModelAAdapter.warm_up_in_background()
+
 @app.get("/")
 async def read_root():
     return FileResponse("frontend/index.html")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    model_a_state = ModelAAdapter.state()
+    return {
+        "status": "healthy",
+        "model_a": model_a_state,
+        "model_a_ready": model_a_state == STATE_READY
+    }
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """服務內部指標"""
+    return {
+        "wardrobe_cache": wardrobe_cache.stats(),
+        "gemini_scheduler": gemini_scheduler.stats(),
+        "tag_cache": await run_blocking(tag_cache.stats),
+        "upload_queue_depth": upload_queue.queue_depth(),
+        "model_a_batcher": ModelAAdapter.stats(),
+        "embeddings": await run_blocking(embedding_store.stats)
+    }
 
 # ========== 認證 ==========
 
@@ -50,11 +111,11 @@ async def health_check():
 async def login(username: str = Form(...), password: str = Form(...)):
     """登入"""
     try:
-        result = supabase_client.client.table("users")\
+        query = supabase_client.client.table("users")\
             .select("id")\
             .eq("username", username)\
-            .eq("password", password)\
-            .execute()
+            .eq("password", password)
+        result = await run_blocking(query.execute)
         
         if result.data:
             return {
@@ -73,18 +134,18 @@ async def register(username: str = Form(...), password: str = Form(...)):
     """註冊"""
     try:
         # 檢查重複
-        existing = supabase_client.client.table("users")\
+        query = supabase_client.client.table("users")\
             .select("id")\
-            .eq("username", username)\
-            .execute()
+            .eq("username", username)
+        existing = await run_blocking(query.execute)
         
         if existing.data:
             return {"success": False, "message": "使用者名稱已存在"}
         
         # 新增用戶（讓 Supabase 自動生成 UUID）
-        result = supabase_client.client.table("users")\
-            .insert({"username": username, "password": password})\
-            .execute()
+        query = supabase_client.client.table("users")\
+            .insert({"username": username, "password": password})
+        result = await run_blocking(query.execute)
         
         if result.data:
             return {"success": True, "message": "註冊成功"}
@@ -100,7 +161,7 @@ async def register(username: str = Form(...), password: str = Form(...)):
 async def get_weather(city: str = "Taipei"):
     """天氣"""
     try:
-        weather = weather_service.get_weather(city)
+        weather = await weather_service.aget_weather(city)
         return weather.to_dict() if weather else {"error": "無法獲取天氣"}
     except Exception as e:
         print(f"[ERROR] 天氣: {str(e)}")
@@ -110,7 +171,7 @@ async def get_weather(city: str = "Taipei"):
 
 @app.post("/api/upload")
 async def upload_images(request: Request):
-    """上傳衣物"""
+    """上傳衣物 - 建立背景工作後立即回傳 job_id，以 /api/upload/jobs/{job_id} 查詢進度"""
     import traceback
     
     try:
@@ -122,83 +183,26 @@ async def upload_images(request: Request):
         files = form.getlist("files")
         warmth_str = form.get("warmth", "薄")
         
-        # 映射厚度字串到數值
-        warmth_map = {"薄": 2, "適中": 5, "厚": 8}
-        user_warmth = warmth_map.get(warmth_str, 5)
-        
-        print(f"[INFO] 步驟 1: 接收到 user_id={user_id}, 文件數量={len(files)}, 厚度={warmth_str}({user_warmth})")
+        print(f"[INFO] 步驟 1: 接收到 user_id={user_id}, 文件數量={len(files)}, 厚度={warmth_str}")
         
         if not user_id or not files:
             print(f"[ERROR] 缺少必要參數: user_id={user_id}, files={len(files) if files else 0}")
             return {"success": False, "message": "缺少必要參數"}
         
         # 步驟 2: 讀取圖片
-        img_bytes_list = []
-        file_names = []
-        
+        uploaded = []
         for idx, file in enumerate(files):
             content = await file.read()
-            img_bytes_list.append(content)
-            file_names.append(file.filename)
+            uploaded.append((file.filename, content))
             print(f"[INFO] 步驟 2.{idx+1}: 讀取文件 '{file.filename}', 大小={len(content)} bytes")
         
-        # 步驟 3: AI 辨識
-        print(f"[INFO] 步驟 3: 開始 AI 辨識 {len(img_bytes_list)} 張圖片...")
-        tags_list = ai_service.batch_auto_tag(img_bytes_list)
-        
-        if not tags_list:
-            print(f"[ERROR] AI 辨識失敗: tags_list 為 None")
-            return {"success": False, "message": "AI 辨識失敗,請稍後再試"}
+        # 步驟 3: 建立工作 (辨識與儲存由背景 worker 執行)
+        job_id = await run_blocking(upload_queue.submit, user_id, warmth_str, uploaded)
+        print(f"[INFO] 步驟 3: 已建立上傳工作 {job_id}")
         
-        print(f"[INFO] 步驟 3: AI 辨識成功,返回 {len(tags_list)} 個標籤")
-        for idx, tags in enumerate(tags_list):
-            print(f"[INFO]   - 圖片 {idx+1}: {tags}")
-        
-        # 步驟 4: 儲存到資料庫
-        print(f"[INFO] 步驟 4: 開始儲存到資料庫...")
-        success_count = 0
-        fail_count = 0
-        fail_details = []
-        
-        for idx, (img_bytes, tags, filename) in enumerate(zip(img_bytes_list, tags_list, file_names)):
-            try:
-                print(f"[INFO] 步驟 4.{idx+1}: 處理 '{filename}'...")
-                
-                item = ClothingItem(
-                    user_id=user_id,
-                    name=tags.get('name', filename),
-                    category=tags.get('category', '其他'),
-                    color=tags.get('color', '未知'),
-                    style=tags.get('style', ''),
-                    warmth=user_warmth # 使用使用者指定的厚度
-                )
-                
-                success, msg = wardrobe_service.save_item(item, img_bytes)
-                
-                if success:
-                    success_count += 1
-                    print(f"[INFO] 步驟 4.{idx+1}: '{filename}' 儲存成功")
-                else:
-                    fail_count += 1
-                    fail_details.append(f"{filename}: {msg}")
-                    print(f"[ERROR] 步驟 4.{idx+1}: '{filename}' 儲存失敗 - {msg}")
-                    
-            except Exception as e:
-                fail_count += 1
-                error_msg = str(e)
-                fail_details.append(f"{filename}: {error_msg}")
-                print(f"[ERROR] 步驟 4.{idx+1}: '{filename}' 處理異常 - {error_msg}")
-                print(f"[ERROR] 詳細錯誤: {traceback.format_exc()}")
-        
-        print(f"[INFO] ========== 上傳完成: 成功 {success_count} 件, 失敗 {fail_count} 件 ==========")
-        
-        return {
-            "success": True,
-            "success_count": success_count,
-            "fail_count": fail_count,
-            "items": tags_list[:success_count],
-            "fail_details": fail_details if fail_details else None
-        }
+        # 回傳初始進度，其中已包含辨識前即略過的重複圖片
+        job = await run_blocking(upload_job_store.get_job, job_id)
+        return job_summary(job)
         
     except Exception as e:
         error_msg = str(e)
@@ -207,23 +211,230 @@ async def upload_images(request: Request):
         print(f"[ERROR] 詳細堆疊: {traceback.format_exc()}")
         return {"success": False, "message": f"上傳失敗: {error_msg}"}
 
+async def _load_user_job(job_id: str, user_id: str) -> Optional[dict]:
+    """讀取工作並確認屬於該使用者"""
+    job = await run_blocking(upload_job_store.get_job, job_id)
+    if job is None or job["user_id"] != user_id:
+        return None
+    return job
+
+@app.get("/api/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str, user_id: str):
+    """查詢上傳工作進度"""
+    job = await _load_user_job(job_id, user_id)
+    if job is None:
+        return {"success": False, "message": "找不到上傳工作"}
+    return job_summary(job)
+
+@app.get("/api/upload/jobs/{job_id}/events")
+async def stream_upload_job(job_id: str, user_id: str):
+    """以 Server-Sent Events 推送上傳工作進度，工作結束後關閉"""
+    async def event_stream():
+        last_payload = None
+        while True:
+            job = await _load_user_job(job_id, user_id)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'message': '找不到上傳工作'}, ensure_ascii=False)}\n\n"
+                return
+            payload = json.dumps(job_summary(job), ensure_ascii=False)
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+            if job["status"] in JOB_TERMINAL:
+                return
+            await asyncio.sleep(1)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.post("/api/upload/jobs/{job_id}/retry")
+async def retry_upload_job(job_id: str, user_id: str = Form(...)):
+    """重試上傳工作中失敗的圖片"""
+    job = await _load_user_job(job_id, user_id)
+    if job is None:
+        return {"success": False, "message": "找不到上傳工作"}
+    count = await run_blocking(upload_queue.retry, job_id)
+    if not count:
+        return {"success": False, "message": "沒有可重試的圖片"}
+    return {"success": True, "job_id": job_id, "retry_count": count}
+
+# ========== 圖片 ==========
+
+# 圖片以內容 hash 定址，內容永不改變，可讓瀏覽器與 CDN 永久快取
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """比對 If-None-Match 標頭 (可能包含多個 ETag 或 *)"""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+@app.get("/api/images/{image_hash}")
+async def get_image(image_hash: str, request: Request):
+    """取得衣物圖片 (串流傳輸)"""
+    if not is_valid_hash(image_hash):
+        raise HTTPException(status_code=404, detail="圖片不存在")
+    
+    etag = f'"{image_hash}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    
+    if not await wardrobe_service.aload_image(image_hash):
+        raise HTTPException(status_code=404, detail="圖片不存在")
+    
+    size = image_store.size(image_hash)
+    if size is not None:
+        headers["Content-Length"] = str(size)
+    
+    # 讀取第一個區塊判斷圖片格式，再接續串流剩餘內容
+    chunks = image_store.iter_chunks(image_hash)
+    first_chunk = next(chunks, b"")
+    return StreamingResponse(
+        itertools.chain([first_chunk], chunks),
+        media_type=guess_mime_type(first_chunk),
+        headers=headers
+    )
+
+@app.get("/api/images/{image_hash}/{variant}")
+async def get_image_variant(image_hash: str, variant: str, request: Request):
+    """取得衣物縮圖 (variant 格式為 {寬度}.{webp|jpeg}，如 480.webp)"""
+    parsed = parse_variant(variant)
+    if not is_valid_hash(image_hash) or parsed is None:
+        raise HTTPException(status_code=404, detail="圖片不存在")
+    
+    etag = f'"{image_hash}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    
+    if not await wardrobe_service.aload_image(image_hash):
+        raise HTTPException(status_code=404, detail="圖片不存在")
+    
+    if not await run_blocking(thumbnail_service.ensure, image_hash, variant):
+        # 無法產生縮圖 (如格式不支援) 時改提供原圖
+        return RedirectResponse(image_url_for(image_hash), status_code=307)
+    
+    _, fmt = parsed
+    headers["Content-Length"] = str(image_store.size(image_hash, variant))
+    return StreamingResponse(
+        image_store.iter_chunks(image_hash, variant),
+        media_type=THUMBNAIL_FORMATS[fmt][1],
+        headers=headers
+    )
+
 # ========== 衣櫥 ==========
 
+# 分頁筆數上限
+MAX_PAGE_SIZE = 100
+
 @app.get("/api/wardrobe")
-async def get_wardrobe(user_id: str):
-    """取得衣櫥"""
+async def get_wardrobe(
+    user_id: str,
+    fields: Optional[str] = None,
+    view: str = "full",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    """
+    取得衣櫥
+    fields 為逗號分隔的欄位清單 (如 fields=id,name,category)；
+    指定 limit 時分頁回傳，以 next_cursor 取得下一頁
+    """
+    try:
+        field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        columns = resolve_columns(field_list, view)
+        
+        if limit is None and not cursor:
+            items = await wardrobe_service.aget_wardrobe(user_id, fields=columns)
+            next_cursor = None
+        else:
+            page_size = max(1, min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+            items, next_cursor = await wardrobe_service.aget_wardrobe_page(
+                user_id, page_size, cursor, fields=columns
+            )
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
+    
     try:
-        items = wardrobe_service.get_wardrobe(user_id)
-        return {"success": True, "items": [item.to_dict() for item in items]}
+        return {
+            "success": True,
+            "items": [project_item(item, columns) for item in items],
+            "next_cursor": next_cursor
+        }
     except Exception as e:
         print(f"[ERROR] 衣櫥: {str(e)}")
         return {"success": False, "message": "查詢失敗"}
 
+@app.get("/api/wardrobe/duplicates")
+async def get_wardrobe_duplicates(user_id: str):
+    """掃描衣櫥中的近似重複衣物 (以感知雜湊比對，重新存檔或裁切過的同一張照片也會被找出)"""
+    try:
+        groups = await wardrobe_service.afind_duplicate_groups(user_id)
+        columns = WARDROBE_VIEWS["summary"]
+        return {
+            "success": True,
+            "groups": [[project_item(item, columns) for item in group] for group in groups]
+        }
+    except Exception as e:
+        print(f"[ERROR] 重複掃描: {str(e)}")
+        return {"success": False, "message": "掃描失敗"}
+
+# 相似衣物搜尋的回傳筆數上限
+MAX_SIMILAR_RESULTS = 50
+
+@app.get("/api/wardrobe/{item_id}/similar")
+async def get_similar_items(item_id: int, user_id: str, k: int = 10):
+    """找出衣櫥中外觀與指定衣物相似的衣物 (以 Model A 外觀向量比對，不呼叫 Gemini)"""
+    try:
+        k = max(1, min(k, MAX_SIMILAR_RESULTS))
+        if not await run_blocking(visual_search.available):
+            return {"success": False, "unavailable": True, "message": "本地模型無法使用，暫時無法比對外觀"}
+        matches = await run_blocking(visual_search.similar_to_item, user_id, item_id, k)
+        if matches is None:
+            if visual_search.has_failed(user_id, item_id):
+                return {"success": False, "message": "這件衣物的圖片無法建立外觀特徵"}
+            return {"success": False, "indexing": True, "message": "這件衣物的外觀特徵尚未建立，請稍後再試"}
+        return {"success": True, "items": similar_summary(matches)}
+    except Exception as e:
+        print(f"[ERROR] 相似衣物: {str(e)}")
+        return {"success": False, "message": "查詢失敗"}
+
+@app.post("/api/wardrobe/search-by-image")
+async def search_wardrobe_by_image(
+    user_id: str = Form(...),
+    file: UploadFile = File(...),
+    k: int = Form(10)
+):
+    """以照片搜尋衣櫥中外觀相似的衣物"""
+    try:
+        k = max(1, min(k, MAX_SIMILAR_RESULTS))
+        content = await file.read()
+        if not await run_blocking(visual_search.available):
+            return {"success": False, "unavailable": True, "message": "本地模型無法使用，暫時無法比對外觀"}
+        matches = await run_blocking(visual_search.search_by_image, user_id, content, k)
+        if matches is None:
+            return {"success": False, "message": "無法辨識圖片"}
+        return {
+            "success": True,
+            "items": similar_summary(matches),
+            "indexing": visual_search.is_backfilling(user_id)
+        }
+    except Exception as e:
+        print(f"[ERROR] 以圖搜尋: {str(e)}")
+        return {"success": False, "message": "搜尋失敗"}
+
 @app.post("/api/wardrobe/delete")
 async def delete_item(user_id: str = Form(...), item_id: int = Form(...)):
     """刪除衣物"""
     try:
-        success = wardrobe_service.delete_item(user_id, item_id)
+        success = await wardrobe_service.adelete_item(user_id, item_id)
+        if success:
+            await run_blocking(visual_search.remove, user_id, [item_id])
         return {"success": success}
     except Exception as e:
         print(f"[ERROR] 刪除: {str(e)}")
@@ -233,7 +444,10 @@ async def delete_item(user_id: str = Form(...), item_id: int = Form(...)):
 async def batch_delete(user_id: str = Form(...), item_ids: List[int] = Form(...)):
     """批量刪除"""
     try:
-        success, count, fail = wardrobe_service.batch_delete_items(user_id, item_ids)
+        success, count, fail = await wardrobe_service.abatch_delete_items(user_id, item_ids)
+        if success:
+            # 刪除失敗的衣物之後查詢時會自動補算
+            await run_blocking(visual_search.remove, user_id, item_ids)
         return {"success": success, "success_count": count, "fail_count": fail}
     except Exception as e:
         print(f"[ERROR] 批量刪除: {str(e)}")
@@ -251,16 +465,16 @@ async def get_recommendation(
 ):
     """推薦衣搭 - 支援個人偏好 & 指定單品鎖定"""
     try:
-        wardrobe = wardrobe_service.get_wardrobe(user_id)
+        wardrobe = await wardrobe_service.aget_wardrobe(user_id, view="summary")
         if not wardrobe:
             return {"success": False, "message": "衣櫥是空的"}
         
-        weather = weather_service.get_weather(city)
+        weather = await weather_service.aget_weather(city)
         if not weather:
             return {"success": False, "message": "無法獲取天氣"}
         
         # ✅ 新增：取得使用者個人資料
-        user_profile = user_service.get_profile(user_id)
+        user_profile = await user_service.aget_profile(user_id)
         
         # ✅ 優先級 3：解析指定單品
         locked_item_ids = []
@@ -270,16 +484,17 @@ async def get_recommendation(
             except:
                 locked_item_ids = []
         
-        recommendation = ai_service.generate_outfit_recommendation(
+        recommendation = await ai_service.agenerate_outfit_recommendation(
             wardrobe, weather, style or "不限", occasion,
             user_profile=user_profile,  # ✅ 傳入個人資料
-            locked_items=locked_item_ids  # ✅ 傳入指定單品
+            locked_items=locked_item_ids,  # ✅ 傳入指定單品
+            user_id=user_id
         )
         if not recommendation:
             return {"success": False, "message": "推薦生成失敗"}
         
         # ✅ 新增：儲存歷史紀錄
-        user_service.save_history(
+        await user_service.asave_history(
             user_id=user_id,
             city=city,
             occasion=occasion,
@@ -316,7 +531,7 @@ async def update_clothing_item(
             "style": style,
             "warmth": warmth
         }
-        success = wardrobe_service.update_item(user_id, item_id, data)
+        success = await wardrobe_service.aupdate_item(user_id, item_id, data)
         return {"success": success}
     except Exception as e:
         print(f"[ERROR] 更新衣物: {str(e)}")
@@ -328,7 +543,7 @@ async def update_clothing_item(
 async def get_profile(user_id: str):
     """取得個人資料"""
     try:
-        profile = user_service.get_profile(user_id)
+        profile = await user_service.aget_profile(user_id)
         if profile:
             return {"success": True, "message": "查詢成功", "profile": profile}
         return {"success": False, "message": "查詢失敗", "profile": None}
@@ -366,18 +581,21 @@ async def update_profile(
         if custom_style_desc:
             profile_data['custom_style_desc'] = custom_style_desc
         
-        success, msg = user_service.update_profile(user_id, profile_data)
+        success, msg = await user_service.aupdate_profile(user_id, profile_data)
         return {"success": success, "message": msg}
     except Exception as e:
         print(f"[ERROR] 更新個人資料: {str(e)}")
         return {"success": False, "message": "更新失敗"}
 
 @app.get("/api/history")
-async def get_history(user_id: str, limit: int = 20):
-    """取得推薦歷史紀錄"""
+async def get_history(user_id: str, limit: int = 20, cursor: Optional[str] = None, view: str = "full"):
+    """取得推薦歷史紀錄 (view=summary 不含 recommendation_data，以 next_cursor 取得下一頁)"""
     try:
-        history = user_service.get_history(user_id, limit)
-        return {"success": True, "message": "查詢成功", "history": history}
+        page_size = max(1, min(limit, MAX_PAGE_SIZE))
+        history, next_cursor = await user_service.aget_history_page(user_id, page_size, cursor, view)
+        return {"success": True, "message": "查詢成功", "history": history, "next_cursor": next_cursor}
+    except ValueError as e:
+        return {"success": False, "message": str(e), "history": []}
     except Exception as e:
         print(f"[ERROR] 獲取歷史紀錄: {str(e)}")
         return {"success": False, "message": "獲取失敗", "history": []}
@@ -386,7 +604,7 @@ async def get_history(user_id: str, limit: int = 20):
 async def delete_history(user_id: str = Form(...), history_id: int = Form(...)):
     """刪除歷史紀錄"""
     try:
-        success, msg = user_service.delete_history(user_id, history_id)
+        success, msg = await user_service.adelete_history(user_id, history_id)
         return {"success": success, "message": msg}
     except Exception as e:
         print(f"[ERROR] 刪除歷史紀錄: {str(e)}")
@@ -1,3 +1,19 @@
-from .inference import FashionPredictor
-from .model import FashionMultiTaskModel
+"""
+Model A 套件
+FashionPredictor / FashionMultiTaskModel 依賴 torch，於第一次存取時才載入，
+import model_a.config 等輕量模組不會連帶載入 torch
+"""
 from .config import IMG_SIZE, NUM_CATEGORIES, NUM_ATTRIBUTES
+
+_LAZY_ATTRS = {
+    'FashionPredictor': '.inference',
+    'FashionMultiTaskModel': '.model',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        import importlib
+        module = importlib.import_module(_LAZY_ATTRS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,128 @@
+"""
+Model A 動態微批次
+多個執行緒同時送來的單張推論請求在佇列中累積，
+達到批次上限或最長等待時間後合併為一次前向傳播
+"""
+
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Dict, List, Sequence
+
+
+class BatcherFullError(RuntimeError):
+    """等待佇列已滿 (背壓)，呼叫端應稍後重試或改走其他路徑"""
+
+
+class _Request:
+    __slots__ = ('image', 'top_k', 'future', 'enqueued_at')
+
+    def __init__(self, image, top_k: int):
+        self.image = image
+        self.top_k = top_k
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    FashionPredictor 前的微批次佇列
+
+    - 第一個請求進入後最多等待 max_wait_ms，期間到達的請求一起推論
+    - 累積到 max_batch_size 時立即送出
+    - 佇列超過 max_queue 時拒絕新請求
+    """
+
+    def __init__(self, predictor, max_batch_size: int = 16, max_wait_ms: float = 10,
+                 max_queue: int = 128):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[_Request]" = queue.Queue(maxsize=max_queue)
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._queue_wait_ms: deque = deque(maxlen=1000)
+        self._rejected = 0
+
+        self._thread = threading.Thread(target=self._run, name='model-a-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, image, top_k: int = 3) -> Future:
+        """
+        排入一張圖片，回傳結果的 Future
+
+        Raises:
+            BatcherFullError: 等待佇列已滿
+        """
+        request = _Request(image, top_k)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise BatcherFullError('Model A 推論佇列已滿')
+        return request.future
+
+    def predict_many(self, images: Sequence, top_k: int = 3, timeout: float = None) -> List[Dict]:
+        """排入多張圖片並等待全部結果 (可能與其他呼叫端的請求合併為同一批次)"""
+        futures = [self.submit(image, top_k) for image in images]
+        return [future.result(timeout) for future in futures]
+
+    def _collect(self) -> List[_Request]:
+        """等待第一個請求，再收集到批次上限或等待期限為止"""
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            now = time.monotonic()
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._queue_wait_ms.extend((now - r.enqueued_at) * 1000 for r in batch)
+
+            top_k = max(r.top_k for r in batch)
+            try:
+                results = self.predictor.predict_batch([r.image for r in batch], top_k=top_k)
+                for request, result in zip(batch, results):
+                    self._resolve(request, result)
+            except Exception:
+                # 批次中有無法處理的圖片時逐張重跑，只讓失敗的請求收到例外
+                for request in batch:
+                    try:
+                        self._resolve(request, self.predictor.predict_batch([request.image], top_k=request.top_k)[0])
+                    except Exception as e:
+                        request.future.set_exception(e)
+
+    @staticmethod
+    def _resolve(request: _Request, result: Dict):
+        if request.top_k < len(result['category']['top_k']):
+            result['category']['top_k'] = result['category']['top_k'][:request.top_k]
+        request.future.set_result(result)
+
+    def stats(self) -> Dict:
+        """批次大小分布與排隊延遲"""
+        with self._stats_lock:
+            sizes = dict(sorted(self._batch_sizes.items()))
+            waits = sorted(self._queue_wait_ms)
+            rejected = self._rejected
+        batches = sum(sizes.values())
+        return {
+            'queue_depth': self._queue.qsize(),
+            'batches': batches,
+            'batch_size_hist': sizes,
+            'batch_size_avg': round(sum(k * v for k, v in sizes.items()) / batches, 2) if batches else 0.0,
+            'queue_wait_ms_p50': round(waits[len(waits) // 2], 2) if waits else 0.0,
+            'queue_wait_ms_p95': round(waits[int(0.95 * (len(waits) - 1))], 2) if waits else 0.0,
+            'rejected': rejected,
+        }
@@ -0,0 +1,148 @@
+"""
+Model A 推論效能測試
+比較各種推論路徑的單張圖片延遲
+
+用法:
+    python -m model_a.benchmark --images <圖片資料夾> --runs 20
+    (未指定 --images 時使用隨機產生的測試圖片)
+"""
+
+import argparse
+import io
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+from PIL import Image
+
+try:
+    from .inference import FashionPredictor
+    from .batcher import MicroBatcher
+except ImportError:
+    from inference import FashionPredictor
+    from batcher import MicroBatcher
+
+
+def load_images(image_dir: str = None, count: int = 10, size: int = 800) -> List[bytes]:
+    """讀取測試圖片 (JPEG bytes)，未指定資料夾時產生隨機圖片"""
+    if image_dir:
+        paths = sorted(
+            p for p in Path(image_dir).rglob('*')
+            if p.suffix.lower() in ('.jpg', '.jpeg', '.png', '.webp')
+        )[:count]
+        return [p.read_bytes() for p in paths]
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def predict_via_tempfile(predictor: FashionPredictor, image_bytes: bytes) -> Dict:
+    """舊版 adapter 的做法: 解碼後寫入暫存檔再由路徑推論"""
+    image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+        image.save(tmp.name)
+        tmp_path = tmp.name
+    try:
+        return predictor.predict(tmp_path, top_k=3)
+    finally:
+        Path(tmp_path).unlink()
+
+
+def time_per_image(fn: Callable[[bytes], object], images: List[bytes], runs: int) -> List[float]:
+    """回傳每張圖片的延遲 (毫秒)"""
+    fn(images[0])  # 暖機
+    samples = []
+    for _ in range(runs):
+        for image_bytes in images:
+            start = time.perf_counter()
+            fn(image_bytes)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def time_batched(predictor: FashionPredictor, images: List[bytes], runs: int) -> List[float]:
+    """整批推論，回傳平均到每張圖片的延遲 (毫秒)"""
+    predictor.predict_batch(images[:1])  # 暖機
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predictor.predict_batch(images, top_k=3)
+        samples.append((time.perf_counter() - start) * 1000 / len(images))
+    return samples
+
+
+def time_microbatched(predictor: FashionPredictor, images: List[bytes], runs: int,
+                      concurrency: int) -> List[float]:
+    """多個執行緒同時送出單張請求，經 MicroBatcher 合併，回傳平均到每張圖片的延遲 (毫秒)"""
+    batcher = MicroBatcher(predictor)
+    batcher.submit(images[0]).result()  # 暖機
+    samples = []
+
+    def worker():
+        for image_bytes in images:
+            batcher.submit(image_bytes).result()
+
+    for _ in range(runs):
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        samples.append((time.perf_counter() - start) * 1000 / (len(images) * concurrency))
+    print(f"   batcher stats: {batcher.stats()}")
+    return samples
+
+
+def report(name: str, samples: List[float]):
+    ordered = sorted(samples)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    mean = statistics.mean(samples)
+    print(f"{name:20s} mean={mean:8.2f} ms  "
+          f"p50={statistics.median(samples):8.2f} ms  p95={p95:8.2f} ms  "
+          f"throughput={1000 / mean:7.1f} img/s")
+
+
+def benchmarks(predictor: FashionPredictor) -> Dict[str, Callable[[bytes], object]]:
+    """各推論路徑 (名稱 -> 單張圖片推論函式)"""
+    return {
+        'tempfile': lambda b: predict_via_tempfile(predictor, b),
+        'predict_bytes': lambda b: predictor.predict_bytes(b, top_k=3),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Model A 推論效能測試')
+    parser.add_argument('--images', default=None, help='測試圖片資料夾')
+    parser.add_argument('--count', type=int, default=10, help='圖片數量')
+    parser.add_argument('--runs', type=int, default=5, help='重複次數')
+    parser.add_argument('--checkpoint', default=None, help='模型檔路徑 (只測一個後端時使用)')
+    parser.add_argument('--backends', default='torch',
+                        help='要比較的推論後端，以逗號分隔 (torch,torchscript,onnxruntime)')
+    parser.add_argument('--concurrency', type=int, default=4, help='微批次測試的併發執行緒數')
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    images = load_images(args.images, args.count)
+    print(f"\n📊 {len(images)} 張圖片 x {args.runs} 次")
+
+    for backend in backends:
+        checkpoint = args.checkpoint if len(backends) == 1 else None
+        predictor = FashionPredictor(checkpoint, backend=backend)
+        print(f"\n===== backend: {backend} =====")
+
+        for name, fn in benchmarks(predictor).items():
+            report(name, time_per_image(fn, images, args.runs))
+        report(f'predict_batch({len(images)})', time_batched(predictor, images, args.runs))
+        report(f'microbatch(x{args.concurrency})',
+               time_microbatched(predictor, images, args.runs, args.concurrency))
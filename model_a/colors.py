@@ -0,0 +1,271 @@
+"""
+主色調提取與顏色命名
+- 取樣後將像素量化到 RGB 色格並統計直方圖，只對色格 (最多 4096 個) 做加權 K-Means，
+  不再對每個像素反覆計算距離
+- 初始中心以「最多像素的色格 + 加權最遠點」決定，不使用亂數，同一張圖片永遠得到相同結果
+- 邊框大多為同一顏色時視為背景並遮罩
+- 顏色命名在 CIELAB 空間以向量化方式找最近的調色盤顏色
+
+用法 (效能與穩定性測試):
+    python -m model_a.colors --images <圖片資料夾>
+"""
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+try:
+    from . import config
+except ImportError:
+    import config
+
+# 顏色名稱與代表色 (RGB)
+PALETTE = (
+    ("黑色", (0, 0, 0)),
+    ("白色", (255, 255, 255)),
+    ("灰色", (128, 128, 128)),
+    ("紅色", (255, 0, 0)),
+    ("橘色", (255, 165, 0)),
+    ("黃色", (255, 255, 0)),
+    ("綠色", (0, 128, 0)),
+    ("藍色", (0, 0, 255)),
+    ("紫色", (128, 0, 128)),
+    ("粉紅", (255, 192, 203)),
+    ("棕色", (165, 42, 42)),
+    ("米色", (245, 245, 220)),
+    ("卡其", (240, 230, 140)),
+    ("深藍", (0, 0, 139)),
+)
+PALETTE_NAMES = [name for name, _ in PALETTE]
+
+# D65 白點
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """sRGB (0-255) 轉 CIELAB，輸入形狀 [..., 3]"""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = (c @ _RGB_TO_XYZ.T) / _WHITE
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+PALETTE_LAB = rgb_to_lab(np.array([rgb for _, rgb in PALETTE]))
+
+
+def nearest_palette_index(rgb: np.ndarray) -> np.ndarray:
+    """對 [..., 3] 的 RGB 陣列一次找出 CIELAB 距離最近的調色盤索引"""
+    lab = rgb_to_lab(rgb)
+    dist = ((lab[..., None, :] - PALETTE_LAB) ** 2).sum(axis=-1)
+    return dist.argmin(axis=-1)
+
+
+def color_name(hex_code: str) -> str:
+    """Hex 色碼轉中文顏色名稱"""
+    h = hex_code.lstrip('#')
+    rgb = [int(h[i:i + 2], 16) for i in (0, 2, 4)]
+    return PALETTE_NAMES[int(nearest_palette_index(np.array(rgb)))]
+
+
+def _sample(pixels: np.ndarray, size: int) -> np.ndarray:
+    """以固定間隔取樣，讓最長邊不超過 size"""
+    step = max(1, int(np.ceil(max(pixels.shape[:2]) / size)))
+    return pixels[::step, ::step, :3]
+
+
+def _background_mask(image: np.ndarray) -> np.ndarray:
+    """
+    邊框像素多數接近同一顏色時，將與該顏色相近的像素視為背景
+
+    Returns:
+        前景遮罩 [H, W] (True 為保留)
+    """
+    h, w = image.shape[:2]
+    border = max(1, min(h, w) // 20)
+    edges = np.concatenate([
+        image[:border].reshape(-1, 3), image[-border:].reshape(-1, 3),
+        image[:, :border].reshape(-1, 3), image[:, -border:].reshape(-1, 3),
+    ])
+    background = rgb_to_lab(np.median(edges, axis=0))
+
+    threshold = config.COLOR_BACKGROUND_DELTA_E ** 2
+    edge_dist = ((rgb_to_lab(edges) - background) ** 2).sum(axis=-1)
+    if (edge_dist <= threshold).mean() < config.COLOR_BACKGROUND_MIN_BORDER:
+        return np.ones((h, w), dtype=bool)
+
+    foreground = ((rgb_to_lab(image) - background) ** 2).sum(axis=-1) > threshold
+    # 幾乎整張都是背景色 (例如純色衣物滿版拍攝) 時不遮罩
+    if foreground.mean() < 0.05:
+        return np.ones((h, w), dtype=bool)
+    return foreground
+
+
+def _weighted_kmeans(points: np.ndarray, weights: np.ndarray, k: int, max_iter: int = 20) -> np.ndarray:
+    """
+    對色格做加權 K-Means
+
+    Returns:
+        每個色格所屬的群索引
+    """
+    # 決定性初始化: 第一個中心為最多像素的色格，之後取「權重 x 與最近中心距離²」最大者
+    centers = [points[np.argmax(weights)]]
+    min_dist = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        idx = int(np.argmax(weights * min_dist))
+        if min_dist[idx] == 0:
+            break
+        centers.append(points[idx])
+        min_dist = np.minimum(min_dist, ((points - points[idx]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    labels = None
+    for _ in range(max_iter):
+        dist = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1)
+        new_labels = dist.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        totals = np.bincount(labels, weights=weights, minlength=len(centers))
+        for c in range(len(centers)):
+            if totals[c] > 0:
+                centers[c] = (points[labels == c] * weights[labels == c, None]).sum(axis=0) / totals[c]
+    return labels
+
+
+def extract_dominant_colors(pixels: np.ndarray, n_colors: int = config.NUM_DOMINANT_COLORS) -> List[Dict]:
+    """
+    提取主色調
+
+    Args:
+        pixels: RGB ndarray [H, W, 3] (uint8)
+        n_colors: 提取顏色數量
+
+    Returns:
+        list: [{rgb, hex, percentage}, ...] 依前景像素比例由高到低排序
+    """
+    image = _sample(np.asarray(pixels, dtype=np.uint8), config.COLOR_SAMPLE_SIZE)
+    if image.size == 0:
+        return []
+    flat = image[_background_mask(image)].astype(np.int64)
+
+    # 量化到色格並統計每格的像素數與 RGB 總和
+    shift = 8 - config.COLOR_QUANT_BITS
+    q = flat >> shift
+    bins = (q[:, 0] << (2 * config.COLOR_QUANT_BITS)) | (q[:, 1] << config.COLOR_QUANT_BITS) | q[:, 2]
+    used, inverse = np.unique(bins, return_inverse=True)
+    counts = np.bincount(inverse).astype(np.float64)
+    sums = np.stack([np.bincount(inverse, weights=flat[:, ch]) for ch in range(3)], axis=1)
+    means = sums / counts[:, None]
+
+    labels = _weighted_kmeans(rgb_to_lab(means), counts, min(n_colors, len(used)))
+
+    cluster_counts = np.bincount(labels, weights=counts)
+    cluster_sums = np.stack([np.bincount(labels, weights=sums[:, ch]) for ch in range(3)], axis=1)
+    total = cluster_counts.sum()
+
+    dominant_colors = []
+    # 比例相同時以群索引排序，確保順序固定
+    for idx in np.lexsort((np.arange(len(cluster_counts)), -cluster_counts)):
+        if cluster_counts[idx] == 0:
+            continue
+        rgb = np.rint(cluster_sums[idx] / cluster_counts[idx]).astype(int).tolist()
+        dominant_colors.append({
+            'rgb': rgb,
+            'hex': '#{:02x}{:02x}{:02x}'.format(*rgb),
+            'percentage': float(cluster_counts[idx] / total),
+        })
+    return dominant_colors
+
+
+def _opencv_kmeans(pixels: np.ndarray, n_colors: int = 3) -> List[str]:
+    """舊版做法 (150x150 + cv2.kmeans 10 次隨機初始化)，僅供比較"""
+    import cv2
+    image = cv2.resize(pixels, (150, 150)).reshape(-1, 3).astype(np.float32)
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+    _, labels, centers = cv2.kmeans(image, n_colors, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
+    order = np.argsort(np.bincount(labels.flatten()))[::-1]
+    return ['#{:02x}{:02x}{:02x}'.format(*centers[i].astype(int)) for i in order]
+
+
+def _load_images(image_dir: str, count: int) -> List[np.ndarray]:
+    """讀取測試圖片，未指定資料夾時產生「白底 + 色塊」的合成圖片"""
+    if image_dir:
+        from pathlib import Path
+        from PIL import Image
+        paths = sorted(
+            p for p in Path(image_dir).rglob('*')
+            if p.suffix.lower() in ('.jpg', '.jpeg', '.png', '.webp')
+        )[:count]
+        images = []
+        for path in paths:
+            with Image.open(path) as image:
+                images.append(np.asarray(image.convert('RGB')))
+        return images
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        image = np.full((800, 600, 3), 250, dtype=np.uint8)
+        for color in rng.integers(0, 256, (2, 3)):
+            y, x = rng.integers(100, 500, 2)
+            image[y:y + 300, x // 2:x // 2 + 250] = color
+        noise = rng.integers(-8, 9, image.shape)
+        images.append(np.clip(image.astype(np.int64) + noise, 0, 255).astype(np.uint8))
+    return images
+
+
+def _time_ms(fn, images: Sequence[np.ndarray], runs: int) -> float:
+    import time
+    fn(images[0])
+    start = time.perf_counter()
+    for _ in range(runs):
+        for image in images:
+            fn(image)
+    return (time.perf_counter() - start) * 1000 / (runs * len(images))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='主色調提取效能與穩定性測試')
+    parser.add_argument('--images', default=None, help='測試圖片資料夾')
+    parser.add_argument('--count', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    images = _load_images(args.images, args.count)
+    print(f"\n📊 {len(images)} 張圖片 x {args.runs} 次")
+
+    # 穩定性: 同一張圖片重複提取必須得到完全相同的結果
+    unstable = sum(
+        1 for image in images
+        if any(extract_dominant_colors(image) != extract_dominant_colors(image) for _ in range(args.runs))
+    )
+    print(f"{'直方圖 + 加權 K-Means':24s} {_time_ms(extract_dominant_colors, images, args.runs):8.2f} ms/張  "
+          f"結果不一致 {unstable}/{len(images)} 張")
+
+    try:
+        legacy_unstable = sum(
+            1 for image in images
+            if len({tuple(_opencv_kmeans(image)) for _ in range(args.runs)}) > 1
+        )
+        print(f"{'OpenCV K-Means (舊)':24s} {_time_ms(_opencv_kmeans, images, args.runs):8.2f} ms/張  "
+              f"結果不一致 {legacy_unstable}/{len(images)} 張")
+    except ImportError:
+        print("(未安裝 opencv，略過舊版比較)")
+
+    names = np.array([rgb for _, rgb in PALETTE])
+    assert [PALETTE_NAMES[i] for i in nearest_palette_index(names)] == PALETTE_NAMES
+    if unstable:
+        raise SystemExit("❌ 主色調提取結果不穩定")
+    print("\n✅ 穩定性檢查通過")
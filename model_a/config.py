@@ -18,9 +18,11 @@ CHECKPOINT_DIR = OUTPUT_DIR / "checkpoints"
 LOG_DIR = OUTPUT_DIR / "logs"
 RESULT_DIR = OUTPUT_DIR / "results"
 
-# 創建輸出目錄
-for dir_path in [OUTPUT_DIR, CHECKPOINT_DIR, LOG_DIR, RESULT_DIR]:
-    dir_path.mkdir(parents=True, exist_ok=True)
+
+def ensure_output_dirs():
+    """創建輸出目錄 (由需要寫檔的腳本呼叫，import 時不建立)"""
+    for dir_path in [OUTPUT_DIR, CHECKPOINT_DIR, LOG_DIR, RESULT_DIR]:
+        dir_path.mkdir(parents=True, exist_ok=True)
 
 # ==================== 資料集設定 ====================
 # 類別數量 (50 個服飾類別)
@@ -160,9 +162,40 @@ ATTRIBUTE_THRESHOLD = 0.5
 # 是否使用 TTA (Test Time Augmentation)
 USE_TTA = False
 
+# 推論後端 ('torch', 'torchscript', 'onnxruntime', 'int8')
+INFERENCE_BACKEND = os.getenv('MODEL_A_BACKEND', 'torch')
+
+# 含非張量物件的舊檢查點是否允許以 pickle (weights_only=False) 載入，僅限本地受信任的檔案
+# (建議改以 python -m model_a.export --convert-checkpoint 轉成純權重檔)
+ALLOW_PICKLE_CHECKPOINT = os.getenv('MODEL_A_ALLOW_PICKLE', '0') in ('1', 'true', 'True')
+
+# 各後端預設的模型檔 (torchscript / onnxruntime 由 export.py 產生，int8 由 quantize.py 產生)
+MODEL_PATHS = {
+    'torch': CHECKPOINT_DIR / 'best.pth',
+    'torchscript': CHECKPOINT_DIR / 'best.torchscript.pt',
+    'onnxruntime': CHECKPOINT_DIR / 'best.onnx',
+    'int8': CHECKPOINT_DIR / 'best.int8.torchscript.pt',
+}
+
+# ==================== 量化設定 ====================
+# 校正資料 (訓練集前 N 張) 與評估資料 (驗證集前 N 張)
+QUANT_CALIBRATION_SPLIT = 'train'
+QUANT_CALIBRATION_SIZE = 256
+QUANT_EVAL_SPLIT = 'val'
+QUANT_EVAL_SIZE = 1000
+# Anno_fine 的類別編號從 1 開始
+CATEGORY_LABEL_OFFSET = 1
+
 # ==================== 顏色提取設定 ====================
-# 使用 K-Means 提取主色調
+# 以色彩直方圖量化後做加權 K-Means (CIELAB) 提取主色調
 NUM_DOMINANT_COLORS = 3
+# 取樣後的最長邊 (像素)
+COLOR_SAMPLE_SIZE = 96
+# 每個 RGB 通道量化的位元數 (4 → 16^3 個色格)
+COLOR_QUANT_BITS = 4
+# 邊框像素與背景色的 CIELAB 距離門檻，以及邊框需有多少比例為同一色才視為背景
+COLOR_BACKGROUND_DELTA_E = 12.0
+COLOR_BACKGROUND_MIN_BORDER = 0.6
 
 # ==================== 風格標籤映射 ====================
 # 根據屬性組合推斷風格標籤
@@ -174,10 +207,17 @@ STYLE_MAPPING = {
     'vintage': ['floral', 'pleated'],
 }
 
-print(f"✅ 配置載入完成")
-print(f"📂 資料目錄: {DATA_DIR}")
-print(f"📂 輸出目錄: {OUTPUT_DIR}")
-print(f"🎯 類別數量: {NUM_CATEGORIES}")
-print(f"🎯 屬性數量: {NUM_ATTRIBUTES}")
-print(f"🖼️  圖片尺寸: {IMG_SIZE}x{IMG_SIZE}")
-print(f"🔧 Backbone: {BACKBONE}")
+
+def print_config():
+    """打印主要配置"""
+    print(f"✅ 配置載入完成")
+    print(f"📂 資料目錄: {DATA_DIR}")
+    print(f"📂 輸出目錄: {OUTPUT_DIR}")
+    print(f"🎯 類別數量: {NUM_CATEGORIES}")
+    print(f"🎯 屬性數量: {NUM_ATTRIBUTES}")
+    print(f"🖼️  圖片尺寸: {IMG_SIZE}x{IMG_SIZE}")
+    print(f"🔧 Backbone: {BACKBONE}")
+
+
+if __name__ == '__main__':
+    print_config()
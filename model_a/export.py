@@ -0,0 +1,156 @@
+"""
+模型匯出腳本
+將訓練好的 best.pth 匯出為 TorchScript 與 ONNX，供 CPU 推論使用
+
+用法:
+    python -m model_a.export                       # 匯出兩種格式並驗證輸出一致
+    python -m model_a.export --format onnx --checkpoint path/to/best.pth
+    python -m model_a.export --convert-checkpoint  # 舊檢查點轉成純權重檔 (可用 weights_only 載入)
+"""
+
+import argparse
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+try:
+    from . import config
+    from .model import FashionMultiTaskModel
+    from .inference import FashionPredictor, load_checkpoint_state_dict
+except ImportError:
+    import config
+    from model import FashionMultiTaskModel
+    from inference import FashionPredictor, load_checkpoint_state_dict
+
+# 匯出模型的輸入輸出名稱 (FashionPredictor.run_model 依此讀取)
+INPUT_NAME = 'image'
+OUTPUT_NAMES = ['category_logits', 'attribute_logits', 'embedding']
+
+ONNX_OPSET = 17
+
+
+class ExportWrapper(nn.Module):
+    """將 dict 輸出轉為固定順序的 tuple，方便 trace 與 ONNX 匯出"""
+
+    def __init__(self, model: FashionMultiTaskModel):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        output = self.model(x, return_embedding=True)
+        return output['category_logits'], output['attribute_logits'], output['embedding']
+
+
+def load_eval_model(checkpoint_path: Path) -> FashionMultiTaskModel:
+    """載入檢查點並切換為 eval 模式 (BatchNorm 使用統計值、Dropout 關閉)"""
+    model = FashionMultiTaskModel(pretrained=False)
+    model.load_state_dict(load_checkpoint_state_dict(checkpoint_path))
+    return model.eval()
+
+
+def convert_checkpoint(checkpoint_path: Path) -> Path:
+    """
+    將含非張量物件 (optimizer 狀態、numpy 數值等) 的舊檢查點轉成只含 model_state_dict 的檔案，
+    之後即可以 mmap + weights_only 載入。原檔保留為 <檔名>.orig
+    (轉換時會以 pickle 載入原檔，僅限本地受信任的檔案)
+    """
+    state_dict = load_checkpoint_state_dict(checkpoint_path, allow_pickle=True)
+    backup_path = checkpoint_path.with_name(checkpoint_path.name + '.orig')
+    checkpoint_path.replace(backup_path)
+    torch.save({'model_state_dict': state_dict}, str(checkpoint_path))
+    print(f"✅ 檢查點已轉換: {checkpoint_path} (原檔: {backup_path})")
+    return checkpoint_path
+
+
+def example_input(batch_size: int = 2) -> torch.Tensor:
+    return torch.randn(batch_size, 3, config.IMG_SIZE, config.IMG_SIZE)
+
+
+def export_torchscript(model: FashionMultiTaskModel, output_path: Path) -> Path:
+    """
+    trace 後 freeze，freeze 會把權重內嵌為常數並將 Conv+BatchNorm 摺疊，
+    optimize_for_inference 再移除推論不需要的運算 (如 Dropout)
+    """
+    wrapper = ExportWrapper(model).eval()
+    with torch.inference_mode():
+        traced = torch.jit.trace(wrapper, example_input())
+    frozen = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+    frozen.save(str(output_path))
+    print(f"✅ TorchScript 已匯出: {output_path}")
+    return output_path
+
+
+def export_onnx(model: FashionMultiTaskModel, output_path: Path) -> Path:
+    """匯出 ONNX (eval 模式下匯出，BatchNorm 以常數摺疊，Dropout 不會出現在圖中)"""
+    wrapper = ExportWrapper(model).eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            example_input(),
+            str(output_path),
+            input_names=[INPUT_NAME],
+            output_names=OUTPUT_NAMES,
+            dynamic_axes={name: {0: 'batch'} for name in [INPUT_NAME] + OUTPUT_NAMES},
+            opset_version=ONNX_OPSET,
+            do_constant_folding=True,
+        )
+    print(f"✅ ONNX 已匯出: {output_path}")
+    return output_path
+
+
+def verify_parity(checkpoint_path: Path, exported: Dict[str, Path],
+                  batch_size: int = 4, atol: float = 1e-3) -> bool:
+    """
+    比對各匯出後端與 eager PyTorch 的輸出
+
+    Returns:
+        所有後端的機率與 embedding 最大誤差皆在 atol 內
+    """
+    torch.manual_seed(config.RANDOM_SEED)
+    batch = example_input(batch_size)
+    reference = FashionPredictor(str(checkpoint_path), backend='torch').run_model(batch)
+
+    ok = True
+    for backend, path in exported.items():
+        pred = FashionPredictor(str(path), backend=backend).run_model(batch)
+        print(f"\n🔍 {backend} vs torch")
+        for key in ('category_probs', 'attribute_probs', 'embedding'):
+            diff = float(np.max(np.abs(pred[key].numpy() - reference[key].numpy())))
+            status = '✓' if diff <= atol else '✗'
+            ok = ok and diff <= atol
+            print(f"  {status} {key:16s} max |diff| = {diff:.2e}")
+        same_top1 = bool(torch.equal(pred['category_pred'], reference['category_pred']))
+        ok = ok and same_top1
+        print(f"  {'✓' if same_top1 else '✗'} top-1 類別一致")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='匯出 Model A 推論模型')
+    parser.add_argument('--checkpoint', default=str(config.MODEL_PATHS['torch']), help='best.pth 路徑')
+    parser.add_argument('--format', choices=['all', 'torchscript', 'onnx'], default='all')
+    parser.add_argument('--skip-verify', action='store_true', help='略過輸出一致性檢查')
+    parser.add_argument('--convert-checkpoint', action='store_true',
+                        help='只將舊檢查點轉成純權重檔 (可用 weights_only 載入)，不匯出')
+    args = parser.parse_args()
+
+    checkpoint_path = Path(args.checkpoint)
+    if args.convert_checkpoint:
+        convert_checkpoint(checkpoint_path)
+        raise SystemExit(0)
+    model = load_eval_model(checkpoint_path)
+    config.ensure_output_dirs()
+
+    exported = {}
+    if args.format in ('all', 'torchscript'):
+        exported['torchscript'] = export_torchscript(model, config.MODEL_PATHS['torchscript'])
+    if args.format in ('all', 'onnx'):
+        exported['onnxruntime'] = export_onnx(model, config.MODEL_PATHS['onnxruntime'])
+
+    if not args.skip_verify:
+        if not verify_parity(checkpoint_path, exported):
+            raise SystemExit("❌ 匯出模型與原始模型輸出不一致")
+        print("\n✅ 輸出一致性檢查通過")
@@ -3,47 +3,113 @@
 用於測試訓練好的模型
 """
 
+import io
+import pickle
 import torch
 import torchvision.transforms as transforms
 from PIL import Image
 import numpy as np
 from pathlib import Path
-from typing import Dict, List
-import cv2
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 try:
-    from . import config
+    from . import config, colors
     from .model import FashionMultiTaskModel
 except ImportError:
     import config
+    import colors
     from model import FashionMultiTaskModel
 
 
+def load_checkpoint_state_dict(checkpoint_path, allow_pickle: Optional[bool] = None) -> Dict[str, torch.Tensor]:
+    """
+    讀取檢查點中的 model_state_dict
+    以 mmap + weights_only 載入: 權重直接對應到檔案分頁，不需整份讀入記憶體，
+    fork 出的多個 worker 可共用同一份唯讀分頁；舊版 torch 不支援 mmap 時改用一般的 weights_only 載入
+
+    Args:
+        allow_pickle: 含非張量物件的舊檢查點是否允許以 weights_only=False 載入 (會執行檔案中的 pickle，
+                      僅限本地受信任的檔案；None 則使用 config.ALLOW_PICKLE_CHECKPOINT)
+    """
+    if allow_pickle is None:
+        allow_pickle = config.ALLOW_PICKLE_CHECKPOINT
+    try:
+        try:
+            checkpoint = torch.load(checkpoint_path, map_location='cpu', mmap=True, weights_only=True)
+        except TypeError:
+            # 舊版 torch.load 沒有 mmap 參數
+            checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=True)
+    except pickle.UnpicklingError as e:
+        if not allow_pickle:
+            raise RuntimeError(
+                f"檢查點 {checkpoint_path} 含有非張量物件，無法以 weights_only 載入。"
+                "請執行 python -m model_a.export --convert-checkpoint 轉成純權重檔，"
+                "或確認檔案可信任後設定 MODEL_A_ALLOW_PICKLE=1"
+            ) from e
+        print(f"⚠️  檢查點含有非張量物件，以 weights_only=False 載入: {checkpoint_path}")
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=False)
+    return checkpoint['model_state_dict'] if 'model_state_dict' in checkpoint else checkpoint
+
+
 class FashionPredictor:
     """服飾預測器"""
     
-    def __init__(self, checkpoint_path: str = None):
+    BACKENDS = ('torch', 'torchscript', 'onnxruntime', 'int8')
+    
+    def __init__(self, checkpoint_path: str = None, backend: str = None):
         """
         Args:
-            checkpoint_path: 模型檢查點路徑 (None 則使用 best.pth)
+            checkpoint_path: 模型檔路徑 (None 則使用該後端的預設檔案，見 config.MODEL_PATHS)
+            backend: 推論後端 'torch' | 'torchscript' | 'onnxruntime' | 'int8'
+                     (None 則使用 config.INFERENCE_BACKEND)
         """
+        backend = backend or config.INFERENCE_BACKEND
+        if backend not in self.BACKENDS:
+            raise ValueError(f"不支援的推論後端: {backend}")
+        self.backend = backend
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        
-        # 載入模型
-        self.model = FashionMultiTaskModel().to(self.device)
+        self.model = None
+        self.session = None
         
         if checkpoint_path is None:
-            checkpoint_path = config.CHECKPOINT_DIR / 'best.pth'
-        
-        if Path(checkpoint_path).exists():
-            checkpoint = torch.load(checkpoint_path, map_location=self.device, weights_only=False)
-            self.model.load_state_dict(checkpoint['model_state_dict'])
-            print(f"✅ 載入模型: {checkpoint_path}")
+            checkpoint_path = config.MODEL_PATHS[backend]
+        
+        if backend == 'torchscript':
+            self.model = torch.jit.load(str(checkpoint_path), map_location=self.device)
+            print(f"✅ 載入 TorchScript 模型: {checkpoint_path}")
+        elif backend == 'int8':
+            # 量化模型只能在 CPU 執行
+            self.device = torch.device('cpu')
+            self.model = torch.jit.load(str(checkpoint_path), map_location=self.device)
+            print(f"✅ 載入 INT8 量化模型: {checkpoint_path}")
+        elif backend == 'onnxruntime':
+            import onnxruntime as ort
+            self.session = ort.InferenceSession(str(checkpoint_path), providers=['CPUExecutionProvider'])
+            self.device = torch.device('cpu')
+            print(f"✅ 載入 ONNX 模型: {checkpoint_path}")
         else:
-            print(f"⚠️  找不到檢查點: {checkpoint_path}")
-            print("使用未訓練的模型")
-        
-        self.model.eval()
+            if Path(checkpoint_path).exists():
+                # 權重全部來自檢查點，不需下載或載入 ImageNet 預訓練權重
+                self.model = FashionMultiTaskModel(pretrained=False)
+                state_dict = load_checkpoint_state_dict(checkpoint_path)
+                if self.device.type == 'cpu':
+                    # assign=True 直接使用 mmap 的張量當作參數，不複製到新配置的記憶體
+                    try:
+                        self.model.load_state_dict(state_dict, assign=True)
+                    except TypeError:
+                        self.model.load_state_dict(state_dict)
+                else:
+                    self.model.load_state_dict(state_dict)
+                self.model.to(self.device)
+                print(f"✅ 載入模型: {checkpoint_path}")
+            else:
+                # 載入模型
+                self.model = FashionMultiTaskModel().to(self.device)
+                print(f"⚠️  找不到檢查點: {checkpoint_path}")
+                print("使用未訓練的模型")
+        
+        if self.model is not None:
+            self.model.eval()
         
         # 圖片轉換
         self.transform = transforms.Compose([
@@ -63,19 +129,126 @@ class FashionPredictor:
         Returns:
             dict: 預測結果
         """
-        # 載入圖片
-        image = Image.open(image_path).convert('RGB')
-        original_size = image.size
+        with Image.open(image_path) as image:
+            return self.predict_image(image, top_k=top_k, image_path=str(image_path))
+    
+    def predict_bytes(self, image_bytes: bytes, top_k: int = 3) -> Dict:
+        """預測記憶體中的圖片 (不經過暫存檔)"""
+        return self.predict_image(image_bytes, top_k=top_k)
+    
+    def predict_image(
+        self,
+        image: Union[bytes, Image.Image, np.ndarray],
+        top_k: int = 3,
+        image_path: Optional[str] = None
+    ) -> Dict:
+        """
+        預測已載入的圖片
+        圖片只解碼一次，模型輸入與主色調提取共用同一份像素
+        
+        Args:
+            image: 圖片 bytes、PIL Image 或 RGB ndarray [H, W, 3] (uint8)
+            top_k: 返回 Top-K 類別
+            image_path: 圖片路徑 (僅用於結果記錄)
+        
+        Returns:
+            dict: 預測結果
+        """
+        return self._predict_decoded([self._decode(image)], top_k, [image_path])[0]
+    
+    def predict_batch(
+        self,
+        images: Sequence[Union[bytes, Image.Image, np.ndarray]],
+        top_k: int = 3
+    ) -> List[Dict]:
+        """
+        批次預測多張圖片 (堆疊成一個 batch，只做一次前向傳播)
         
-        # 轉換
-        image_tensor = self.transform(image).unsqueeze(0).to(self.device)
+        Args:
+            images: 圖片 bytes、PIL Image 或 RGB ndarray 的列表
+            top_k: 返回 Top-K 類別
         
-        # 預測
-        with torch.no_grad():
-            pred = self.model.predict(image_tensor, threshold=config.ATTRIBUTE_THRESHOLD)
+        Returns:
+            list: 與輸入順序相同的預測結果
+        """
+        if not images:
+            return []
+        return self._predict_decoded([self._decode(image) for image in images], top_k)
+    
+    @staticmethod
+    def _decode(image: Union[bytes, Image.Image, np.ndarray]) -> Tuple[Image.Image, np.ndarray]:
+        """將輸入轉為 (RGB PIL Image, RGB ndarray)，兩者共用同一份解碼結果"""
+        if isinstance(image, (bytes, bytearray)):
+            with Image.open(io.BytesIO(image)) as opened:
+                image = opened.convert('RGB')
+        elif isinstance(image, np.ndarray):
+            pixels = np.ascontiguousarray(image, dtype=np.uint8)
+            return Image.fromarray(pixels), pixels
+        else:
+            image = image.convert('RGB')
+        return image, np.asarray(image)
+    
+    def _predict_decoded(
+        self,
+        decoded: List[Tuple[Image.Image, np.ndarray]],
+        top_k: int,
+        image_paths: Optional[List[Optional[str]]] = None
+    ) -> List[Dict]:
+        """對已解碼的圖片執行一次批次前向傳播，再依圖片拆分輸出"""
+        batch = torch.stack([self.transform(image) for image, _ in decoded]).to(self.device)
+        
+        pred = self.run_model(batch)
+        
+        results = []
+        for i, (image, pixels) in enumerate(decoded):
+            # 提取主色調 (直接使用已解碼的像素)
+            dominant_colors = self.extract_dominant_colors(pixels)
+            image_path = image_paths[i] if image_paths else None
+            results.append(self._build_result(pred, i, top_k, dominant_colors, image.size, image_path))
+        return results
+    
+    def run_model(self, batch: torch.Tensor) -> Dict[str, torch.Tensor]:
+        """
+        以目前的後端執行前向傳播，各後端輸出格式一致
         
+        Returns:
+            dict: category_probs / category_pred / attribute_probs / attribute_pred / embedding
+        """
+        with torch.inference_mode():
+            if self.backend == 'onnxruntime':
+                category_logits, attribute_logits, embedding = (
+                    torch.from_numpy(out) for out in self.session.run(None, {'image': batch.cpu().numpy()})
+                )
+            elif self.backend in ('torchscript', 'int8'):
+                category_logits, attribute_logits, embedding = self.model(batch)
+            else:
+                output = self.model(batch, return_embedding=True)
+                category_logits = output['category_logits']
+                attribute_logits = output['attribute_logits']
+                embedding = output['embedding']
+            
+            category_probs = torch.softmax(category_logits, dim=1)
+            attribute_probs = torch.sigmoid(attribute_logits)
+            return {
+                'category_probs': category_probs,
+                'category_pred': torch.argmax(category_probs, dim=1),
+                'attribute_probs': attribute_probs,
+                'attribute_pred': (attribute_probs > config.ATTRIBUTE_THRESHOLD).float(),
+                'embedding': embedding
+            }
+    
+    def _build_result(
+        self,
+        pred: Dict[str, torch.Tensor],
+        index: int,
+        top_k: int,
+        dominant_colors: List[Dict],
+        original_size,
+        image_path: Optional[str] = None
+    ) -> Dict:
+        """將模型輸出中第 index 張圖片的結果整理為 dict"""
         # 類別預測
-        category_probs = pred['category_probs'][0].cpu().numpy()
+        category_probs = pred['category_probs'][index].cpu().numpy()
         top_k_indices = np.argsort(category_probs)[-top_k:][::-1]
         
         top_k_categories = []
@@ -87,8 +260,8 @@ class FashionPredictor:
             })
         
         # 屬性預測
-        attribute_probs = pred['attribute_probs'][0].cpu().numpy()
-        attribute_pred = pred['attribute_pred'][0].cpu().numpy()
+        attribute_probs = pred['attribute_probs'][index].cpu().numpy()
+        attribute_pred = pred['attribute_pred'][index].cpu().numpy()
         
         active_attributes = []
         for i, is_active in enumerate(attribute_pred):
@@ -100,16 +273,13 @@ class FashionPredictor:
                 })
         
         # Embedding
-        embedding = pred['embedding'][0].cpu().numpy()
-        
-        # 提取主色調
-        dominant_colors = self.extract_dominant_colors(image_path)
+        embedding = pred['embedding'][index].cpu().numpy()
         
         # 推斷風格標籤
         style_tags = self.infer_style_tags(active_attributes)
         
         result = {
-            'image_path': str(image_path),
+            'image_path': str(image_path) if image_path else None,
             'image_size': original_size,
             'category': {
                 'top_1': top_k_categories[0],
@@ -124,82 +294,27 @@ class FashionPredictor:
         
         return result
     
-    def extract_dominant_colors(self, image_path: str, n_colors: int = 3) -> List[Dict]:
+    def extract_dominant_colors(self, image: Union[str, Path, np.ndarray],
+                                n_colors: int = config.NUM_DOMINANT_COLORS) -> List[Dict]:
         """
-        提取主色調 (使用 K-Means)
+        提取主色調 (色彩直方圖 + 加權 K-Means，結果固定不隨機，見 colors.py)
         
         Args:
-            image_path: 圖片路徑
+            image: 圖片路徑，或已解碼的 RGB ndarray [H, W, 3]
             n_colors: 提取顏色數量
         
         Returns:
             list: [{rgb, hex, percentage}, ...]
         """
-        # 讀取圖片 (支援中文路徑)
-        # cv2.imread 不支援中文路徑, 改用 imdecode
-        img_array = np.fromfile(str(image_path), dtype=np.uint8)
-        image = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            print(f"❌ 無法讀取圖片: {image_path}")
-            return []
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # 調整大小以加速
-        image = cv2.resize(image, (150, 150))
-        
-        # 重塑為像素列表 (float32)
-        pixels = image.reshape(-1, 3).astype(np.float32)
-        
-        # 使用 OpenCV 的 K-Means
-        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
-        flags = cv2.KMEANS_RANDOM_CENTERS
-        _, labels, centers = cv2.kmeans(pixels, n_colors, None, criteria, 10, flags)
-        
-        # 獲取顏色 (轉回 uint8)
-        colors = centers.astype(int)
-        labels = labels.flatten()
-        
-        # 計算每個顏色的比例
-        # labels 是 [0, 1, 2, 0, ...]
-        counts = np.bincount(labels)
-        percentages = counts / len(labels)
-        
-        # 按比例排序
-        sorted_indices = np.argsort(percentages)[::-1]
-        
-        dominant_colors = []
-        for idx in sorted_indices:
-            rgb = colors[idx].tolist()
-            hex_color = '#{:02x}{:02x}{:02x}'.format(*rgb)
-            
-            # 簡單的背景過濾: 如果顏色過於接近純白 (sum > 700) 或純黑 (sum < 30) 且佔比 > 30%
-            # 視為背景剔除 (除非只剩這個顏色)
-            color_sum = sum(rgb)
-            if (color_sum > 700 or color_sum < 30) and percentages[idx] > 0.3:
-                if len(sorted_indices) > 1 and len(dominant_colors) == 0:
-                    continue  # 跳過背景色
-            
-            dominant_colors.append({
-                'rgb': rgb,
-                'hex': hex_color,
-                'percentage': float(percentages[idx])
-            })
-            
-            if len(dominant_colors) >= n_colors:
-                break
-        
-        # 萬一全部都被過濾光了(極端情況)，退回到原始的第一名
-        if not dominant_colors and len(sorted_indices) > 0:
-            idx = sorted_indices[0]
-            rgb = colors[idx].tolist()
-            return [{
-                'rgb': rgb,
-                'hex': '#{:02x}{:02x}{:02x}'.format(*rgb),
-                'percentage': float(percentages[idx])
-            }]
-        
-        return dominant_colors
+        if not isinstance(image, np.ndarray):
+            try:
+                with Image.open(image) as opened:
+                    image = np.asarray(opened.convert('RGB'))
+            except Exception:
+                print(f"❌ 無法讀取圖片: {image}")
+                return []
+        
+        return colors.extract_dominant_colors(image, n_colors)
     
     def infer_style_tags(self, active_attributes: List[Dict]) -> List[str]:
         """
@@ -285,6 +400,7 @@ if __name__ == '__main__':
     
     # 保存結果
     import json
+    config.ensure_output_dirs()
     output_path = config.RESULT_DIR / 'prediction_result.json'
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(result, f, indent=2, ensure_ascii=False)
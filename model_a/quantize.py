@@ -0,0 +1,218 @@
+"""
+INT8 量化腳本
+- dynamic: 只量化 Linear (embedding 層與兩個分類 head)，不需校正資料
+- static:  以 FX 對 backbone 做靜態 post-training quantization (需校正資料)，
+           Linear head 仍使用動態量化
+
+產生的 TorchScript 檔可由 FashionPredictor(backend='int8') 載入
+
+用法:
+    python -m model_a.quantize --mode static
+    python -m model_a.quantize --mode dynamic --skip-eval
+"""
+
+import argparse
+import copy
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+from torch.ao.quantization import default_dynamic_qconfig, get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+from torch.nn.utils.fusion import fuse_linear_bn_eval
+
+try:
+    from . import config
+    from .export import ExportWrapper, example_input, load_eval_model
+    from .inference import FashionPredictor
+except ImportError:
+    import config
+    from export import ExportWrapper, example_input, load_eval_model
+    from inference import FashionPredictor
+
+# Linear head 所在的子模組 (static 模式下改用動態量化)
+HEAD_MODULES = ('model.embedding_layer', 'model.category_head', 'model.attribute_head')
+
+
+# ==================== 資料 ====================
+
+def load_split(split: str, limit: int) -> List[Tuple[Path, int, np.ndarray]]:
+    """
+    讀取 Anno_fine 的資料切分
+
+    Returns:
+        [(圖片路徑, 類別索引, 屬性 0/1 向量), ...]
+    """
+    def read_lines(name: str) -> List[str]:
+        with open(config.ANNO_DIR / name, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()][:limit]
+
+    paths = read_lines(f'{split}.txt')
+    categories = read_lines(f'{split}_cate.txt')
+    attributes = read_lines(f'{split}_attr.txt')
+    return [
+        (config.IMG_DIR / path, int(cate) - config.CATEGORY_LABEL_OFFSET,
+         np.array([int(v) for v in attr.split()], dtype=np.int64))
+        for path, cate, attr in zip(paths, categories, attributes)
+    ]
+
+
+def iter_batches(predictor: FashionPredictor, samples, batch_size: int = 32):
+    """以 predictor 的前處理產生 (圖片 tensor, 類別, 屬性) 批次"""
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        images = []
+        for path, _, _ in chunk:
+            with Image.open(path) as image:
+                images.append(predictor.transform(image.convert('RGB')))
+        yield (
+            torch.stack(images),
+            np.array([c for _, c, _ in chunk]),
+            np.stack([a for _, _, a in chunk]),
+        )
+
+
+# ==================== 量化 ====================
+
+def fold_head_batchnorm(model: nn.Module) -> nn.Module:
+    """將 head 中 Linear 後面的 BatchNorm1d 摺疊進 Linear (eval 模式下數學上等價)"""
+    for head in (model.embedding_layer, model.category_head, model.attribute_head):
+        for i in range(len(head) - 1):
+            if isinstance(head[i], nn.Linear) and isinstance(head[i + 1], nn.BatchNorm1d):
+                head[i] = fuse_linear_bn_eval(head[i], head[i + 1])
+                head[i + 1] = nn.Identity()
+    return model
+
+
+def select_engine() -> str:
+    engines = torch.backends.quantized.supported_engines
+    engine = 'x86' if 'x86' in engines else 'fbgemm'
+    torch.backends.quantized.engine = engine
+    return engine
+
+
+def quantize_dynamic_heads(model: nn.Module) -> nn.Module:
+    """動態量化: 權重 INT8，激活值於執行時量化，只作用在 Linear"""
+    wrapper = ExportWrapper(fold_head_batchnorm(copy.deepcopy(model))).eval()
+    return quantize_dynamic(wrapper, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(model: nn.Module, calibration: List[Tuple[Path, int, np.ndarray]],
+                    predictor: FashionPredictor) -> nn.Module:
+    """FX 靜態量化 backbone (Conv/BN/ReLU 融合並以校正資料估計激活值範圍)"""
+    engine = select_engine()
+    wrapper = ExportWrapper(fold_head_batchnorm(copy.deepcopy(model))).eval()
+
+    qconfig_mapping = get_default_qconfig_mapping(engine)
+    for name in HEAD_MODULES:
+        qconfig_mapping = qconfig_mapping.set_module_name(name, default_dynamic_qconfig)
+
+    prepared = prepare_fx(wrapper, qconfig_mapping, example_inputs=(example_input(1),))
+    print(f"🔧 校正中 ({len(calibration)} 張, engine={engine})...")
+    with torch.inference_mode():
+        for images, _, _ in iter_batches(predictor, calibration):
+            prepared(images)
+    return convert_fx(prepared)
+
+
+def save_torchscript(model: nn.Module, output_path: Path) -> Path:
+    with torch.inference_mode():
+        traced = torch.jit.trace(model, example_input())
+    torch.jit.freeze(traced).save(str(output_path))
+    print(f"✅ 量化模型已儲存: {output_path} ({output_path.stat().st_size / 1e6:.1f} MB)")
+    return output_path
+
+
+# ==================== 評估 ====================
+
+def current_rss_mb() -> Optional[float]:
+    """目前行程的 RSS (MB)，僅支援 Linux"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        return None
+
+
+def evaluate(predictor: FashionPredictor, samples) -> Dict[str, float]:
+    """top-1 類別準確率、屬性 micro F1 與每張圖片延遲"""
+    correct = 0
+    tp = fp = fn = 0
+    elapsed = 0.0
+    for images, categories, attributes in iter_batches(predictor, samples):
+        # fp32 的 torch 後端在有 GPU 時於 cuda 上執行，輸入與輸出需在裝置間搬移
+        images = images.to(predictor.device)
+        start = time.perf_counter()
+        pred = predictor.run_model(images)
+        if predictor.device.type == 'cuda':
+            torch.cuda.synchronize()
+        elapsed += time.perf_counter() - start
+
+        correct += int((pred['category_pred'].cpu().numpy() == categories).sum())
+        attr_pred = pred['attribute_pred'].cpu().numpy().astype(np.int64)
+        tp += int(((attr_pred == 1) & (attributes == 1)).sum())
+        fp += int(((attr_pred == 1) & (attributes == 0)).sum())
+        fn += int(((attr_pred == 0) & (attributes == 1)).sum())
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        'top1': correct / len(samples),
+        'attr_f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'ms_per_image': elapsed * 1000 / len(samples),
+    }
+
+
+def load_with_rss(path: Path, backend: str) -> Tuple[FashionPredictor, Optional[float]]:
+    before = current_rss_mb()
+    predictor = FashionPredictor(str(path), backend=backend)
+    after = current_rss_mb()
+    return predictor, (after - before) if before is not None and after is not None else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Model A INT8 量化')
+    parser.add_argument('--checkpoint', default=str(config.MODEL_PATHS['torch']), help='best.pth 路徑')
+    parser.add_argument('--mode', choices=['dynamic', 'static'], default='static')
+    parser.add_argument('--output', default=str(config.MODEL_PATHS['int8']))
+    parser.add_argument('--calib-size', type=int, default=config.QUANT_CALIBRATION_SIZE)
+    parser.add_argument('--eval-size', type=int, default=config.QUANT_EVAL_SIZE)
+    parser.add_argument('--skip-eval', action='store_true', help='略過準確率與延遲比較')
+    args = parser.parse_args()
+
+    checkpoint_path = Path(args.checkpoint)
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    model = load_eval_model(checkpoint_path)
+
+    if args.mode == 'dynamic':
+        quantized = quantize_dynamic_heads(model)
+    else:
+        calibration = load_split(config.QUANT_CALIBRATION_SPLIT, args.calib_size)
+        quantized = quantize_static(model, calibration, FashionPredictor(str(checkpoint_path), backend='torch'))
+    save_torchscript(quantized, output_path)
+
+    if not args.skip_eval:
+        samples = load_split(config.QUANT_EVAL_SPLIT, args.eval_size)
+        print(f"\n📊 評估 {len(samples)} 張 ({config.QUANT_EVAL_SPLIT})")
+
+        fp32_predictor, fp32_rss = load_with_rss(checkpoint_path, 'torch')
+        int8_predictor, int8_rss = load_with_rss(output_path, 'int8')
+        fp32 = evaluate(fp32_predictor, samples)
+        int8 = evaluate(int8_predictor, samples)
+
+        print(f"\n{'':14s} {'fp32':>10s} {'int8':>10s} {'delta':>10s}")
+        print(f"{'top-1 類別':14s} {fp32['top1']:10.4f} {int8['top1']:10.4f} {int8['top1'] - fp32['top1']:+10.4f}")
+        print(f"{'屬性 F1':14s} {fp32['attr_f1']:10.4f} {int8['attr_f1']:10.4f} {int8['attr_f1'] - fp32['attr_f1']:+10.4f}")
+        print(f"{'ms / 張':14s} {fp32['ms_per_image']:10.2f} {int8['ms_per_image']:10.2f} "
+              f"{fp32['ms_per_image'] / int8['ms_per_image']:9.2f}x")
+        if fp32_rss is not None and int8_rss is not None:
+            print(f"{'載入 RSS (MB)':14s} {fp32_rss:10.1f} {int8_rss:10.1f} {int8_rss - fp32_rss:+10.1f}")
+        print(f"{'檔案大小 (MB)':14s} {checkpoint_path.stat().st_size / 1e6:10.1f} "
+              f"{output_path.stat().st_size / 1e6:10.1f}")